@@ -1 +1,12 @@
-from SPR_to_ADLP_Functions import common_functions
\ No newline at end of file
+from SPR_to_ADLP_Functions import common_functions
+from SPR_to_ADLP_Functions import rename_journal
+from SPR_to_ADLP_Functions import caches
+from SPR_to_ADLP_Functions import plate_planner
+from SPR_to_ADLP_Functions import batch
+from SPR_to_ADLP_Functions import profiling
+from SPR_to_ADLP_Functions import streaming_writer
+from SPR_to_ADLP_Functions import exporters
+from SPR_to_ADLP_Functions import image_prep
+from SPR_to_ADLP_Functions import pipeline
+from SPR_to_ADLP_Functions import loader
+from SPR_to_ADLP_Functions import stages
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Module for running one of the scripts over many input files in one process.
+
+Input files are given as a folder or a glob pattern. Each file is processed independently, so the files can be spread
+across worker processes. A file that fails does not stop the others; its error is returned with the results.
+"""
+import glob
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+
+def find_input_files(batch, extension='.csv'):
+    """
+    Lists the input files of a batch.
+
+    :param batch: Folder containing the input files or a glob pattern.
+    :param extension: Extension of the input files when a folder is given.
+    :return: Sorted list of file paths.
+    """
+    if os.path.isdir(batch):
+        ls_paths = glob.glob(os.path.join(batch, '*' + extension))
+    else:
+        ls_paths = glob.glob(os.path.expanduser(batch))
+
+    ls_paths = sorted(path for path in ls_paths if os.path.isfile(path))
+    if len(ls_paths) == 0:
+        raise ValueError('No input files found for: ' + batch)
+
+    return ls_paths
+
+
+def output_names(ls_paths):
+    """
+    Gives every input file a name to use in its output file name. The name is the file name without its extension.
+    Files with the same name in different folders get a numbered suffix so their outputs do not overwrite each other.
+
+    :param ls_paths: List of file paths.
+    :return: List of names in the order of ls_paths.
+    """
+    ls_names = []
+    seen = {}
+    for path in ls_paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name = name + '_' + str(seen[name])
+        ls_names.append(name)
+
+    return ls_names
+
+
+def run_batch(func, ls_paths, workers=None, **kwargs):
+    """
+    Calls func(path, name=name, **kwargs) for every input file.
+
+    :param func: Module level function processing one file, so it can be sent to a worker process.
+    :param ls_paths: List of file paths.
+    :param workers: Number of worker processes. None uses one per CPU and 1 processes the files in this process.
+    :param kwargs: Keyword arguments passed to func for every file.
+    :return: Tuple of two dictionaries keyed by file path: the results of the files that succeeded and the exceptions
+        of the files that failed.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(ls_paths)))
+
+    func = partial(func, **kwargs)
+    ls_names = output_names(ls_paths)
+    results = {}
+    failures = {}
+
+    if workers == 1:
+        for path, name in zip(ls_paths, ls_names):
+            try:
+                results[path] = func(path, name=name)
+            except Exception as e:
+                failures[path] = e
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(func, path, name=name) for path, name in zip(ls_paths, ls_names)]
+            for path, future in zip(ls_paths, futures):
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    failures[path] = e
+
+    logging.info('Batch of {} files: {} succeeded, {} failed.'.format(len(ls_paths), len(results), len(failures)))
+
+    return results, failures
+
+
+def report_failures(failures):
+    """
+    Prints the files of a batch that failed and raises a RuntimeError if there are any.
+
+    :param failures: Dictionary of file path to exception returned by run_batch.
+    """
+    for path, error in failures.items():
+        cause = error.__cause__ or error.__context__ or error
+        print('Failed: ' + path + ' (' + type(cause).__name__ + ': ' + str(cause) + ')')
+
+    if len(failures) > 0:
+        raise RuntimeError(str(len(failures)) + ' file(s) of the batch failed.')
@@ -0,0 +1,356 @@
+"""
+Module containing the local on disk caches used when inserting compound structures into the ADLP file.
+
+The caches live in a folder in the users home directory. The location can be changed with the SPR_ADLP_CACHE_DIR
+environment variable.
+"""
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+from contextlib import closing
+
+# Environment variable used to override the location of the cache folder.
+CACHE_DIR_ENV = 'SPR_ADLP_CACHE_DIR'
+
+# SMILES are refreshed from resultsdb after 30 days.
+SMILES_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# Maximum number of compounds kept in the SMILES cache before the least recently used are evicted.
+SMILES_CACHE_MAX_ENTRIES = 50000
+
+# Rendered structure images are pruned once they take up more than 200 MB.
+STRUCTURE_IMAGE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Prepared steady state and sensorgram images are pruned once they take up more than 500 MB.
+PREPARED_IMAGE_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# SQLite limits the number of parameters in a single statement.
+_SQLITE_MAX_PARAMS = 500
+
+
+def get_cache_dir():
+    """
+    Returns the folder used to store the local caches, creating it if needed.
+
+    :return: Path to the cache folder.
+    """
+    cache_dir = os.getenv(CACHE_DIR_ENV, os.path.join(os.path.expanduser('~'), '.spr_adlp_cache'))
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def _chunks(ls, size=_SQLITE_MAX_PARAMS):
+    for i in range(0, len(ls), size):
+        yield ls[i:i + size]
+
+
+class SmilesCache:
+    """
+    SQLite cache of the SMILES retrieved from resultsdb keyed by BROAD_CORE_ID.
+
+    Entries older than ttl_seconds are treated as misses so they are fetched again from resultsdb, but they are kept
+    until they are evicted so they can still be used when resultsdb cannot be reached. Once the cache holds more than
+    max_entries compounds, the least recently used entries are evicted.
+
+    Compounds that resultsdb does not know, such as controls, are remembered as not found for ttl_seconds as well, so
+    they are not looked up again on every run.
+    """
+
+    def __init__(self, path=None, ttl_seconds=SMILES_CACHE_TTL_SECONDS, max_entries=SMILES_CACHE_MAX_ENTRIES):
+        """
+        :param path: Path to the SQLite file. Defaults to smiles.sqlite in the cache folder.
+        :param ttl_seconds: Age in seconds after which a cached SMILES is fetched again.
+        :param max_entries: Maximum number of compounds to keep.
+        """
+        self.path = path if path is not None else os.path.join(get_cache_dir(), 'smiles.sqlite')
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS smiles ('
+                         'broad_core_id TEXT PRIMARY KEY, '
+                         'smiles TEXT NOT NULL, '
+                         'fetched_at REAL NOT NULL, '
+                         'last_used REAL NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS not_found ('
+                         'broad_core_id TEXT PRIMARY KEY, '
+                         'checked_at REAL NOT NULL)')
+
+    def _connect(self):
+        # A timeout lets several runs share the cache file.
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, core_ids, include_expired=False):
+        """
+        Looks up the SMILES of several compounds.
+
+        :param core_ids: Iterable of BROAD_CORE_IDs.
+        :param include_expired: Also return entries older than the TTL. Used when resultsdb cannot be reached.
+        :return: Dictionary of BROAD_CORE_ID -> SMILES for the compounds found in the cache.
+        """
+        core_ids = list(dict.fromkeys(core_ids))
+        now = time.time()
+        oldest_allowed = 0 if include_expired else now - self.ttl_seconds
+
+        found = {}
+        with closing(self._connect()) as conn, conn:
+            for chunk in _chunks(core_ids):
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute('SELECT broad_core_id, smiles FROM smiles '
+                                    'WHERE fetched_at >= ? AND broad_core_id IN (' + placeholders + ')',
+                                    [oldest_allowed] + chunk).fetchall()
+                found.update(rows)
+
+            for chunk in _chunks(list(found)):
+                placeholders = ','.join('?' * len(chunk))
+                conn.execute('UPDATE smiles SET last_used = ? WHERE broad_core_id IN (' + placeholders + ')',
+                             [now] + chunk)
+        return found
+
+    def put_many(self, core_id_smiles):
+        """
+        Stores SMILES retrieved from resultsdb and evicts expired and least recently used entries.
+
+        :param core_id_smiles: Iterable of (BROAD_CORE_ID, SMILES) tuples. Entries without a SMILES are ignored.
+        :return: None
+        """
+        now = time.time()
+        rows = [(core_id, smiles, now, now) for core_id, smiles in core_id_smiles
+                if isinstance(smiles, str) and smiles != '']
+
+        with closing(self._connect()) as conn, conn:
+            conn.executemany('INSERT OR REPLACE INTO smiles (broad_core_id, smiles, fetched_at, last_used) '
+                             'VALUES (?, ?, ?, ?)', rows)
+            # A compound registered since it was last looked up is no longer missing.
+            conn.executemany('DELETE FROM not_found WHERE broad_core_id = ?', [row[:1] for row in rows])
+            self._evict(conn, now)
+
+    def get_not_found(self, core_ids):
+        """
+        Looks up which compounds were not found in resultsdb within the last ttl_seconds.
+
+        :param core_ids: Iterable of BROAD_CORE_IDs.
+        :return: Set of the BROAD_CORE_IDs that were not found.
+        """
+        core_ids = list(dict.fromkeys(core_ids))
+        oldest_allowed = time.time() - self.ttl_seconds
+
+        not_found = set()
+        with closing(self._connect()) as conn:
+            for chunk in _chunks(core_ids):
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute('SELECT broad_core_id FROM not_found '
+                                    'WHERE checked_at >= ? AND broad_core_id IN (' + placeholders + ')',
+                                    [oldest_allowed] + chunk).fetchall()
+                not_found.update(row[0] for row in rows)
+        return not_found
+
+    def put_not_found(self, core_ids):
+        """
+        Remembers compounds that were not found in resultsdb and drops those checked more than ttl_seconds ago.
+
+        :param core_ids: Iterable of BROAD_CORE_IDs.
+        :return: None
+        """
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.executemany('INSERT OR REPLACE INTO not_found (broad_core_id, checked_at) VALUES (?, ?)',
+                             [(core_id, now) for core_id in dict.fromkeys(core_ids)])
+            conn.execute('DELETE FROM not_found WHERE checked_at < ?', [now - self.ttl_seconds])
+
+    def _evict(self, conn, now):
+        count = conn.execute('SELECT COUNT(*) FROM smiles').fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        # Expired entries go first, then the least recently used.
+        conn.execute('DELETE FROM smiles WHERE fetched_at < ?', [now - self.ttl_seconds])
+        conn.execute('DELETE FROM smiles WHERE broad_core_id IN ('
+                     'SELECT broad_core_id FROM smiles ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                     [self.max_entries])
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM smiles').fetchone()[0]
+
+
+def get_smiles_cache():
+    """
+    Opens the default SMILES cache. Structures are still inserted without the cache if it cannot be opened.
+
+    :return: SmilesCache object or None.
+    """
+    try:
+        return SmilesCache()
+    except (OSError, sqlite3.Error) as e:
+        logging.info('The local SMILES cache could not be opened (%s). Proceeding without it...', e)
+        return None
+
+
+class StructureImageCache:
+    """
+    Content addressed cache of rendered structure images.
+
+    Images are stored as PNG files named by the SHA-256 of the canonical SMILES and the render size, so a molecule is
+    only rendered once no matter how many runs or replicates it appears in. The modification time of a file is
+    updated every time it is used, and prune removes the least recently used images once the folder is larger than
+    max_bytes.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=STRUCTURE_IMAGE_CACHE_MAX_BYTES):
+        """
+        :param cache_dir: Folder to store the images in. Defaults to the structures folder in the cache folder.
+        :param max_bytes: Maximum total size of the images kept by prune.
+        """
+        self.cache_dir = cache_dir if cache_dir is not None else os.path.join(get_cache_dir(), 'structures')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        # Images used by this object are never pruned because xlsxwriter only reads them when the workbook is saved.
+        self._used = set()
+
+    @staticmethod
+    def key(canonical_smiles, size):
+        """
+        Returns the cache key of a molecule.
+
+        :param canonical_smiles: Canonical SMILES of the molecule.
+        :param size: (width, height) tuple of the image.
+        :return: Hex digest used as the file name.
+        """
+        return hashlib.sha256('{}|{}x{}'.format(canonical_smiles, size[0], size[1]).encode('utf-8')).hexdigest()
+
+    def path(self, canonical_smiles, size):
+        """
+        Returns the path the image of a molecule is stored at, whether or not it exists yet.
+        """
+        return os.path.join(self.cache_dir, self.key(canonical_smiles, size) + '.png')
+
+    def get(self, canonical_smiles, size):
+        """
+        Looks up a rendered image.
+
+        :param canonical_smiles: Canonical SMILES of the molecule.
+        :param size: (width, height) tuple of the image.
+        :return: Path to the cached image or None if it has not been rendered yet.
+        """
+        img_path = self.path(canonical_smiles, size)
+        try:
+            os.utime(img_path)
+        except FileNotFoundError:
+            return None
+
+        self._used.add(img_path)
+        return img_path
+
+    def put(self, canonical_smiles, size, render):
+        """
+        Renders an image into the cache. The image is written to a temporary file first so other runs never see a
+        partially written image.
+
+        :param canonical_smiles: Canonical SMILES of the molecule.
+        :param size: (width, height) tuple of the image.
+        :param render: Function that takes a file path and writes the PNG image to it.
+        :return: Path to the cached image.
+        """
+        img_path = self.path(canonical_smiles, size)
+        tmp_path = img_path + '.' + str(os.getpid()) + '.tmp'
+        render(tmp_path)
+        os.replace(tmp_path, img_path)
+
+        self.mark_used(img_path)
+        return img_path
+
+    def mark_used(self, img_path):
+        """
+        Marks an image that was written straight to its cache path as used by this object so it is not pruned.
+
+        :param img_path: Path to the cached image.
+        :return: None
+        """
+        self._used.add(img_path)
+
+    def prune(self):
+        """
+        Removes the least recently used images until the cache is no larger than max_bytes. Images used by this object
+        are kept.
+
+        :return: None
+        """
+        ls_files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.png'):
+                stat = entry.stat()
+                ls_files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in ls_files)
+        for _, size, img_path in sorted(ls_files):
+            if total_bytes <= self.max_bytes:
+                break
+            if img_path in self._used:
+                continue
+            try:
+                os.unlink(img_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+
+def get_structure_image_cache():
+    """
+    Opens the default structure image cache. Structures are rendered to a temporary folder if it cannot be opened.
+
+    :return: StructureImageCache object or None.
+    """
+    try:
+        return StructureImageCache()
+    except OSError as e:
+        logging.info('The local structure image cache could not be opened (%s). Proceeding without it...', e)
+        return None
+
+
+class PreparedImageCache(StructureImageCache):
+    """
+    Cache of the steady state and sensorgram images prepared for the ADLP file.
+
+    Works like StructureImageCache, but images are keyed by the path, modification time and size of the source image
+    and the height they were prepared for. An image that is changed or replaced gets a new key, so it is prepared
+    again.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=PREPARED_IMAGE_CACHE_MAX_BYTES):
+        """
+        :param cache_dir: Folder to store the images in. Defaults to the prepared_images folder in the cache folder.
+        :param max_bytes: Maximum total size of the images kept by prune.
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(get_cache_dir(), 'prepared_images')
+        super().__init__(cache_dir=cache_dir, max_bytes=max_bytes)
+
+    @staticmethod
+    def key(source_path, height):
+        """
+        Returns the cache key of a source image.
+
+        :param source_path: Path to the source image.
+        :param height: Height in pixels the image is prepared for.
+        :return: Hex digest used as the file name.
+        """
+        stat = os.stat(source_path)
+        return hashlib.sha256('{}|{}|{}|{}'.format(os.path.abspath(source_path), stat.st_mtime_ns, stat.st_size,
+                                                   height).encode('utf-8')).hexdigest()
+
+
+def get_prepared_image_cache():
+    """
+    Opens the default prepared image cache.
+
+    :return: PreparedImageCache object or None if it cannot be opened.
+    """
+    try:
+        return PreparedImageCache()
+    except OSError as e:
+        logging.info('The local prepared image cache could not be opened (%s). Proceeding without it...', e)
+        return None
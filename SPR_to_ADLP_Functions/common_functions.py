@@ -1,14 +1,33 @@
 """Module that contains common functions for SPR to ADLP aggregation scripts"""
 import os
+import importlib
 import pandas as pd
-from rdkit import Chem
-from rdkit.Chem import Draw, AllChem
-import cx_Oracle
-import sqlalchemy
-import crypt
+import numpy as np
+from pandas.io.parsers import TextParser
 import logging
 import platform
-import tempfile
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from SPR_to_ADLP_Functions import caches
+from SPR_to_ADLP_Functions import profiling
+from SPR_to_ADLP_Functions import image_prep
+
+# Row height and the first column, last column and width of the columns of the structure images.
+STRUCTURE_CELL_FORMAT = {'cell_height': 210, 'first_col': 1, 'last_col': 1, 'width': 35}
+
+# Sqlalchemy engines created in this process, keyed by connection string.
+_ENGINES = {}
+
+
+def _lazy_import(module_name):
+    """
+    Imports a module the first time it is needed rather than when this module is loaded. RDKit, cx_Oracle and
+    SQLAlchemy are slow to import and are only needed when structures are inserted, so they are loaded on demand.
+
+    :param module_name: Full name of the module to import e.g. 'rdkit.Chem.Draw'
+    :return: The imported module.
+    """
+    return importlib.import_module(module_name)
 
 
 def rep_item_for_dot_df(df, col_name, times_dup=3, sort=False):
@@ -41,6 +60,115 @@ def rep_item_for_dot_df(df, col_name, times_dup=3, sort=False):
         raise RuntimeError("The DataFrame does not have a " + col_name + " column.")
 
 
+def _convert_excel_cell(cell):
+    """
+    Private function that converts an openpyxl cell to a value the same way pandas does when reading an Excel file, so
+    that the DataFrame returned by read_excel_from_header matches pd.read_excel.
+    """
+    if cell.value is None:
+        return ''
+    elif cell.data_type == 'e':
+        return np.nan
+    elif cell.data_type == 'n':
+        val = int(cell.value)
+        if val == cell.value:
+            return val
+        return float(cell.value)
+    return cell.value
+
+
+def read_excel_from_header(file_path, header_value='Group'):
+    """
+    Reads the first worksheet of a Biacore 8K steady state or kinetic Excel export in a single streaming pass. Rows are
+    skipped until the row containing header_value is reached. That row becomes the header and all following rows are
+    kept, so the result is the same as pd.read_excel(file_path, skiprows=<row of header_value>) without having to open
+    the file twice.
+
+    :param file_path: Path to the Excel file exported from the Biacore evaluation software, or the file read ahead into
+        memory.
+    :param header_value: Value of a cell in the header row.
+    :return: DataFrame of the table starting at the header row.
+    """
+    openpyxl = _lazy_import('openpyxl')
+
+    # A file read ahead by the loader is named after its path.
+    with profiling.stage('read ' + os.path.basename(str(getattr(file_path, 'name', file_path)))):
+        profiling.add_file_read(file_path)
+
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+
+        try:
+            sheet = wb.worksheets[0]
+            sheet.reset_dimensions()
+
+            data = None
+            last_row_with_data = -1
+            for row in sheet.iter_rows():
+
+                # Skip rows until the header is found.
+                if data is None:
+                    if not any(cell.value == header_value for cell in row):
+                        continue
+                    data = []
+
+                converted_row = [_convert_excel_cell(cell) for cell in row]
+
+                # Trim trailing empty cells
+                while converted_row and converted_row[-1] == '':
+                    converted_row.pop()
+
+                if converted_row:
+                    last_row_with_data = len(data)
+                data.append(converted_row)
+        finally:
+            wb.close()
+
+    if data is None:
+        raise ValueError('Could not find a header row containing "' + header_value + '" in ' + str(file_path))
+
+    # Trim trailing empty rows and extend rows to the max width
+    data = data[:last_row_with_data + 1]
+    max_width = max(len(data_row) for data_row in data)
+    data = [data_row + [''] * (max_width - len(data_row)) for data_row in data]
+
+    return TextParser(data, header=0, skip_blank_lines=False).read()
+
+
+def read_setup_table(path_master_tbl, clip=False):
+    """
+    Reads the SPR setup table of an experiment.
+
+    :param path_master_tbl: Path of the setup table CSV file given in the configuration file.
+    :param clip: Flag that indicates that the setup table is on the clipboard instead.
+    :return: SPR Setup table as a DataFrame
+    """
+    try:
+        if clip:
+            return pd.read_clipboard()
+
+        with profiling.stage('read_setup_table'):
+            profiling.add_file_read(path_master_tbl)
+            return pd.read_csv(path_master_tbl)
+    except Exception:
+        raise RuntimeError('Something is wrong with the config file. Please check.')
+
+
+def _get_engine(sqlalchemy, cstr):
+    """
+    Private function that returns the sqlalchemy engine of a connection string. Engines are kept for the life of the
+    process, so a long running process such as the ADLP server reuses its connection pool between runs.
+    """
+    engine = _ENGINES.get(cstr)
+    if engine is None:
+        engine = sqlalchemy.create_engine(cstr,
+                               pool_recycle=3600,
+                               pool_size=5,
+                               echo=False
+                               )
+        _ENGINES[cstr] = engine
+    return engine
+
+
 def _connect(engine):
     """
     Private method that actually makes the connection to resultsdb
@@ -52,23 +180,61 @@ def _connect(engine):
     return c
 
 
-def get_structures_smiles_from_db(df_mstr_tbl):
+def _merge_smiles(df_brd_core_id, df_struct_tbl):
+    """
+    Private method that merges the SMILES onto the Broad IDs such that Full BRD, CORE ID, and SMILES are in the same
+    table.
+    """
+    return pd.merge(left=df_brd_core_id, right=df_struct_tbl, on='BROAD_CORE_ID', how='left')
+
+
+def _smiles_dict_to_df(dict_smiles):
+    """
+    Private method that turns a dictionary of BROAD_CORE_ID -> SMILES into a DataFrame.
+    """
+    return pd.DataFrame(list(dict_smiles.items()), columns=['BROAD_CORE_ID', 'SMILES'])
+
+
+def get_structures_smiles_from_db(df_mstr_tbl, smiles_cache=None):
     """
     This method creates a connection to results db and retrieves the smiles for each BRD in the passed in df_mstr_tbl
 
+    If a SMILES cache is passed in, only the compounds that are not in the cache are retrieved from resultsdb and no
+    connection is made when every compound is cached or was recently not found in resultsdb. If resultsdb cannot be
+    reached, the cached SMILES are used.
+
     :param: df_mstr_tbl: SPR Setup table as a DataFrame
+    :param smiles_cache: Optional SmilesCache object
     :return DataFrame containing BRD, CORE ID, and SMILES
     """
 
     # Extract the CORE Broad ID from the df_mstr_tbl
     df_brd_core_id = df_mstr_tbl[['Broad ID']].copy()
     df_brd_core_id.loc[:, 'BROAD_CORE_ID'] = df_brd_core_id['Broad ID'].apply(lambda x: x[5:13])
+    ls_core_ids = list(df_brd_core_id['BROAD_CORE_ID'])
+
+    # Look up the compounds in the local cache first.
+    dict_cached_smiles = {}
+    if smiles_cache is not None:
+        dict_cached_smiles = smiles_cache.get_many(ls_core_ids)
+        set_not_found = smiles_cache.get_not_found(ls_core_ids)
+        ls_core_ids = [core_id for core_id in dict.fromkeys(ls_core_ids)
+                       if core_id not in dict_cached_smiles and core_id not in set_not_found]
 
-    # Create a cryptographic object
-    c = crypt.Crypt()
+        if len(ls_core_ids) == 0:
+            logging.info('All SMILES found in the local cache, skipping the connection to resultsdb...')
+            return _merge_smiles(df_brd_core_id, _smiles_dict_to_df(dict_cached_smiles))
 
     # Connect to resultsdb database.
     try:
+        # The database drivers are only imported when structures are requested.
+        crypt = _lazy_import('crypt')
+        cx_Oracle = _lazy_import('cx_Oracle')
+        sqlalchemy = _lazy_import('sqlalchemy')
+
+        # Create a cryptographic object
+        c = crypt.Crypt()
+
         host = 'cbpdb01'
         port = '1521'
         sid = 'cbplate'
@@ -82,16 +248,21 @@ def get_structures_smiles_from_db(df_mstr_tbl):
             sid=sid
         )
 
-        engine = sqlalchemy.create_engine(cstr,
-                               pool_recycle=3600,
-                               pool_size=5,
-                               echo=False
-                               )
+        engine = _get_engine(sqlalchemy, cstr)
 
         # Connect to resultsdb by calling private connection method
         conn = _connect(engine=engine)
 
     except Exception:
+        # Work offline with whatever the cache holds, including SMILES that are due to be refreshed.
+        if smiles_cache is not None:
+            dict_cached_smiles.update(smiles_cache.get_many(ls_core_ids, include_expired=True))
+
+        if len(dict_cached_smiles) > 0:
+            print("\nCannot connect to resultsdb database. Only structures found in the local cache will be "
+                  "rendered. \n\nProgram proceeding. Please wait...")
+            return _merge_smiles(df_brd_core_id, _smiles_dict_to_df(dict_cached_smiles))
+
         print("\nCannot connect to resultsdb database. Structures will not be rendered. "
               "\n\nProgram proceeding without inserting structures. Please wait...")
         return None
@@ -102,7 +273,7 @@ def get_structures_smiles_from_db(df_mstr_tbl):
 
     # Get the Broad Core ID/ and SMILES from resultsdb.
     stmt = sqlalchemy.select([structure_tbl.c.broadidcore, structure_tbl.c.smiles]). \
-        where(structure_tbl.c.broadidcore.in_(list(df_brd_core_id['BROAD_CORE_ID'])))
+        where(structure_tbl.c.broadidcore.in_(ls_core_ids))
 
     # Execute the statement
     results = conn.execute(stmt).fetchall()
@@ -110,63 +281,156 @@ def get_structures_smiles_from_db(df_mstr_tbl):
     # Close the database connection
     conn.close()
 
-    # Turn the results into a DataFrame.
-    df_struct_tbl = pd.DataFrame(results)
+    # Turn the results into a DataFrame. The columns are named so that no results, when resultsdb knows none of the
+    # compounds, still gives an empty table.
+    df_struct_tbl = pd.DataFrame(results, columns=['BROAD_CORE_ID', 'SMILES'])
 
-    # RENAME the column headers.
-    df_struct_tbl.columns = ['BROAD_CORE_ID', 'SMILES']
+    # Store the new SMILES and the compounds resultsdb does not know, and add the cached ones.
+    if smiles_cache is not None:
+        smiles_cache.put_many(zip(df_struct_tbl['BROAD_CORE_ID'], df_struct_tbl['SMILES']))
+        smiles_cache.put_not_found(set(ls_core_ids) - set(df_struct_tbl.dropna(subset=['SMILES'])['BROAD_CORE_ID']))
+        df_struct_tbl = pd.concat([df_struct_tbl, _smiles_dict_to_df(dict_cached_smiles)], ignore_index=True)
 
     # Merge df_struct_tbl with df_brd_core_id such that Full BRD, CORE ID, and SMILES are in the same table
-    df_merge_full_brd_smiles = pd.merge(left=df_brd_core_id, right=df_struct_tbl, on='BROAD_CORE_ID', how='left')
+    df_merge_full_brd_smiles = _merge_smiles(df_brd_core_id, df_struct_tbl)
     return df_merge_full_brd_smiles
 
 
-def render_structure_imgs(df_with_smiles, dir):
+def _render_structure_img(job):
+    """
+    Private method that renders one molecule to a PNG file. Runs in the worker processes when rendering in parallel so
+    it must stay at module level. The image is written to a temporary file first so a partially written image is never
+    left at img_path.
+
+    :param job: Tuple of (SMILES, image path, (width, height))
+    :return: The image path
+    """
+    smiles, img_path, img_size = job
+
+    Chem = _lazy_import('rdkit.Chem')
+    Draw = _lazy_import('rdkit.Chem.Draw')
+
+    tmp_path = img_path + '.' + str(os.getpid()) + '.tmp'
+    Draw.MolToFile(mol=Chem.MolFromSmiles(smiles), filename=tmp_path, size=img_size, imageType='png')
+    os.replace(tmp_path, img_path)
+    return img_path
+
+
+def _render_structure_png(job):
+    """
+    Private method that renders one molecule to PNG bytes in memory. Runs in the worker processes when rendering in
+    parallel so it must stay at module level.
+
+    :param job: Tuple of (SMILES, image path, (width, height)). The image path is not used.
+    :return: The PNG image as bytes
+    """
+    smiles, _, img_size = job
+
+    Chem = _lazy_import('rdkit.Chem')
+    Draw = _lazy_import('rdkit.Chem.Draw')
+
+    buffer = BytesIO()
+    Draw.MolToImage(Chem.MolFromSmiles(smiles), size=img_size).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _write_bytes(data):
+    """
+    Private method that returns a function writing data to a file. Used to store images rendered in memory in the
+    image cache.
+    """
+    def write(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return write
+
+
+def render_structure_imgs(df_with_smiles, dir, image_cache=None, workers=1, in_memory=False):
     """
     Does the work of rendering images from smiles using RDkit into a directory
 
+    Each unique molecule is only rendered once. If an image cache is passed in, images are looked up in the cache by
+    canonical SMILES and only molecules that have not been rendered before are drawn. The returned paths then point
+    into the cache instead of dir.
+
+    If in_memory is True, new images are rendered to in-memory PNG buffers instead of files and dir is not used. The
+    IMG_PATH column then holds a BytesIO buffer for these images, which spr_insert_structures accepts in place of a path.
+
     :param df_with_smiles: DataFrame contain the smiles to render
     :param dir: directory to story the images.
+    :param image_cache: Optional StructureImageCache object
+    :param workers: Number of processes used to render the images. 1 renders in this process.
+    :param in_memory: Render the images to BytesIO buffers instead of files.
     :return None
     """
     logging.info('Attempting to render structures...')
 
+    # RDKit is only imported when structures are requested.
+    Chem = _lazy_import('rdkit.Chem')
+    AllChem = _lazy_import('rdkit.Chem.AllChem')
+
     # Tag the smile field if it is not found.
     df_with_smiles = df_with_smiles.fillna('Not Found')
 
-    # Create an image Path Column
-    df_with_smiles.loc[:, 'IMG_PATH'] = ''
-
     # Use BRD control as a template to align molecules.
     template = Chem.MolFromSmiles('Nc1c(F)cc(C#N)c2cc[nH]c12')
     AllChem.Compute2DCoords(template)
 
-    img_num = 0
+    img_size = (250, 250)
 
-    # Create the images from smiles in a new directory
+    # Work out which molecules need rendering. Molecules in the cache are used as is. Jobs are keyed by SMILES so each
+    # unique molecule is rendered once.
     # TODO: Attempt to align structure doesn't fully work
-    for idx, row in df_with_smiles.iterrows():
-
-        current_smile_str = row['SMILES']
-
-        if current_smile_str == 'Not Found':
-            df_with_smiles.loc[idx, 'IMG_PATH'] = 'Not Found'
-            img_num += 1
-
+    # TODO: Impelement ability to align structures to a common smile core.
+    dict_smiles_imgs = {}
+    dict_jobs = {}
+    dict_canonical_smiles = {}
+    for img_num, (broad_id, current_smile_str) in enumerate(zip(df_with_smiles['Broad ID'],
+                                                                 df_with_smiles['SMILES'])):
+
+        if current_smile_str == 'Not Found' or current_smile_str in dict_smiles_imgs \
+                or current_smile_str in dict_jobs:
+            continue
+
+        if image_cache is not None:
+            canonical_smiles = Chem.MolToSmiles(Chem.MolFromSmiles(current_smile_str))
+            dict_canonical_smiles[current_smile_str] = canonical_smiles
+            img_full_path = image_cache.get(canonical_smiles, img_size)
+            if img_full_path is not None:
+                dict_smiles_imgs[current_smile_str] = img_full_path
+                continue
+            img_full_path = image_cache.path(canonical_smiles, img_size)
+        elif in_memory:
+            img_full_path = None
         else:
-            img_name = str(img_num) + '_' + row['Broad ID'] + '.png'
+            img_name = str(img_num) + '_' + broad_id + '.png'
             img_full_path = os.path.join(dir, img_name)
 
-            # Generate the structure of the current molecule using the control as a template to align
-            m = Chem.MolFromSmiles(current_smile_str)
-            # TODO: Impelement ability to align structures to a common smile core.
-            #AllChem.GenerateDepictionMatching2DStructure(m, template)
-            Draw.MolToFile(mol=m, filename=img_full_path, size=(250, 250))
+        dict_jobs[current_smile_str] = (current_smile_str, img_full_path, img_size)
 
-            # Save the image path to the DataFrame
-            df_with_smiles.loc[idx, 'IMG_PATH'] = img_full_path
+    # Render the images, in parallel if requested.
+    render = _render_structure_png if in_memory else _render_structure_img
+    if workers > 1 and len(dict_jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            ls_rendered = list(executor.map(render, dict_jobs.values()))
+    else:
+        ls_rendered = [render(job) for job in dict_jobs.values()]
+
+    for current_smile_str, rendered in zip(dict_jobs, ls_rendered):
+        if in_memory:
+            # Keep a copy in the cache for the next run. The workbook uses the buffer so no file is read back.
+            if image_cache is not None:
+                image_cache.put(dict_canonical_smiles[current_smile_str], img_size, _write_bytes(rendered))
+            dict_smiles_imgs[current_smile_str] = BytesIO(rendered)
+        else:
+            # Register newly rendered images with the cache so they are not pruned while the workbook is being written.
+            if image_cache is not None:
+                image_cache.mark_used(rendered)
+            dict_smiles_imgs[current_smile_str] = rendered
 
-            img_num += 1
+    # Save the image paths to the DataFrame in the original row order.
+    df_with_smiles.loc[:, 'IMG_PATH'] = [dict_smiles_imgs.get(smiles, 'Not Found')
+                                         for smiles in df_with_smiles['SMILES']]
 
     logging.info('Structures rendered successfully, proceeding...')
     return df_with_smiles
@@ -176,7 +440,7 @@ def spr_insert_structures(ls_img_struct_paths, worksheet):
     """
     Does the work of inserting the structures into the xlsxwriter workbook object.
 
-    :param ls_img_struct_paths: list of image paths to insert.
+    :param ls_img_struct_paths: list of images to insert. Each image is either a path or a BytesIO buffer.
     :param worksheet: xlsxwriter object used to insert the images to a worksheet
     :return: None
     """
@@ -186,71 +450,136 @@ def spr_insert_structures(ls_img_struct_paths, worksheet):
 
     # Set height of each row
     for row in range(1, num_images + 1):
-        worksheet.set_row(row=row, height=210)
+        worksheet.set_row(row=row, height=STRUCTURE_CELL_FORMAT['cell_height'])
 
     # Set the width of each column
-    worksheet.set_column(first_col=1, last_col=1, width=35)
+    worksheet.set_column(first_col=STRUCTURE_CELL_FORMAT['first_col'], last_col=STRUCTURE_CELL_FORMAT['last_col'],
+                         width=STRUCTURE_CELL_FORMAT['width'])
 
     row = 2
     for img in ls_img_struct_paths:
+        insert_structure_img(worksheet, row, img)
+        row += 1
 
-        if img == 'Not Found':
-            worksheet.write('B' + str(row), 'Smile Not Found')
-            row += 1
+    logging.info('Structures inserted into Excel workbook successfully, proceeding...')
 
-        else:
-            worksheet.insert_image('B' + str(row), img)
-            row += 1
 
-    logging.info('Structures inserted into Excel workbook successfully, proceeding...')
+def insert_structure_img(worksheet, row, img):
+    """
+    Inserts the structure of one row of the ADLP file in column B.
+
+    :param worksheet: xlsxwriter object used to insert the image to a worksheet
+    :param row: Excel row number, starting at 1.
+    :param img: Path or BytesIO buffer of the image, or 'Not Found' if the SMILES was not found.
+    :return: None
+    """
+    # The structure is inserted on every flow channel row of a compound. xlsxwriter stores the images of a workbook by
+    # the hash of their content, so each structure is only saved once in the file however often it is inserted.
+    if isinstance(img, BytesIO):
+        # In-memory images still need a file name, which xlsxwriter uses to identify the image.
+        worksheet.insert_image('B' + str(row), 'structure_' + str(row) + '.png', {'image_data': img})
 
+    elif img == 'Not Found':
+        worksheet.write('B' + str(row), 'Smile Not Found')
 
-def manage_structure_insertion(df_cmpd_set, num_fc_used, worksheet, structures, writer):
+    else:
+        worksheet.insert_image('B' + str(row), img)
+
+
+def manage_structure_insertion(df_cmpd_set, num_fc_used, worksheet, structures, writer, render_workers=1,
+                               df_struct_smiles=None):
     """
-    Private method that manages inserting structures by creating a temp directory to temporarily store images. Also
-    manages all of the calls to methods that connect to the database as well as render the images using RDKit
+    Private method that manages inserting structures. Structures are rendered in memory, or taken from the local image
+    cache, so no temporary files are written. Also manages all of the calls to methods that connect to the database as
+    well as render the images using RDKit
 
     :param df_cmpd_set:
     :param num_fc_used:
     :param worksheet: xlsxwriter object used to insert the images to a worksheet
     :param structures:
     :param writer:
+    :param render_workers: Number of processes used to render the structures.
+    :param df_struct_smiles: Optional SMILES already looked up with get_structure_smiles.
     :return:
     """
+    ls_img_paths, image_cache = get_structure_imgs(df_cmpd_set=df_cmpd_set, num_fc_used=num_fc_used,
+                                                   structures=structures, render_workers=render_workers,
+                                                   df_struct_smiles=df_struct_smiles)
+
+    # Insert the structures into the Excel workbook object
+    if ls_img_paths is not None:
+        with profiling.stage('insert_structures'):
+            spr_insert_structures(ls_img_struct_paths=ls_img_paths, worksheet=worksheet)
+
+    _save_workbook(writer)
+
+    # The images have been read into the workbook so the cache can now be trimmed.
+    if image_cache is not None:
+        image_cache.prune()
+
+
+def get_structure_smiles(df_cmpd_set, structures):
+    """
+    Looks up the SMILES of the compounds in the local cache or resultsdb.
+
+    :param df_cmpd_set: SPR Setup table as a DataFrame
+    :param structures: Flag to insert structures.
+    :return: DataFrame containing BRD, CORE ID, and SMILES or None if structures are not inserted or resultsdb could not
+        be reached.
+    """
+    if not structures:
+        return None
     if platform.system() == "Windows":
         logging.info('As you are running on Windows, inserting compound structures into the final Excel file has '
                      'been\n disabled due to database connections issues when using Windows.\n  A fix is in the '
                      'pipeline..')
-    if platform.system() != "Windows" and structures:
+        return None
 
-        with tempfile.TemporaryDirectory() as tmp_img_dir:
+    # This line gets all the smiles from the local cache or the database
+    with profiling.stage('smiles_lookup'):
+        return get_structures_smiles_from_db(df_mstr_tbl=df_cmpd_set, smiles_cache=caches.get_smiles_cache())
 
-            # This line gets all the smiles from the database
-            df_struct_smiles = get_structures_smiles_from_db(df_mstr_tbl=df_cmpd_set)
 
-            # Issue with connecting to resultsdb, then skip inserting structures.
-            if df_struct_smiles is not None:
+def get_structure_imgs(df_cmpd_set, num_fc_used, structures, render_workers=1, df_struct_smiles=None):
+    """
+    Looks up the SMILES of the compounds and renders their structures in memory, or takes them from the local image
+    cache.
+
+    :param df_cmpd_set: SPR Setup table as a DataFrame
+    :param num_fc_used: Number of rows of the ADLP file for each compound.
+    :param structures: Flag to insert structures.
+    :param render_workers: Number of processes used to render the structures.
+    :param df_struct_smiles: Optional SMILES already looked up with get_structure_smiles. They are only looked up here
+        when not given.
+    :return: Tuple of the list of images in the order of the rows of the ADLP file and the StructureImageCache to
+        prune once the workbook is saved. Both are None if structures are not inserted.
+    """
+    if df_struct_smiles is None:
+        df_struct_smiles = get_structure_smiles(df_cmpd_set=df_cmpd_set, structures=structures)
 
-                # Render the structure images
-                df_with_paths = render_structure_imgs(df_with_smiles=df_struct_smiles, dir=tmp_img_dir)
+    # Issue with connecting to resultsdb, then skip inserting structures.
+    if df_struct_smiles is None:
+        return None, None
 
-                # Create an list of the images paths in order
-                ls_img_paths = rep_item_for_dot_df(df=df_with_paths, col_name='IMG_PATH', times_dup=num_fc_used)
+    # Render the structure images. Images already in the local cache are embedded from the cache.
+    image_cache = caches.get_structure_image_cache()
+    with profiling.stage('render_structures'):
+        df_with_paths = render_structure_imgs(df_with_smiles=df_struct_smiles, dir=None,
+                                              image_cache=image_cache, workers=render_workers, in_memory=True)
 
-                # Insert the structures into the Excel workbook object
-                spr_insert_structures(ls_img_struct_paths=ls_img_paths, worksheet=worksheet)
+    # Create an list of the images in order
+    ls_img_paths = rep_item_for_dot_df(df=df_with_paths, col_name='IMG_PATH', times_dup=num_fc_used)
 
-                # Save the writer object inside the context manager.
-                writer.save()
+    return ls_img_paths, image_cache
 
-            else:
-                # Save the writer object inside the context manager.
-                writer.save()
-    else:
+
+def _save_workbook(writer):
+    """Private function that saves the ADLP workbook. This is when xlsxwriter reads the images inserted by path."""
+    with profiling.stage('save_workbook'):
         writer.save()
 
 
-def spr_insert_ss_senso_images(tuple_list_imgs, worksheet, path_ss_img, path_senso_img, biacore):
+def spr_insert_ss_senso_images(tuple_list_imgs, worksheet, path_ss_img, path_senso_img, biacore, prepare_images=False):
     """
     Does the work of inserting the spr steady state and sensorgram images into the excel worksheet.
     :param tuple_list: List of tuples containing (steady state image, sensorgram image)
@@ -258,16 +587,19 @@ def spr_insert_ss_senso_images(tuple_list_imgs, worksheet, path_ss_img, path_sen
     :param path_ss_img: Directory to the steady state images to insert.
     :param path_senso_img: Directory to the sensorgram images to insert.
     :param biacore: Instrument used in experiment.  Images are sized differently between 8k and all other instruments.
+    :param prepare_images: Optional flag to scale the images down to the height of the rows and recompress them first.
     :return: None
     """
 
     logging.info('Attempting to insert Sensogram Images into Excel workbook...')
 
     # Dictionary of Excel cell format parameters for each instrument as the images are slightly different.
-    if biacore == 'Biacore8K':
-        cell_format = {'cell_height': 210, 'first_col': 3, 'last_col': 4, 'width': 24}
-    else:
-        cell_format = {'cell_height': 235, 'first_col': 4, 'last_col': 5, 'width': 58}
+    cell_format = ss_senso_cell_format(biacore)
+
+    if prepare_images:
+        tuple_list_imgs, path_ss_img, path_senso_img = image_prep.prepare_ss_senso_imgs(
+            tuple_list_imgs, path_ss_img, path_senso_img,
+            max_height=image_prep.row_height_pixels(cell_format['cell_height']))
 
     # Format the rows and columns in the worksheet to fit the images.
     num_images = len(tuple_list_imgs)
@@ -281,14 +613,44 @@ def spr_insert_ss_senso_images(tuple_list_imgs, worksheet, path_ss_img, path_sen
                          width=cell_format['width'])
 
     row = 2
-    for ss_img, senso_img in tuple_list_imgs:
-        worksheet.insert_image('E' + str(row), path_ss_img + '/' + ss_img)
-        worksheet.insert_image('F' + str(row), path_senso_img + '/' + senso_img)
-        row += 1
+    with profiling.stage('insert_sensorgram_images'):
+        for ss_img, senso_img in tuple_list_imgs:
+            insert_ss_senso_imgs(worksheet, row, ss_img, senso_img, path_ss_img, path_senso_img)
+            row += 1
 
     logging.info('Sensorgram images inserted into Excel workbook successfully, proceeding...')
 
 
+def ss_senso_cell_format(biacore):
+    """
+    :param biacore: Instrument used in experiment.
+    :return: Dictionary with the row height and the first column, last column and width of the columns of the steady
+        state and sensorgram images.
+    """
+    if biacore == 'Biacore8K':
+        return {'cell_height': 210, 'first_col': 3, 'last_col': 4, 'width': 24}
+    else:
+        return {'cell_height': 235, 'first_col': 4, 'last_col': 5, 'width': 58}
+
+
+def insert_ss_senso_imgs(worksheet, row, ss_img, senso_img, path_ss_img, path_senso_img):
+    """
+    Inserts the steady state and sensorgram images of one row of the ADLP file in columns E and F.
+
+    :param worksheet: xlsxwriter object used to insert the images to a worksheet
+    :param row: Excel row number, starting at 1.
+    :param ss_img: File name of the steady state image.
+    :param senso_img: File name of the sensorgram image.
+    :param path_ss_img: Directory to the steady state images to insert.
+    :param path_senso_img: Directory to the sensorgram images to insert.
+    :return: None
+    """
+    worksheet.insert_image('E' + str(row), path_ss_img + '/' + ss_img)
+    worksheet.insert_image('F' + str(row), path_senso_img + '/' + senso_img)
+    profiling.add_file_read(path_ss_img + '/' + ss_img)
+    profiling.add_file_read(path_senso_img + '/' + senso_img)
+
+
 def get_predefined_comments():
     """
     Method for retrieving a common list of comments to include in the SPR_to_ADLP output file.
@@ -381,6 +743,20 @@ def _percent_bind_helper_filter_non_corr_data_non_8k(df, ref_fc_used_arr, fc_use
     return df_rpt_pts_trim
 
 
+def cmpd_set_for_merge(df_cmpd_set):
+    """
+    Adds the columns the report points are merged on to a copy of the setup table: the 4 digit BRD number as
+    BRD_MERGE and the top concentration as a float rounded to 2 decimals. The setup table itself is left as it is, as
+    the other stages of a run read it at the same time.
+
+    :param df_cmpd_set: SPR Setup table as a DataFrame.
+    :return: New DataFrame of the setup table with the merge columns.
+    """
+    # To prevent a merge error it is necessary to round the concentration in both merged data frames.
+    return df_cmpd_set.assign(**{'BRD_MERGE': 'BRD-' + df_cmpd_set['Broad ID'].str[9:13],
+                                 'Test [Cpd] uM': round(df_cmpd_set['Test [Cpd] uM'].astype('float'), 2)})
+
+
 def spr_binding_top_for_dot_file(report_pt_file, df_cmpd_set, instrument, fc_used, ref_fc_used_arr=None):
 
     logging.info('Calculating percent binding of compound at top concentration...')
@@ -397,8 +773,10 @@ def spr_binding_top_for_dot_file(report_pt_file, df_cmpd_set, instrument, fc_use
 
     try:
         # Read in data
-        df_rpt_pts_all = pd.read_excel(report_pt_file, sheet_name=report_pt_read_parm['name'],
-                                       skiprows=report_pt_read_parm['skip'])
+        with profiling.stage('read_report_points'):
+            profiling.add_file_read(report_pt_file)
+            df_rpt_pts_all = pd.read_excel(report_pt_file, sheet_name=report_pt_read_parm['name'],
+                                           skiprows=report_pt_read_parm['skip'])
     except:
         raise FileNotFoundError('The files could not be imported please check.')
 
@@ -481,22 +859,17 @@ def spr_binding_top_for_dot_file(report_pt_file, df_cmpd_set, instrument, fc_use
 
     # Create a new column of BRD 4 digit numbers to merge
     df_rpt_pts_trim['BRD_MERGE'] = df_rpt_pts_trim['Sample_1_Sample'].str.split('_', expand=True)[0]
-    df_cmpd_set['BRD_MERGE'] = 'BRD-' + df_cmpd_set['Broad ID'].str[9:13]
-
-    # Convert compound set concentration column to float so DataFrames can be merged.
-    df_cmpd_set['Test [Cpd] uM'] = df_cmpd_set['Test [Cpd] uM'].astype('float')
 
     # Merge the report point DataFrame and compound set DataFrame on Top concentration which results in a new
     # Dataframe
     # with only the data for the top concentrations run.
     # To prevent a merge error it is necessary to round sample concentration in both merged data frames.
     df_rpt_pts_trim['Sample_1_Conc [µM]'] = round(df_rpt_pts_trim['Sample_1_Conc [µM]'], 2)
-    df_cmpd_set['Test [Cpd] uM'] = round(df_cmpd_set['Test [Cpd] uM'], 2)
 
     # Conduct the merge.
     # Note: resetting the index just in case as somtimes this causes issues. (Didn't fully explore).
     df_rpt_pts_trim = df_rpt_pts_trim.reset_index(drop=True)
-    df_rpt_pts_trim = pd.merge(left=df_rpt_pts_trim, right=df_cmpd_set,
+    df_rpt_pts_trim = pd.merge(left=df_rpt_pts_trim, right=cmpd_set_for_merge(df_cmpd_set),
                                left_on=['BRD_MERGE', 'Sample_1_Conc [µM]'],
                                right_on=['BRD_MERGE', 'Test [Cpd] uM'], how='inner')
 
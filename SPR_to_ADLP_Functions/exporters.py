@@ -0,0 +1,168 @@
+"""
+Module that exports the ADLP table as CSV or Parquet with the images in a separate bundle.
+
+Embedding the images in the xlsx makes the file large and slow to write and open. In the CSV and Parquet formats the
+table is written on its own and the images are copied to a zip file next to it. A manifest links each row of the table
+to its images through SS_IMG_ID and SENSO_IMG_ID and gives the name of each image in the zip. The images are stored
+without compression as PNG files are already compressed.
+"""
+import importlib.util
+import logging
+import os
+import zipfile
+from io import BytesIO
+
+import pandas as pd
+
+from SPR_to_ADLP_Functions import common_functions
+from SPR_to_ADLP_Functions import profiling
+
+EXPORT_FORMATS = ['xlsx', 'csv', 'parquet']
+
+# Packages pandas writes Parquet files with.
+PARQUET_ENGINES = ['pyarrow', 'fastparquet']
+PARQUET_ENGINE_MISSING = 'Writing Parquet files needs pyarrow or fastparquet. Install one of them or use --format csv.'
+
+# Columns of the ADLP table copied to the manifest to identify each row.
+MANIFEST_ID_COLUMNS = ['UNIQUE_ID', 'BROAD_ID', 'FC', 'SS_IMG_ID', 'SENSO_IMG_ID']
+
+
+def export_paths(adlp_save_file_path, export_format):
+    """
+    Paths of the files written for an export format.
+
+    :param adlp_save_file_path: Path of the ADLP xlsx file.
+    :param export_format: One of EXPORT_FORMATS other than xlsx.
+    :return: Tuple of the paths of the table, the manifest and the image bundle.
+    """
+    base_path = os.path.splitext(adlp_save_file_path)[0]
+    return base_path + '.' + export_format, base_path + '_manifest.csv', base_path + '_images.zip'
+
+
+def check_export_format(export_format):
+    """
+    Checks that the ADLP file can be written in a format before the run starts, so a run does not fail at its last
+    stage after every file was read and the 8K images were renamed.
+
+    :param export_format: One of EXPORT_FORMATS.
+    :return: None
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError('Unknown export format: ' + str(export_format) + '. Choose from ' + ', '.join(EXPORT_FORMATS))
+
+    # The engines are only looked up, not imported, as they are slow to import.
+    if export_format == 'parquet' and not any(importlib.util.find_spec(engine) for engine in PARQUET_ENGINES):
+        raise RuntimeError(PARQUET_ENGINE_MISSING)
+
+
+def write_table(df_final_for_dot, save_path, export_format):
+    """
+    Writes the ADLP table as CSV or Parquet.
+
+    :param df_final_for_dot: DataFrame of the ADLP file.
+    :param save_path: Path of the table.
+    :param export_format: 'csv' or 'parquet'.
+    :return: None
+    """
+    if export_format == 'csv':
+        df_final_for_dot.to_csv(save_path, index=False)
+    elif export_format == 'parquet':
+        try:
+            df_final_for_dot.to_parquet(save_path, index=False)
+        except ImportError:
+            raise RuntimeError(PARQUET_ENGINE_MISSING)
+    else:
+        raise ValueError('Unknown export format: ' + str(export_format) + '. Choose from ' + ', '.join(EXPORT_FORMATS))
+
+
+def write_image_bundle(bundle_path, tuple_list_imgs, path_ss_img, path_senso_img, ls_structure_imgs=None):
+    """
+    Copies the images of the ADLP file into a zip file.
+
+    :param bundle_path: Path of the zip file.
+    :param tuple_list_imgs: List of tuples containing (steady state image, sensorgram image), one per row.
+    :param path_ss_img: Directory to the steady state images.
+    :param path_senso_img: Directory to the sensorgram images.
+    :param ls_structure_imgs: Optional list of structure images, one per row, as paths, BytesIO buffers or
+        'Not Found'.
+    :return: DataFrame with the name in the zip of the SS_IMG, SENSO_IMG and, if given, STRUCTURE_IMG of each row.
+    """
+    dict_bundle = {'SS_IMG': [], 'SENSO_IMG': []}
+    if ls_structure_imgs is not None:
+        dict_bundle['STRUCTURE_IMG'] = []
+
+    with zipfile.ZipFile(bundle_path, 'w', compression=zipfile.ZIP_STORED) as bundle:
+        # Name in the zip of each image already added. The same structure is repeated on each row of a compound.
+        dict_names = {}
+
+        def add(img, name):
+            key = id(img) if isinstance(img, BytesIO) else img
+            if key not in dict_names:
+                if isinstance(img, BytesIO):
+                    bundle.writestr(name, img.getvalue())
+                else:
+                    bundle.write(img, name)
+                dict_names[key] = name
+            return dict_names[key]
+
+        for ss_img, senso_img in tuple_list_imgs:
+            dict_bundle['SS_IMG'].append(add(os.path.join(path_ss_img, ss_img), 'steady_state/' + ss_img))
+            dict_bundle['SENSO_IMG'].append(add(os.path.join(path_senso_img, senso_img), 'sensorgram/' + senso_img))
+
+        if ls_structure_imgs is not None:
+            for row, img in enumerate(ls_structure_imgs):
+                if isinstance(img, str) and img == 'Not Found':
+                    dict_bundle['STRUCTURE_IMG'].append(None)
+                else:
+                    # In-memory images have no file name, so they are named after their row as in the xlsx.
+                    name = 'structure_' + str(row + 2) + '.png' if isinstance(img, BytesIO) else os.path.basename(img)
+                    dict_bundle['STRUCTURE_IMG'].append(add(img, 'structures/' + name))
+
+    return pd.concat([pd.Series(ls_names, name=col) for col, ls_names in dict_bundle.items()], axis=1)
+
+
+def export_adlp_file(adlp_save_file_path, export_format, df_final_for_dot, tuple_list_imgs, path_ss_img,
+                     path_senso_img, df_cmpd_set, num_fc_used, structures=False, render_workers=1,
+                     df_struct_smiles=None):
+    """
+    Exports the ADLP table as CSV or Parquet together with a manifest and a zip of the images.
+
+    :param adlp_save_file_path: Path of the ADLP xlsx file. The exported files are saved next to it.
+    :param export_format: 'csv' or 'parquet'.
+    :param df_final_for_dot: DataFrame of the ADLP file.
+    :param tuple_list_imgs: List of tuples containing (steady state image, sensorgram image), one per row.
+    :param path_ss_img: Directory to the steady state images.
+    :param path_senso_img: Directory to the sensorgram images.
+    :param df_cmpd_set: SPR Setup table as a DataFrame, used to look up the structures.
+    :param num_fc_used: Number of rows of the ADLP file for each compound.
+    :param structures: Flag to add the structures to the image bundle.
+    :param render_workers: Number of processes used to render the structures.
+    :param df_struct_smiles: Optional SMILES already looked up with common_functions.get_structure_smiles.
+    :return: Tuple of the paths of the table, the manifest and the image bundle.
+    """
+    table_path, manifest_path, bundle_path = export_paths(adlp_save_file_path, export_format)
+
+    with profiling.stage('write_table'):
+        write_table(df_final_for_dot, table_path, export_format)
+
+    ls_structure_imgs, image_cache = common_functions.get_structure_imgs(df_cmpd_set=df_cmpd_set,
+                                                                         num_fc_used=num_fc_used,
+                                                                         structures=structures,
+                                                                         render_workers=render_workers,
+                                                                         df_struct_smiles=df_struct_smiles)
+
+    with profiling.stage('write_image_bundle'):
+        df_bundle = write_image_bundle(bundle_path, tuple_list_imgs, path_ss_img, path_senso_img,
+                                       ls_structure_imgs=ls_structure_imgs)
+
+    # The images have been copied into the bundle so the cache can now be trimmed.
+    if image_cache is not None:
+        image_cache.prune()
+
+    # Rows without images, such as the 8K rows past the last image, are kept in the manifest with empty names.
+    df_manifest = df_final_for_dot.loc[:, MANIFEST_ID_COLUMNS].reset_index(drop=True)
+    df_manifest = pd.concat([df_manifest, df_bundle], axis=1)
+    df_manifest.to_csv(manifest_path, index=False)
+
+    logging.info('ADLP table exported to ' + table_path + ' with images in ' + bundle_path)
+    return table_path, manifest_path, bundle_path
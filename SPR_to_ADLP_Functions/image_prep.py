@@ -0,0 +1,133 @@
+"""
+Module that prepares the steady state and sensorgram images before they are embedded in the ADLP file.
+
+Biacore exports the plots at full resolution and they used to be embedded as they are, although the rows of the ADLP
+file only show them 235 points high (210 for the 8K). Each image is scaled down to the height of its row, keeping its
+aspect ratio, and saved again as a PNG with a palette of 256 colours, which looks the same at that size. Images that are
+already small enough are only saved with a palette when it keeps every pixel, and are kept as they are if they do not
+get smaller.
+
+The prepared images are kept in a local cache keyed by the path and modification time of the source image, so images
+that have not changed are only prepared once. Images are prepared in a thread pool as Pillow releases the GIL while it
+decodes, resizes and encodes.
+"""
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from SPR_to_ADLP_Functions import caches
+from SPR_to_ADLP_Functions import common_functions
+from SPR_to_ADLP_Functions import profiling
+
+
+def row_height_pixels(cell_height):
+    """
+    :param cell_height: Height of a row in points, as given to set_row.
+    :return: Height of the row in pixels, as Excel shows it at 100 %.
+    """
+    return int(round(cell_height * 4 / 3))
+
+
+def prepare_img(source_path, save_path, max_height):
+    """
+    Scales an image down to max_height, keeping its aspect ratio, and saves it again as a PNG.
+
+    :param source_path: Path to the source image.
+    :param save_path: Path to save the prepared image to.
+    :param max_height: Maximum height of the image in pixels. Smaller images are not scaled up.
+    :return: None
+    """
+    # Pillow is only loaded when images are prepared.
+    Image = common_functions._lazy_import('PIL.Image')
+
+    with Image.open(source_path) as img:
+        img.load()
+        resized = img.height > max_height
+        if resized:
+            width = max(1, int(round(img.width * max_height / img.height)))
+            # The image is first reduced by a whole factor, which is much faster and looks the same at this size.
+            img = img.resize((width, max_height), Image.LANCZOS, reducing_gap=3.0)
+
+        if img.mode == 'RGBA' and img.getextrema()[3] == (255, 255):
+            img = img.convert('RGB')
+
+        if img.mode in ('RGB', 'RGBA') and resized:
+            # Scaling adds many shades to the edges of the lines. A palette of 256 colours looks the same at this size
+            # and compresses several times better.
+            img = img.quantize(colors=256, method=Image.FASTOCTREE)
+        elif img.mode == 'RGB' and img.getcolors(256) is not None:
+            # Images that are not scaled are only saved with a palette when it keeps every pixel.
+            img_palette = img.convert('P', palette=Image.ADAPTIVE, colors=256)
+            if img_palette.convert('RGB').tobytes() == img.tobytes():
+                img = img_palette
+
+        img.save(save_path, format='PNG')
+
+    if not resized and os.path.getsize(save_path) >= os.path.getsize(source_path):
+        shutil.copyfile(source_path, save_path)
+
+
+def _prepare_cached(source_path, image_cache, max_height):
+    """
+    Private function that returns the path of the prepared image and whether it had to be prepared, as it was not in
+    the cache.
+    """
+    img_path = image_cache.get(source_path, max_height)
+    if img_path is not None:
+        return img_path, False
+
+    def render(save_path):
+        try:
+            prepare_img(source_path, save_path, max_height)
+        except (OSError, ValueError) as e:
+            # xlsxwriter reads more kinds of images than get prepared here, so these are embedded unchanged.
+            logging.info('The image %s could not be prepared (%s). It is embedded unchanged.', source_path, e)
+            shutil.copyfile(source_path, save_path)
+
+    return image_cache.put(source_path, max_height, render), True
+
+
+def prepare_ss_senso_imgs(tuple_list_imgs, path_ss_img, path_senso_img, max_height, workers=None, image_cache=None):
+    """
+    Prepares the steady state and sensorgram images of the ADLP file, or takes them from the local cache.
+
+    :param tuple_list_imgs: List of tuples containing (steady state image, sensorgram image), one per row.
+    :param path_ss_img: Directory to the steady state images.
+    :param path_senso_img: Directory to the sensorgram images.
+    :param max_height: Height in pixels the images are scaled down to.
+    :param workers: Number of threads used to prepare the images. Defaults to the ThreadPoolExecutor default.
+    :param image_cache: PreparedImageCache to use. Defaults to the one in the cache folder.
+    :return: Tuple of the list of (steady state image, sensorgram image) tuples, the directory of the prepared steady
+        state images and the directory of the prepared sensorgram images. The images are returned unchanged if the
+        cache cannot be opened.
+    """
+    if image_cache is None:
+        image_cache = caches.get_prepared_image_cache()
+    if image_cache is None:
+        return tuple_list_imgs, path_ss_img, path_senso_img
+
+    logging.info('Preparing the steady state and sensorgram images...')
+    ls_sources = [path_ss_img + '/' + ss_img for ss_img, _ in tuple_list_imgs] + \
+                 [path_senso_img + '/' + senso_img for _, senso_img in tuple_list_imgs]
+
+    # Each image is prepared once, even if it is used on several rows.
+    ls_unique_sources = list(dict.fromkeys(ls_sources))
+    with profiling.stage('prepare_images'):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            dict_prepared = dict(zip(ls_unique_sources,
+                                     executor.map(partial(_prepare_cached, image_cache=image_cache,
+                                                          max_height=max_height), ls_unique_sources)))
+
+        # The reads are counted here as the profiler is not shared between threads.
+        for source, (_, was_prepared) in dict_prepared.items():
+            if was_prepared:
+                profiling.add_file_read(source)
+
+    # The images of this run are kept, as xlsxwriter may only read them when the workbook is saved.
+    image_cache.prune()
+
+    ls_prepared = [os.path.basename(dict_prepared[source][0]) for source in ls_sources]
+    num_imgs = len(tuple_list_imgs)
+    return list(zip(ls_prepared[:num_imgs], ls_prepared[num_imgs:])), image_cache.cache_dir, image_cache.cache_dir
@@ -0,0 +1,70 @@
+"""
+Module that reads the report point, steady state and kinetic fit files of an experiment ahead of the stages that parse
+them.
+
+The files are usually on the Iron share, where a read spends most of its time waiting on the network. The load stages
+only copy the bytes of each file into memory, so they start as soon as the configuration file gives their paths and
+run at the same time as each other, as reading the setup table and as looking up the SMILES. The stages that parse the
+files then read them from memory and start as soon as the file they need is loaded, without waiting on the others.
+"""
+import io
+import logging
+
+from SPR_to_ADLP_Functions.pipeline import Stage
+
+
+def read_ahead(path):
+    """
+    Reads a file into memory.
+
+    :param path: Path of the file.
+    :return: BytesIO of the file, named after its path. If the file cannot be read the path is returned instead, so the
+        stage that parses the file reads it itself and reports the error as it would without the loader.
+    """
+    try:
+        with open(path, 'rb') as f:
+            buffer = io.BytesIO(f.read())
+    except (OSError, TypeError, ValueError) as e:
+        logging.info('Could not read %s ahead (%s).', path, e)
+        return path
+
+    buffer.name = path
+    return buffer
+
+
+def load_report_points(path_report_pt):
+    """
+    Stage that reads the report point file into memory.
+
+    :param path_report_pt: Path of the report point file.
+    :return: The file as returned by read_ahead.
+    """
+    return read_ahead(path_report_pt)
+
+
+def load_steady_state(path_ss_txt):
+    """
+    Stage that reads the steady state fit file into memory.
+
+    :param path_ss_txt: Path of the steady state fit file.
+    :return: The file as returned by read_ahead.
+    """
+    return read_ahead(path_ss_txt)
+
+
+def load_kinetics(path_senso_txt):
+    """
+    Stage that reads the kinetic fit file into memory.
+
+    :param path_senso_txt: Path of the kinetic fit file.
+    :return: The file as returned by read_ahead.
+    """
+    return read_ahead(path_senso_txt)
+
+
+# Stages that load the files of an experiment, added to the pipeline of each script after the configuration stage.
+LOAD_STAGES = [
+    Stage('load_report_points', load_report_points, inputs=['path_report_pt'], outputs=['report_pt_file']),
+    Stage('load_steady_state', load_steady_state, inputs=['path_ss_txt'], outputs=['ss_file']),
+    Stage('load_kinetics', load_kinetics, inputs=['path_senso_txt'], outputs=['senso_file']),
+]
@@ -0,0 +1,143 @@
+"""
+Module that runs the stages of an ADLP script as a graph.
+
+A script declares its stages, each a function with named inputs and outputs, and the pipeline works out the order they
+run in. A stage starts as soon as all of its inputs are known, either given when the pipeline is run or given by the
+stages before it, so stages that do not depend on each other, such as parsing the report point, steady state and
+kinetic files and looking up the SMILES, run at the same time in a pool of threads. Reading the files and waiting on
+resultsdb release the GIL, so these stages overlap even though they run in one process.
+
+A profiled run runs its stages one at a time in the order they are declared, as the profiler measures one stage at a
+time.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from SPR_to_ADLP_Functions import profiling
+
+# Number of threads the stages of a run are spread across.
+DEFAULT_WORKERS = 4
+
+
+class Stage:
+    """
+    One step of a pipeline.
+
+    :param name: Name of the stage.
+    :param func: Function run by the stage. It is called with the inputs as keyword arguments and returns the value of
+        its output, or a tuple with the values of its outputs in order when it has more than one.
+    :param inputs: Names of the values the stage needs.
+    :param outputs: Names of the values the stage gives.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+    def __repr__(self):
+        return 'Stage({!r})'.format(self.name)
+
+    def run(self, values):
+        """
+        :param values: Dictionary containing at least the inputs of the stage.
+        :return: Dictionary of the outputs of the stage.
+        """
+        result = self.func(**{name: values[name] for name in self.inputs})
+        if len(self.outputs) == 0:
+            return {}
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        if len(result) != len(self.outputs):
+            raise ValueError('Stage {} returned {} values for its {} outputs.'.format(self.name, len(result),
+                                                                                   len(self.outputs)))
+        return dict(zip(self.outputs, result))
+
+
+class Pipeline:
+    """
+    Stages run in the order of their inputs and outputs.
+
+    :param stages: List of the Stage objects, in the order they are run when the run is profiled.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+        ls_names = [stage.name for stage in self.stages]
+        if len(set(ls_names)) != len(ls_names):
+            raise ValueError('The names of the stages must be unique.')
+
+        ls_outputs = [output for stage in self.stages for output in stage.outputs]
+        if len(set(ls_outputs)) != len(ls_outputs):
+            raise ValueError('Each value must be given by a single stage.')
+
+    def order(self, inputs):
+        """
+        Orders the stages so each one comes after the stages it needs.
+
+        :param inputs: Names of the values given when the pipeline is run.
+        :return: List of the stages. A stage comes before the stages declared after it unless it needs them.
+        """
+        known = set(inputs)
+        ls_pending = list(self.stages)
+        ls_ordered = []
+        while len(ls_pending) > 0:
+            for stage in ls_pending:
+                if known.issuperset(stage.inputs):
+                    break
+            else:
+                missing = sorted(set(name for stage in ls_pending for name in stage.inputs) - known)
+                raise ValueError('The stages {} wait on values that are never given: {}'.format(
+                    ', '.join(stage.name for stage in ls_pending), ', '.join(missing)))
+
+            ls_pending.remove(stage)
+            ls_ordered.append(stage)
+            known.update(stage.outputs)
+
+        return ls_ordered
+
+    def run(self, values, workers=DEFAULT_WORKERS):
+        """
+        Runs the stages. The outputs of the stages are added to values as they finish, so after a failure values holds
+        the outputs of the stages that finished.
+
+        If a stage fails, no other stage is started. The stages that are running are finished and then the error of
+        the stage that failed first is raised.
+
+        :param values: Dictionary of the values given to the stages, such as the options of the script.
+        :param workers: Number of stages run at the same time.
+        :return: values
+        """
+        ls_pending = self.order(values)
+
+        if workers <= 1 or profiling.is_active():
+            for stage in ls_pending:
+                values.update(stage.run(values))
+            return values
+
+        error = None
+        running = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                if error is None:
+                    for stage in [stage for stage in ls_pending if all(name in values for name in stage.inputs)]:
+                        ls_pending.remove(stage)
+                        stage_inputs = {name: values[name] for name in stage.inputs}
+                        running[executor.submit(stage.run, stage_inputs)] = stage
+
+                if len(running) == 0:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+                    try:
+                        values.update(future.result())
+                    except Exception as e:
+                        if error is None:
+                            error = e
+
+        if error is not None:
+            raise error
+        return values
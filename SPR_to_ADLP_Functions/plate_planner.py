@@ -0,0 +1,181 @@
+"""
+Module that plans the injection order of a Biacore 8K run across one or more 384 well plates.
+
+The 8K head has 8 needles that sweep across the plate together, so each pass of the head runs one compound per
+needle. Every compound needs num_pts + 2 wells (two blanks and its titration), which limits how many passes fit on
+one plate. Compounds are assigned to plates in the order of the setup table and each plate gets its own ordered
+injection list. If the number of compounds is not a multiple of 8, the last pass runs with fewer compounds and the
+needles without a compound get a placeholder row.
+"""
+import numpy as np
+import pandas as pd
+
+# Number of wells on the plates loaded into the 8K.
+WELLS_PER_PLATE = 384
+
+# Number of needles on the 8K head.
+NUM_NEEDLES = 8
+
+# Position used in an injection order for a needle that has no compound.
+EMPTY_NEEDLE = -1
+
+
+def cmpds_per_plate(num_pts, wells_per_plate=WELLS_PER_PLATE, num_needles=NUM_NEEDLES):
+    """
+    Returns the number of compounds that fit on one plate.
+
+    :param num_pts: Number of points in each titration, not counting the two blanks.
+    :param wells_per_plate: Number of wells on a plate.
+    :param num_needles: Number of needles on the instrument head.
+    :return: Number of compounds per plate. Always a multiple of num_needles.
+    """
+    num_passes = wells_per_plate // (num_needles * (num_pts + 2))
+    if num_passes == 0:
+        raise ValueError('A titration of ' + str(num_pts) + ' points does not fit on a ' + str(wells_per_plate) +
+                         ' well plate.')
+    return num_passes * num_needles
+
+
+def num_pts_of_run(df_setup):
+    """
+    Returns the number of points in the titrations of an 8K run. The needles of a pass inject together, so every
+    compound of the run must use the same number of points.
+
+    :param df_setup: Setup table with one row per compound and a 'num_pts' column.
+    :return: Number of points in each titration, not counting the two blanks.
+    """
+    ls_num_pts = sorted(df_setup['num_pts'].astype(int).unique())
+    if len(ls_num_pts) > 1:
+        raise ValueError('All compounds of an 8K run must use the same number of points. The setup table has '
+                         'compounds with ' + ', '.join(str(num_pts) for num_pts in ls_num_pts) + ' points.')
+    return int(df_setup.iloc[0]['num_pts'])
+
+
+def needle_pass_order(num_cmpds, num_pts, num_needles=NUM_NEEDLES):
+    """
+    Computes the 8K injection order of the compounds on one plate.
+
+    The rows are expected to be laid out one compound after the other, each compound taking num_pts + 2 consecutive
+    rows: two blanks followed by its titration from the lowest to the highest concentration. Each pass of the head
+    runs the first blank of its compounds, then their second blank, then the titrations ordered by concentration and
+    then by needle. If num_cmpds is not a multiple of num_needles, the needles without a compound in the last pass are
+    marked with EMPTY_NEEDLE.
+
+    :param num_cmpds: Number of compounds on the plate.
+    :param num_pts: Number of points in each titration, not counting the two blanks.
+    :param num_needles: Number of needles on the instrument head.
+    :return: numpy array of row positions in injection order.
+    """
+    rows_per_cmpd = num_pts + 2
+    num_needle_pass = -(-num_cmpds // num_needles)
+
+    # Compound on each needle laid out as one row of needles per pass.
+    cmpd = np.arange(num_needle_pass * num_needles).reshape(num_needle_pass, num_needles)
+    first_row = cmpd * rows_per_cmpd
+
+    # Titrations for each pass ordered by concentration and then by needle.
+    titration = first_row[:, np.newaxis, :] + 2 + np.arange(num_pts)[np.newaxis, :, np.newaxis]
+    titration = titration.reshape(num_needle_pass, num_pts * num_needles)
+
+    order = np.hstack([first_row, first_row + 1, titration])
+
+    # Needles without a compound in the last pass.
+    empty = np.tile(cmpd >= num_cmpds, num_pts + 2)
+    order[empty] = EMPTY_NEEDLE
+
+    return order.ravel()
+
+
+def plan_plates(num_cmpds, num_pts, wells_per_plate=WELLS_PER_PLATE, num_needles=NUM_NEEDLES):
+    """
+    Splits a campaign across as many plates as needed.
+
+    :param num_cmpds: Total number of compounds.
+    :param num_pts: Number of points in each titration, not counting the two blanks.
+    :param wells_per_plate: Number of wells on a plate.
+    :param num_needles: Number of needles on the instrument head.
+    :return: List with one numpy array per plate of the row positions, in the full setup table, in injection order.
+        Needles without a compound are marked with EMPTY_NEEDLE.
+    """
+    plate_capacity = cmpds_per_plate(num_pts, wells_per_plate=wells_per_plate, num_needles=num_needles)
+    rows_per_cmpd = num_pts + 2
+
+    ls_plate_orders = []
+    for first_cmpd in range(0, num_cmpds, plate_capacity):
+        num_plate_cmpds = min(plate_capacity, num_cmpds - first_cmpd)
+        order = needle_pass_order(num_plate_cmpds, num_pts, num_needles=num_needles)
+        ls_plate_orders.append(np.where(order == EMPTY_NEEDLE, EMPTY_NEEDLE, order + first_cmpd * rows_per_cmpd))
+
+    return ls_plate_orders
+
+
+def split_into_plates(final_df, num_cmpds, num_pts, empty_needle_row=None, wells_per_plate=WELLS_PER_PLATE,
+                      num_needles=NUM_NEEDLES):
+    """
+    Splits a setup table with one row per injection into one ordered DataFrame per plate.
+
+    :param final_df: Setup table with num_pts + 2 consecutive rows for each compound.
+    :param num_cmpds: Total number of compounds.
+    :param num_pts: Number of points in each titration, not counting the two blanks.
+    :param empty_needle_row: Dictionary of column values for the placeholder row of a needle without a compound.
+        Columns that are not given are left empty.
+    :param wells_per_plate: Number of wells on a plate.
+    :param num_needles: Number of needles on the instrument head.
+    :return: List of DataFrames, one per plate, in injection order.
+    """
+    if len(final_df) != num_cmpds * (num_pts + 2):
+        raise ValueError('All compounds of an 8K run must use the same number of points.')
+
+    ls_plate_orders = plan_plates(num_cmpds, num_pts, wells_per_plate=wells_per_plate, num_needles=num_needles)
+
+    # The placeholder row is added after the last row of the setup table so empty needles can be taken like any row.
+    if num_cmpds % num_needles != 0:
+        df_empty = pd.DataFrame([empty_needle_row or {}], columns=final_df.columns)
+        final_df = pd.concat([final_df, df_empty], ignore_index=True)
+        ls_plate_orders = [np.where(order == EMPTY_NEEDLE, len(final_df) - 1, order) for order in ls_plate_orders]
+
+    return [final_df.take(order).reset_index(drop=True) for order in ls_plate_orders]
+
+
+def throughput_report(num_cmpds, num_pts, wells_per_plate=WELLS_PER_PLATE, num_needles=NUM_NEEDLES):
+    """
+    Measures what running the last pass with fewer needles saves compared with padding the run with dummy compounds
+    up to a multiple of num_needles.
+
+    The plates hold a whole number of passes, so padding never adds a pass or a plate and both runs take the same
+    number of instrument cycles. What is saved are the dummy compound titrations: the compounds themselves and the
+    wells, each injected once, that their titrations would fill.
+
+    :param num_cmpds: Total number of compounds.
+    :param num_pts: Number of points in each titration, not counting the two blanks.
+    :param wells_per_plate: Number of wells on a plate.
+    :param num_needles: Number of needles on the instrument head.
+    :return: Dictionary with the numbers of the report.
+    """
+    rows_per_cmpd = num_pts + 2
+    ls_plate_orders = plan_plates(num_cmpds, num_pts, wells_per_plate=wells_per_plate, num_needles=num_needles)
+
+    num_injections = sum(len(order) for order in ls_plate_orders)
+    num_empty_needle = sum(int((order == EMPTY_NEEDLE).sum()) for order in ls_plate_orders)
+
+    return {'compounds': num_cmpds,
+            'plates': len(ls_plate_orders),
+            'needle_passes': num_injections // (num_needles * rows_per_cmpd),
+            'instrument_cycles': num_injections // num_needles,
+            'dummy_compounds_avoided': num_empty_needle // rows_per_cmpd,
+            'wells_saved': num_empty_needle}
+
+
+def print_throughput_report(num_cmpds, num_pts):
+    """
+    Prints the throughput report of a run to the console.
+
+    :param num_cmpds: Total number of compounds.
+    :param num_pts: Number of points in each titration, not counting the two blanks.
+    """
+    report = throughput_report(num_cmpds, num_pts)
+
+    print('\nThroughput report')
+    print('Compounds: {compounds}  Plates: {plates}  Needle passes: {needle_passes}  '
+          'Instrument cycles: {instrument_cycles}'.format(**report))
+    print('Dummy compounds avoided: {dummy_compounds_avoided}  Wells saved: {wells_saved}\n'.format(**report))
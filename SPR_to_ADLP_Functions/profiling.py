@@ -0,0 +1,241 @@
+"""
+Module that records how long each stage of an ADLP run takes, how many bytes it reads and how much memory it uses.
+
+A run is profiled by wrapping it in profile_run. Inside the run, any code, including the functions in
+common_functions, marks a stage with profiling.stage('name') and the script tells where its output workbook goes with
+set_output_path. Outside of a profiled run these functions do nothing, so the stages cost nothing when --profile is not
+given. The time of the run spent outside of any stage is reported as unstaged_s.
+
+Bytes read are the sizes of the files a stage reads, as reported with add_file_read. Images handed to xlsxwriter are
+counted in the stage that inserts them, although xlsxwriter only reads them when the workbook is saved. Likewise a file
+read ahead by the loader is counted in the stage that parses it.
+
+Memory is the tracemalloc peak of the Python allocations made during the stage. On Python versions without
+tracemalloc.reset_peak (before 3.9) the traces are cleared at the start of each stage instead, so the peak of a stage
+that contains other stages is a lower bound.
+"""
+import io
+import json
+import logging
+import os
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Profiler of the run in progress. None when no run is profiled.
+_active_profiler = None
+
+
+class StageProfiler:
+    """
+    Collects the measurements of the stages of one run.
+
+    :param name: Name of the run, e.g. the name of the script.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.output_path = None
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.total_wall_s = None
+        self.records = []
+        self._open = []
+        self._start = None
+        self._started_tracemalloc = False
+
+    def start(self):
+        """Starts the clock of the run and tracemalloc if it is not already tracing."""
+        self._start = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop(self):
+        """Stops the clock of the run and tracemalloc if it was started by start."""
+        self.total_wall_s = round(time.perf_counter() - self._start, 4)
+        self._update_peaks()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def _update_peaks(self):
+        """Folds the tracemalloc peak so far into every open stage before the peak is reset."""
+        if not tracemalloc.is_tracing():
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in self._open:
+            record['_peak'] = max(record['_peak'], peak)
+
+    @staticmethod
+    def _reset_peak():
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.clear_traces()
+        return tracemalloc.get_traced_memory()[0]
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measures the code run inside the with block as one stage.
+
+        :param name: Name of the stage. Stages inside other stages are recorded with their depth.
+        """
+        self._update_peaks()
+        base = self._reset_peak()
+        record = {'stage': name, 'depth': len(self._open), 'wall_s': None, 'bytes_read': 0, '_base': base,
+                  '_peak': base}
+        self.records.append(record)
+        self._open.append(record)
+
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = round(time.perf_counter() - start, 4)
+            self._update_peaks()
+            self._open.pop()
+
+    def add_bytes_read(self, num_bytes):
+        """Adds to the bytes read of the innermost open stage and of the stages it is part of."""
+        for record in self._open:
+            record['bytes_read'] += int(num_bytes)
+
+    def to_dict(self):
+        """
+        :return: Dictionary with the measurements of the run, ready to be written as JSON.
+        """
+        stages = []
+        for record in self.records:
+            stages.append({'stage': record['stage'], 'depth': record['depth'], 'wall_s': record['wall_s'],
+                           'bytes_read': record['bytes_read'],
+                           'peak_mem_bytes': max(0, record['_peak'] - record['_base'])})
+
+        unstaged_s = None
+        if self.total_wall_s is not None:
+            staged_s = sum(stage['wall_s'] for stage in stages if stage['depth'] == 0 and stage['wall_s'] is not None)
+            unstaged_s = round(max(0.0, self.total_wall_s - staged_s), 4)
+
+        return {'run': self.name,
+                'output': self.output_path,
+                'started': self.started,
+                'python': platform.python_version(),
+                'total_wall_s': self.total_wall_s,
+                'unstaged_s': unstaged_s,
+                'stages': stages}
+
+    def write_sidecar(self, output_path):
+        """
+        Writes the measurements next to the output file, named after it with a _profile.json suffix.
+
+        :param output_path: Path of the output file of the run.
+        :return: Path of the JSON file.
+        """
+        sidecar_path = sidecar_path_for(output_path)
+        with open(sidecar_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+        return sidecar_path
+
+    def log_summary(self):
+        """Logs one line per stage followed by the total time of the run."""
+        profile = self.to_dict()
+        for stage in profile['stages']:
+            logging.info('{:<40} {:>9.3f} s {:>14,} bytes read {:>14,} bytes peak'.format(
+                '  ' * stage['depth'] + stage['stage'], stage['wall_s'], stage['bytes_read'], stage['peak_mem_bytes']))
+        logging.info('{:<40} {:>9.3f} s ({:.3f} s outside of any stage)'.format(
+            'total', profile['total_wall_s'], profile['unstaged_s']))
+
+
+def sidecar_path_for(output_path):
+    """
+    :param output_path: Path of the output file of a run.
+    :return: Path of the profile JSON file written next to it.
+    """
+    return os.path.splitext(output_path)[0] + '_profile.json'
+
+
+@contextmanager
+def profile_run(name, enabled=True):
+    """
+    Profiles the run inside the with block. When the block finishes, also if it fails, the measurements are logged
+    and written next to the output file given with set_output_path.
+
+    :param name: Name of the run.
+    :param enabled: Flag to turn profiling on. When False nothing is measured or written.
+    :return: The StageProfiler of the run or None when profiling is off.
+    """
+    global _active_profiler
+
+    if not enabled:
+        yield None
+        return
+
+    profiler = StageProfiler(name)
+    previous_profiler = _active_profiler
+    _active_profiler = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active_profiler = previous_profiler
+        profiler.log_summary()
+
+        if profiler.output_path is None:
+            logging.info('The run stopped before its output file was known. The profile was not written.')
+        else:
+            try:
+                logging.info('Profile written to: ' + profiler.write_sidecar(profiler.output_path))
+            except OSError:
+                logging.info('Could not write the profile next to: ' + profiler.output_path)
+
+
+def is_active():
+    """
+    :return: True when a run is being profiled.
+    """
+    return _active_profiler is not None
+
+
+def set_output_path(output_path):
+    """
+    Tells the profiled run in progress where its output file is saved. Does nothing when no run is profiled.
+
+    :param output_path: Path of the output file.
+    """
+    if _active_profiler is not None:
+        _active_profiler.output_path = output_path
+
+
+@contextmanager
+def stage(name):
+    """
+    Marks a stage of the profiled run in progress. Does nothing when no run is profiled.
+
+    :param name: Name of the stage.
+    """
+    if _active_profiler is None:
+        yield None
+    else:
+        with _active_profiler.stage(name) as record:
+            yield record
+
+
+def add_file_read(path):
+    """
+    Counts the size of a file read by the current stage. Does nothing when no run is profiled or the file does not
+    exist.
+
+    :param path: Path of the file, or a BytesIO of the file when it was read ahead by the loader.
+    """
+    if _active_profiler is None:
+        return
+    if isinstance(path, io.BytesIO):
+        _active_profiler.add_bytes_read(path.getbuffer().nbytes)
+        return
+    try:
+        _active_profiler.add_bytes_read(os.path.getsize(path))
+    except OSError:
+        pass
@@ -0,0 +1,126 @@
+"""
+Module that keeps a journal of image renames for the Biacore 8K scripts.
+
+The 8K scripts rename the exported images in place on Iron. Before any file is renamed, the full list of
+original -> new names is written to a journal file inside the image folder. If a run crashes the journal is replayed
+in reverse to give the images back their original names, so no image ever has to be copied. A journal left behind by
+a run that was killed part way through is rolled back the next time the folder is processed, which makes restarting a
+run safe.
+"""
+import os
+import json
+import logging
+
+# Name of the journal file written to the image folder.
+JOURNAL_FILE_NAME = '.spr_adlp_rename_journal.json'
+
+# Files that should be deleted, such as the legend image, are renamed with this suffix and only removed on commit.
+DELETED_SUFFIX = '.spr_adlp_deleted'
+
+
+def journal_path(path_img):
+    """
+    Returns the path of the rename journal for an image folder.
+
+    :param path_img: Path to the folder containing the images.
+    :return: Path to the journal file.
+    """
+    return os.path.join(path_img, JOURNAL_FILE_NAME)
+
+
+def read_journal(path_img):
+    """
+    Reads the rename journal of an image folder.
+
+    :param path_img: Path to the folder containing the images.
+    :return: List of [original name, new name] records or None if there is no journal.
+    """
+    if not os.path.isfile(journal_path(path_img)):
+        return None
+
+    with open(journal_path(path_img), 'r') as f:
+        return json.load(f)['renames']
+
+
+def write_journal(path_img, renames):
+    """
+    Writes the rename journal before any file is renamed. The journal is written to a temporary file first and then
+    moved into place so that a partially written journal is never left behind.
+
+    :param path_img: Path to the folder containing the images.
+    :param renames: List of (original name, new name) tuples. Names are relative to path_img.
+    :return: None
+    """
+    if read_journal(path_img) is not None:
+        raise RuntimeError('A rename journal already exists in ' + path_img + '. Roll it back before renaming.')
+
+    tmp_path = journal_path(path_img) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'renames': [[ori, new] for ori, new in renames]}, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, journal_path(path_img))
+
+
+def apply_journal(path_img):
+    """
+    Renames the files listed in the journal. Records that were already applied are skipped so the journal can be
+    applied again after an interruption.
+
+    :param path_img: Path to the folder containing the images.
+    :return: None
+    """
+    for ori_name, new_name in read_journal(path_img):
+        ori_path = os.path.join(path_img, ori_name)
+        new_path = os.path.join(path_img, new_name)
+
+        if os.path.exists(ori_path):
+            os.rename(ori_path, new_path)
+        elif not os.path.exists(new_path):
+            raise FileNotFoundError('Image ' + ori_name + ' could not be found in ' + path_img)
+
+
+def rollback_journal(path_img):
+    """
+    Replays the journal in reverse so every renamed file gets its original name back, then removes the journal.
+    Does nothing if the folder has no journal.
+
+    :param path_img: Path to the folder containing the images.
+    :return: None
+    """
+    renames = read_journal(path_img)
+    if renames is None:
+        return
+
+    logging.info('Restoring the original image names in %s...', path_img)
+
+    for ori_name, new_name in reversed(renames):
+        ori_path = os.path.join(path_img, ori_name)
+        new_path = os.path.join(path_img, new_name)
+
+        # Only records that were applied need to be undone.
+        if os.path.exists(new_path) and not os.path.exists(ori_path):
+            os.rename(new_path, ori_path)
+
+    os.unlink(journal_path(path_img))
+
+
+def commit_journal(path_img):
+    """
+    Finalises the renames once the ADLP file has been written. Files marked for deletion are removed and the journal
+    is deleted. Does nothing if the folder has no journal.
+
+    :param path_img: Path to the folder containing the images.
+    :return: None
+    """
+    renames = read_journal(path_img)
+    if renames is None:
+        return
+
+    for ori_name, new_name in renames:
+        new_path = os.path.join(path_img, new_name)
+        if new_name.endswith(DELETED_SUFFIX) and os.path.exists(new_path):
+            os.unlink(new_path)
+
+    os.unlink(journal_path(path_img))
@@ -0,0 +1,250 @@
+"""
+Module of the pipeline stages shared by the scripts.
+
+The scripts only differ in how they read and combine the files of an experiment. The ADLP file is saved the same way
+by all of them, with a layout given by each script: the comments of the drop down, where the drop down goes, the
+columns and their width, and the instrument the images were exported from. The Biacore 8K scripts also share how the
+configuration file and the fit files are read.
+"""
+import configparser
+import logging
+from functools import partial
+
+import pandas as pd
+
+from SPR_to_ADLP_Functions import common_functions
+from SPR_to_ADLP_Functions import exporters
+from SPR_to_ADLP_Functions import streaming_writer
+from SPR_to_ADLP_Functions.pipeline import Stage
+
+# Inputs of the save stage.
+SAVE_INPUTS = ['adlp_save_file_path', 'df_final_for_dot', 'df_cmpd_set', 'df_ss_txt', 'df_senso_txt', 'path_ss_img',
+               'path_senso_img', 'meta', 'df_struct_smiles', 'render_workers', 'stream', 'export_format', 'preview',
+               'prepare_images']
+
+
+def read_8k_config(config_file, clip, functional=False):
+    """
+    Stage that collects the paths and the metadata of a Biacore 8K experiment from the configuration file.
+
+    :param config_file: Text file containing all of the metadata for an SPR experiment run at dose.
+    :param clip: Flag that indicates if the setup table exists on the clipboard.
+    :param functional: Flag that indicates a functional (displacement) experiment. Its configuration file also gives the
+        number of flow channels used and the protein floated.
+    :return: Tuple of the paths of the setup table, the steady state and sensorgram images, the steady state and kinetic
+        fit files, the report point file and a dictionary of the metadata.
+    """
+    try:
+
+        config = configparser.ConfigParser()
+        config.read(config_file)
+
+        # Get all of the file paths from the configuration file and store in variables so they are available
+        path_master_tbl = None if clip else config.get('paths', 'path_mstr_tbl')
+
+        logging.info('Collecting metadata from configuration file...')
+        path_ss_img = config.get('paths', 'path_ss_img')
+        path_senso_img = config.get('paths', 'path_senso_img')
+        path_ss_txt = config.get('paths', 'path_ss_txt')
+        path_senso_txt = config.get('paths', 'path_senso_txt')
+        path_report_pt = config.get('paths', 'path_report_pt')
+
+        # Get the flow channels immobilized
+        immobilized_fc = str(config.get('meta', 'immobilized_fc'))
+        immobilized_fc = immobilized_fc.strip(" ")
+        immobilized_fc = immobilized_fc.replace(' ', '')
+        immobilized_fc_arr = immobilized_fc.split(',')
+        immobilized_fc_arr = [int(i) for i in immobilized_fc_arr]
+
+        if functional and int(config.get('meta', 'num_fc_used')) != len(immobilized_fc_arr):
+            raise RuntimeError('The number of flow channels used is not equal to the number of immobilized flow '
+                               'channels.')
+
+        # Continue collecting variables from the configuration file.
+        meta = {'immobilized_fc_arr': immobilized_fc_arr,
+                'experiment_date': config.get('meta', 'experiment_date'),
+                'project_code': config.get('meta', 'project_code'),
+                'operator': config.get('meta', 'operator'),
+                'instrument': config.get('meta', 'instrument'),
+                'protocol': config.get('meta', 'protocol'),
+                'chip_lot': config.get('meta', 'chip_lot'),
+                'nucleotide': config.get('meta', 'nucleotide'),
+                'raw_data_filename': config.get('meta', 'raw_data_filename'),
+                'directory_folder': config.get('meta', 'directory_folder')}
+
+        # Get all of the immobilized protein info, keyed by channel.
+        # BIP
+        meta['protein_bip_dict'] = {fc: config.get('meta', 'fc' + str(fc) + '_protein_BIP') for fc in range(1, 9)}
+
+        # RU
+        meta['protein_ru_dict'] = {fc: float(config.get('meta', 'fc' + str(fc) + '_protein_RU')) for fc in range(1, 9)}
+
+        # MW
+        meta['protein_mw_dict'] = {fc: float(config.get('meta', 'fc' + str(fc) + '_protein_MW')) for fc in range(1, 9)}
+
+        # Get meta data for the protein floated
+        if functional:
+            meta['protein_floated_BIP'] = config.get('meta', 'protein_floated_BIP')
+            meta['protein_floated_conc_uM'] = float(config.get('meta', 'protein_floated_conc_uM'))
+            meta['protein_floated_MW'] = float(config.get('meta', 'protein_floated_MW'))
+
+    except Exception:
+        raise RuntimeError('Something is wrong with the config file. Please check.')
+
+    return path_master_tbl, path_ss_img, path_senso_img, path_ss_txt, path_senso_txt, path_report_pt, meta
+
+
+def _read_8k_fit_file(path_txt):
+    """Private function that reads a steady state or kinetic fit file exported from a Biacore 8K instrument."""
+    try:
+        # The file is read once. The header row is the row containing "Group" and is found while reading.
+        return common_functions.read_excel_from_header(path_txt, header_value='Group')
+
+    except Exception:
+        raise RuntimeError('Issue reading in data from either steady state or kinetic Excels files.')
+
+
+def read_8k_steady_state(ss_file):
+    """
+    Stage that reads the steady state fit file of a Biacore 8K experiment.
+
+    :param ss_file: Excel file of the steady state fits read ahead by the loader, or its path.
+    :return: DataFrame of the steady state fits.
+    """
+    return _read_8k_fit_file(ss_file)
+
+
+def read_8k_kinetics(senso_file):
+    """
+    Stage that reads the kinetic fit file of a Biacore 8K experiment.
+
+    :param senso_file: Excel file of the kinetic fits read ahead by the loader, or its path.
+    :return: DataFrame of the kinetic fits.
+    """
+    return _read_8k_fit_file(senso_file)
+
+
+def save_adlp_file(adlp_save_file_path, df_final_for_dot, df_cmpd_set, df_ss_txt, df_senso_txt, path_ss_img,
+                   path_senso_img, meta, df_struct_smiles, render_workers, stream, export_format, preview,
+                   prepare_images, comments_list=None, validation_range='T1:T', rows_per_cmpd=1, column_range='A:AK',
+                   column_width=28, img_columns=('Steady_State_Img', 'Senso_Img'), instrument=None, num_fc_used=None):
+    """
+    Stage that writes the ADLP file with its images, or exports the table and a bundle of the images.
+
+    The xlsx is written through pd.ExcelWriter, or row by row in constant memory mode when streaming. With csv or
+    parquet the xlsx is only written as a preview on request.
+
+    :param adlp_save_file_path: Path of the ADLP xlsx file.
+    :param df_final_for_dot: DataFrame of the ADLP file without the images.
+    :param df_cmpd_set: SPR Setup table as a DataFrame.
+    :param df_ss_txt: DataFrame of the steady state fits with the names of their images.
+    :param df_senso_txt: DataFrame of the kinetic fits with the names of their images.
+    :param path_ss_img: Path of the folder of the steady state images.
+    :param path_senso_img: Path of the folder of the sensorgram images.
+    :param meta: Dictionary of the metadata from the configuration file.
+    :param df_struct_smiles: DataFrame of the SMILES of the compounds, or None if structures are not inserted.
+    :param render_workers: Number of processes used to render the chemical structures.
+    :param stream: Flag to write the ADLP file row by row in constant memory mode.
+    :param export_format: Format of the ADLP file, xlsx, csv or parquet.
+    :param preview: Flag to also save the xlsx with the images when exporting to csv or parquet.
+    :param prepare_images: Flag to scale the images down to the height of the rows before they are embedded.
+    :param comments_list: DataFrame of the comments of the drop down. Defaults to the predefined comments.
+    :param validation_range: Start of the range of the comment drop down, completed with its last row.
+    :param rows_per_cmpd: Number of rows of the drop down for each compound of the setup table.
+    :param column_range: Range of the columns that are centered and given column_width.
+    :param column_width: Width of the columns.
+    :param img_columns: Columns of df_ss_txt and df_senso_txt with the names of the images.
+    :param instrument: Instrument the images were exported from. Defaults to the instrument of the metadata.
+    :param num_fc_used: Number of flow channels each compound was run on. Defaults to the num_fc_used of the metadata,
+        or 1 when the metadata does not give it.
+    :return: None
+    """
+    if instrument is None:
+        instrument = meta['instrument']
+    if num_fc_used is None:
+        num_fc_used = meta.get('num_fc_used', 1)
+
+    # The SMILES were looked up in their own stage. If the lookup failed it is not tried again.
+    structures = df_struct_smiles is not None
+
+    # With csv or parquet the xlsx is only written as a preview on request.
+    write_xlsx = export_format == 'xlsx' or preview
+
+    try:
+        # Calculate the number of rows to add the drop down menu of comments.
+        num_data_pts = len(df_cmpd_set.index) * rows_per_cmpd + 1
+        validation_range = validation_range + str(num_data_pts)
+
+        # Get the predefined comments for the comment sheet.
+        if comments_list is None:
+            comments_list = common_functions.get_predefined_comments()
+
+        # Create a list of tuples containing the names of the steady state image and sensorgram image.
+        tuple_list_imgs = list(zip(df_ss_txt[img_columns[0]].tolist(), df_senso_txt[img_columns[1]].tolist()))
+
+        # When streaming, the whole file is written together with the structures below.
+        if write_xlsx and not stream:
+            # Create a Pandas Excel writer using XlsxWriter as the engine.
+            writer = pd.ExcelWriter(adlp_save_file_path, engine='xlsxwriter')
+
+            # Convert the DataFrame to an XlsxWriter Excel object.
+            df_final_for_dot.to_excel(writer, sheet_name='Sheet1', startcol=0, index=None)
+
+            # Get the xlsxwriter workbook and worksheet objects.
+            workbook = writer.book
+            worksheet1 = writer.sheets['Sheet1']
+
+            # Convert comments list to DataFrame
+            comments_list.to_excel(writer, sheet_name='Sheet2', startcol=0, index=0)
+
+            # For larger drop down lists > 255 characters its necessary to create a list on a seperate worksheet.
+            worksheet1.data_validation(validation_range,
+                                       {'validate': 'list',
+                                        'source': '=Sheet2!$A$2:$A$' + str(len(comments_list) + 1)
+                                        })
+
+            # Freeze the top row of the excel worksheet.
+            worksheet1.freeze_panes(1, 0)
+
+            # Add a cell format object to align text center.
+            cell_format = workbook.add_format()
+            cell_format.set_align('center')
+            cell_format.set_align('vcenter')
+            worksheet1.set_column(column_range, column_width, cell_format)
+
+            # Insert steady-state and sensogram images into file.
+            common_functions.spr_insert_ss_senso_images(tuple_list_imgs, worksheet1, path_ss_img, path_senso_img,
+                                                        biacore=instrument, prepare_images=prepare_images)
+    except Exception:
+        raise RuntimeError('Issue writing DataFrame to Excel file.')
+
+    # Insert structure images, or export the table and a bundle of the images.
+    if write_xlsx and stream:
+        # Write the file row by row so memory does not grow with the number of rows.
+        streaming_writer.write_adlp_file(
+            save_path=adlp_save_file_path, df_final_for_dot=df_final_for_dot, comments_list=comments_list,
+            validation_range=validation_range, column_range=column_range, column_width=column_width,
+            tuple_list_imgs=tuple_list_imgs, path_ss_img=path_ss_img, path_senso_img=path_senso_img,
+            biacore=instrument, df_cmpd_set=df_cmpd_set, num_fc_used=num_fc_used, structures=structures,
+            render_workers=render_workers, prepare_images=prepare_images, df_struct_smiles=df_struct_smiles)
+    elif write_xlsx:
+        common_functions.manage_structure_insertion(df_cmpd_set=df_cmpd_set, num_fc_used=num_fc_used,
+                                                    worksheet=worksheet1, structures=structures, writer=writer,
+                                                    render_workers=render_workers, df_struct_smiles=df_struct_smiles)
+
+    if export_format != 'xlsx':
+        exporters.export_adlp_file(
+            adlp_save_file_path=adlp_save_file_path, export_format=export_format, df_final_for_dot=df_final_for_dot,
+            tuple_list_imgs=tuple_list_imgs, path_ss_img=path_ss_img, path_senso_img=path_senso_img,
+            df_cmpd_set=df_cmpd_set, num_fc_used=num_fc_used, structures=structures, render_workers=render_workers,
+            df_struct_smiles=df_struct_smiles)
+
+
+def save_stage(**layout):
+    """
+    Save stage of a script.
+
+    :param layout: Keyword arguments of save_adlp_file that give the layout of the ADLP file of the script.
+    :return: Stage that runs save_adlp_file.
+    """
+    return Stage('save', partial(save_adlp_file, **layout), inputs=SAVE_INPUTS)
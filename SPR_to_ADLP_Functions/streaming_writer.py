@@ -0,0 +1,138 @@
+"""
+Module that writes the ADLP file one row at a time with xlsxwriter in constant memory mode.
+
+pd.ExcelWriter keeps every cell of the workbook in memory until it is saved. In constant memory mode xlsxwriter writes
+each row to a temporary file as soon as the next row is started, so the memory used by the cells does not grow with the
+number of rows. The price is that a row cannot be changed once the next one is written. Everything that is not a cell
+(column widths, the comment drop down, frozen panes) is therefore set up before the first row, and each row gets its
+height, its values and its images in one go.
+
+The workbook is the same as the one written by the scripts through pd.ExcelWriter: the same header format, row heights,
+column widths, images, drop down and comment sheet. Strings are stored inline in the cells instead of in a shared
+string table, which Excel reads the same way.
+"""
+import logging
+import math
+
+import xlsxwriter
+
+from SPR_to_ADLP_Functions import common_functions
+from SPR_to_ADLP_Functions import image_prep
+from SPR_to_ADLP_Functions import profiling
+
+# Format pandas gives the header row of a DataFrame written with to_excel.
+HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+
+
+def _write_value(worksheet, row, col, value):
+    """
+    Private function that writes one value the way DataFrame.to_excel does. Missing values leave the cell empty and
+    infinite values are written as inf.
+    """
+    if value is None:
+        return
+    if isinstance(value, float):
+        if math.isnan(value):
+            return
+        if math.isinf(value):
+            value = 'inf' if value > 0 else '-inf'
+    worksheet.write(row, col, value)
+
+
+def write_adlp_file(save_path, df_final_for_dot, comments_list, validation_range, column_range, column_width,
+                    tuple_list_imgs, path_ss_img, path_senso_img, biacore, df_cmpd_set, num_fc_used,
+                    structures=False, render_workers=1, prepare_images=False, df_struct_smiles=None):
+    """
+    Writes the ADLP file row by row in constant memory mode and saves it.
+
+    :param save_path: Path of the ADLP file.
+    :param df_final_for_dot: DataFrame written to Sheet1, one row per row of the ADLP file.
+    :param comments_list: DataFrame with a Comments column written to Sheet2 and used for the drop down.
+    :param validation_range: Range of the comment drop down in Sheet1, e.g. 'T1:T97'.
+    :param column_range: Columns of Sheet1 that are centered, e.g. 'A:AK'.
+    :param column_width: Width of the centered columns.
+    :param tuple_list_imgs: List of tuples containing (steady state image, sensorgram image), one per row.
+    :param path_ss_img: Directory to the steady state images to insert.
+    :param path_senso_img: Directory to the sensorgram images to insert.
+    :param biacore: Instrument used in experiment.  Images are sized differently between 8k and all other instruments.
+    :param df_cmpd_set: SPR Setup table as a DataFrame, used to look up the structures.
+    :param num_fc_used: Number of rows of the ADLP file for each compound.
+    :param structures: Flag to insert structures.
+    :param render_workers: Number of processes used to render the structures.
+    :param prepare_images: Optional flag to scale the images down to the height of the rows and recompress them first.
+    :param df_struct_smiles: Optional SMILES already looked up with common_functions.get_structure_smiles.
+    :return: None
+    """
+    # The structures are needed before the first row is written.
+    ls_structure_imgs, image_cache = common_functions.get_structure_imgs(df_cmpd_set=df_cmpd_set,
+                                                                         num_fc_used=num_fc_used,
+                                                                         structures=structures,
+                                                                         render_workers=render_workers,
+                                                                         df_struct_smiles=df_struct_smiles)
+
+    img_format = common_functions.ss_senso_cell_format(biacore)
+    if prepare_images:
+        tuple_list_imgs, path_ss_img, path_senso_img = image_prep.prepare_ss_senso_imgs(
+            tuple_list_imgs, path_ss_img, path_senso_img,
+            max_height=image_prep.row_height_pixels(img_format['cell_height']))
+
+    logging.info('Writing the ADLP file row by row...')
+    workbook = xlsxwriter.Workbook(save_path, {'constant_memory': True})
+    header_format = workbook.add_format(HEADER_FORMAT)
+    worksheet1 = workbook.add_worksheet('Sheet1')
+    worksheet2 = workbook.add_worksheet('Sheet2')
+
+    # For larger drop down lists > 255 characters its necessary to create a list on a seperate worksheet.
+    worksheet1.data_validation(validation_range, {'validate': 'list',
+                                                  'source': '=Sheet2!$A$2:$A$' + str(len(comments_list) + 1)})
+
+    # Freeze the top row of the excel worksheet.
+    worksheet1.freeze_panes(1, 0)
+
+    # Column widths are set in the same order as with pd.ExcelWriter, as the image columns are not centered.
+    cell_format = workbook.add_format({'align': 'center', 'valign': 'vcenter'})
+    worksheet1.set_column(column_range, column_width, cell_format)
+    worksheet1.set_column(first_col=img_format['first_col'], last_col=img_format['last_col'],
+                          width=img_format['width'])
+    if ls_structure_imgs is not None:
+        worksheet1.set_column(first_col=common_functions.STRUCTURE_CELL_FORMAT['first_col'],
+                              last_col=common_functions.STRUCTURE_CELL_FORMAT['last_col'],
+                              width=common_functions.STRUCTURE_CELL_FORMAT['width'])
+        num_structure_rows = len(ls_structure_imgs)
+    else:
+        num_structure_rows = 0
+
+    with profiling.stage('write_rows'):
+        for col, header in enumerate(df_final_for_dot.columns):
+            worksheet1.write(0, col, header, header_format)
+
+        for row, values in enumerate(df_final_for_dot.itertuples(index=False, name=None), start=1):
+            if row <= num_structure_rows:
+                worksheet1.set_row(row, common_functions.STRUCTURE_CELL_FORMAT['cell_height'])
+            elif row <= len(tuple_list_imgs):
+                worksheet1.set_row(row, img_format['cell_height'])
+
+            for col, value in enumerate(values):
+                _write_value(worksheet1, row, col, value)
+
+            # Images are placed by Excel row number, which starts at 1.
+            if row <= len(tuple_list_imgs):
+                ss_img, senso_img = tuple_list_imgs[row - 1]
+                common_functions.insert_ss_senso_imgs(worksheet1, row + 1, ss_img, senso_img, path_ss_img,
+                                                      path_senso_img)
+            if row <= num_structure_rows:
+                common_functions.insert_structure_img(worksheet1, row + 1, ls_structure_imgs[row - 1])
+
+        for col, header in enumerate(comments_list.columns):
+            worksheet2.write(0, col, header, header_format)
+        for row, values in enumerate(comments_list.itertuples(index=False, name=None), start=1):
+            for col, value in enumerate(values):
+                _write_value(worksheet2, row, col, value)
+
+    # The images are read when the workbook is closed.
+    with profiling.stage('save_workbook'):
+        workbook.close()
+
+    # The images have been read into the workbook so the cache can now be trimmed.
+    if image_cache is not None:
+        image_cache.prune()
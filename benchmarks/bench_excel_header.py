@@ -0,0 +1,94 @@
+"""
+Benchmark of reading Biacore 8K steady state and kinetic Excel exports.
+
+Compares the previous approach (open the file with xlrd, scan every cell for "Group", then parse the file again with
+pd.read_excel) with read_excel_from_header, which finds the header row while streaming the file once.
+
+Run from the project folder with: python -m benchmarks.bench_excel_header
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import openpyxl
+import pandas as pd
+
+from SPR_to_ADLP_Functions.common_functions import read_excel_from_header
+
+parser = argparse.ArgumentParser(description='Benchmark reading large Biacore 8K ss/kinetic Excel exports.')
+parser.add_argument('--rows', type=int, nargs='+', default=[384, 1536, 6144],
+                    help='Number of data rows in each generated export.')
+parser.add_argument('-n', '--repeat', type=int, default=3, help='Number of timed reads per case.')
+
+
+def write_export(file_path, num_rows):
+    """
+    Writes an Excel file laid out like a Biacore 8K affinity export. A title and data grouping block sit above the
+    table and the header row starts with "Group".
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Affinity 1')
+    ws.append(['Affinity 1'])
+    ws.append([])
+    ws.append(['Data grouping', 'Serial'])
+    for _ in range(5):
+        ws.append([])
+    ws.append(['Group', 'Channel', 'Run', 'Immobilized ligand', 'Accepted', 'Analyte 1 Solution', 'KD (M)',
+               'Rmax (RU)', 'Offset (RU)', 'Affinity Chi² (RU²)'])
+    for i in range(num_rows):
+        ws.append([1, i % 8 + 1, 1, 'Ligand', 'Yes', 'BRD-{:04d}_{}'.format(i, i + 1), 1.5e-6 + i * 1e-9,
+                   40.0 + i % 17, 0.5, 1.25])
+    wb.save(file_path)
+
+
+def read_two_pass(file_path):
+    """The previous approach: a cell by cell scan for the header followed by a second parse of the whole file."""
+    try:
+        import xlrd
+        sheet = xlrd.open_workbook(file_path).sheet_by_index(0)
+        rows = ([sheet.cell(r, c).value for c in range(sheet.ncols)] for r in range(sheet.nrows))
+    except Exception:
+        # xlrd 2.0 and newer no longer reads xlsx files, so scan with openpyxl instead.
+        sheet = openpyxl.load_workbook(file_path, read_only=True).worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+
+    header_row = -1
+    for r, row in enumerate(rows):
+        if 'Group' in row:
+            header_row = r
+            break
+    return pd.read_excel(file_path, skiprows=header_row, engine='openpyxl')
+
+
+def _best_time(func, file_path, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(file_path)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(args=None):
+    args = parser.parse_args(args=args)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_rows in args.rows:
+            file_path = os.path.join(tmp_dir, 'export_{}.xlsx'.format(num_rows))
+            write_export(file_path, num_rows)
+
+            # Both approaches must give the same table.
+            pd.testing.assert_frame_equal(read_two_pass(file_path), read_excel_from_header(file_path))
+
+            two_pass = _best_time(read_two_pass, file_path, args.repeat)
+            one_pass = _best_time(read_excel_from_header, file_path, args.repeat)
+            results.append({'rows': num_rows, 'two_pass_s': two_pass, 'one_pass_s': one_pass})
+            print('{:>7} rows  two pass {:.3f} s  one pass {:.3f} s  speed up {:.1f}x'.format(
+                num_rows, two_pass, one_pass, two_pass / one_pass))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark of expanding the SPR setup table to one row per injection.
+
+Compares the previous approach (nested Python loops that read every value with df.iloc[cmpd][header] and build the
+dilution series one point at a time) with create_setup_table, which replicates whole columns with np.repeat and
+computes the dilution series of all compounds as arrays.
+
+Run from the project folder with: python -m benchmarks.bench_setup_table
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from script_spr_setup_file.Create_SPR_setup_file import create_setup_table
+
+parser = argparse.ArgumentParser(description='Benchmark expanding large SPR setup tables.')
+parser.add_argument('--compounds', type=int, nargs='+', default=[96, 1000, 5000],
+                    help='Number of compounds in each generated setup table.')
+parser.add_argument('-n', '--repeat', type=int, default=3, help='Number of timed runs per case.')
+
+
+def make_setup_table(num_cmpds, seed=0):
+    """Generates a trimmed setup table with a mix of top concentrations, dilution folds and curve lengths."""
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({'Broad ID': ['BRD-K{:08d}-001-01-{}'.format(rng.randint(10 ** 8), i % 10)
+                                      for i in range(num_cmpds)],
+                         'MW': rng.uniform(200, 700, num_cmpds).round(3),
+                         'Plate_Barcode': ['PLATE_{}'.format(i // 96) for i in range(num_cmpds)],
+                         'Barcode': rng.randint(10 ** 9, 2 * 10 ** 9, num_cmpds),
+                         'Test [Cpd] uM': rng.choice([20, 50, 100, 33.3], num_cmpds),
+                         'fold_dil': rng.choice([1.5, 2, 2.5, 3], num_cmpds),
+                         'num_pts': rng.choice([6, 8, 10], num_cmpds)})
+
+
+def create_setup_table_loops(df_setup_trim, plate_bar):
+    """The previous approach, kept here as the reference for the benchmark."""
+    nRows = len(df_setup_trim)
+    brd_list, mw_list, bar_list, conc_list, bar_plate_list = [], [], [], [], []
+
+    def create_lists(header, list):
+        if header == 'Broad ID':
+            unique_brd = 1
+            for cmpd in range(nRows):
+                value = df_setup_trim.iloc[cmpd][header]
+                for i in range(int(df_setup_trim.iloc[cmpd]['num_pts']) + 2):
+                    if len(value) == 22:
+                        list.append(value[:3] + '-' + value[9:13] + '_' + str(unique_brd))
+                    else:
+                        list.append(value + '_' + str(unique_brd))
+                unique_brd += 1
+        else:
+            for cmpd in range(nRows):
+                value = df_setup_trim.iloc[cmpd][header]
+                for i in range(int(df_setup_trim.iloc[cmpd]['num_pts']) + 2):
+                    list.append(value)
+
+    def dose_conc_list():
+        for cmpd in range(nRows):
+            dose_list = [0, 0]
+            top = df_setup_trim.iloc[cmpd]['Test [Cpd] uM']
+            for i in range(int(df_setup_trim.iloc[cmpd]['num_pts'])):
+                dose_list.append(top)
+                top = top / float(df_setup_trim.iloc[cmpd]['fold_dil'])
+            dose_list.sort(reverse=False)
+            conc_list.extend(dose_list)
+
+    create_lists(header='Broad ID', list=brd_list)
+    create_lists(header='MW', list=mw_list)
+    dose_conc_list()
+    create_lists(header='Barcode', list=bar_list)
+
+    final_df = pd.DataFrame({'BRD': brd_list, 'MW': mw_list, 'CONC': conc_list, 'BAR': bar_list})
+    if plate_bar:
+        create_lists(header='Plate_Barcode', list=bar_plate_list)
+        final_df['PLATE_BAR'] = bar_plate_list
+    return final_df
+
+
+def _best_time(func, df_setup_trim, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df_setup_trim, True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(args=None):
+    args = parser.parse_args(args=args)
+
+    results = []
+    for num_cmpds in args.compounds:
+        df_setup_trim = make_setup_table(num_cmpds)
+
+        # Both approaches must give exactly the same table.
+        pd.testing.assert_frame_equal(create_setup_table_loops(df_setup_trim, True),
+                                      create_setup_table(df_setup_trim, True), check_exact=True)
+
+        loops = _best_time(create_setup_table_loops, df_setup_trim, args.repeat)
+        vectorized = _best_time(create_setup_table, df_setup_trim, args.repeat)
+        results.append({'compounds': num_cmpds, 'loops_s': loops, 'vectorized_s': vectorized})
+        print('{:>6} compounds  loops {:.3f} s  vectorized {:.4f} s  speed up {:.0f}x'.format(
+            num_cmpds, loops, vectorized, loops / vectorized))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark of the cold-start time of the SPR to ADLP scripts.
+
+Each measurement runs in a fresh Python interpreter so that nothing is cached between runs. The 'no structures' case
+imports the ADLP script modules only. The 'structures' case also loads RDKit, cx_Oracle and SQLAlchemy the same way
+get_structures_smiles_from_db and render_structure_imgs do when --structures is used.
+
+The benchmark also checks that importing the scripts loads none of the optional dependencies, which are only loaded by
+the options that need them.
+
+Run from the project folder with: python -m benchmarks.bench_startup
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Importing the script modules is what every ADLP run pays for before doing any work.
+IMPORT_SCRIPTS = 'import script_spr_to_adlp_8k.SPR_to_ADLP_8K, script_spr_to_adlp_not_8k.SPR_to_ADLP, ' \
+                 'script_spr_to_adlp_funct_8k.SPR_to_ADLP_Funct_8K'
+
+# Loading the structure dependencies through the same lazy import layer used by the common functions.
+IMPORT_STRUCTURES = 'from SPR_to_ADLP_Functions.common_functions import _lazy_import\n' \
+                    'for m in ["rdkit.Chem", "rdkit.Chem.AllChem", "rdkit.Chem.Draw", "sqlalchemy", "cx_Oracle"]:\n' \
+                    '    _lazy_import(m)'
+
+# Optional dependencies, loaded by --structures (RDKit, SQLAlchemy and cx_Oracle) and --prepare_images (Pillow).
+OPTIONAL_MODULES = ['rdkit', 'sqlalchemy', 'cx_Oracle', 'PIL']
+
+parser = argparse.ArgumentParser(description='Benchmark the cold-start time of the SPR to ADLP scripts.')
+parser.add_argument('-n', '--repeat', type=int, default=5, help='Number of fresh interpreters per case.')
+
+
+def _time_interpreter(code):
+    """Runs code in a fresh interpreter and returns the wall time in seconds."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def optional_modules_loaded(code=IMPORT_SCRIPTS):
+    """
+    Runs code in a fresh interpreter.
+
+    :param code: Python code to run.
+    :return: List of the OPTIONAL_MODULES loaded by the code.
+    """
+    check = code + '\nimport sys\nprint(" ".join(m for m in {!r} if m in sys.modules))'.format(OPTIONAL_MODULES)
+    output = subprocess.run([sys.executable, '-c', check], check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    return output.splitlines()[-1].split()
+
+
+def main(args=None):
+    args = parser.parse_args(args=args)
+
+    cases = {'no structures': IMPORT_SCRIPTS,
+             'structures': IMPORT_SCRIPTS + '\n' + IMPORT_STRUCTURES}
+
+    # Interpreter start up alone, so it can be subtracted from the results.
+    cases['python only'] = 'pass'
+
+    results = {}
+    for name, code in cases.items():
+        times = [_time_interpreter(code) for _ in range(args.repeat)]
+        results[name] = statistics.median(times)
+        print('{:<15} median {:.3f} s  (min {:.3f} s, max {:.3f} s)'.format(name, results[name], min(times),
+                                                                            max(times)))
+
+    print('\nStructure dependencies add {:.3f} s to a run that uses --structures.'.format(
+        results['structures'] - results['no structures']))
+
+    ls_loaded = optional_modules_loaded()
+    if len(ls_loaded) > 0:
+        raise RuntimeError('Importing the scripts loads optional dependencies: ' + ', '.join(ls_loaded))
+    print('Importing the scripts loads none of the optional dependencies ({}).'.format(', '.join(OPTIONAL_MODULES)))
+    return results
+
+
+if __name__ == '__main__':
+    main()
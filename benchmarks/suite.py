@@ -0,0 +1,444 @@
+"""
+Benchmark suite of the public functions in common_functions and of every script entry point.
+
+Every case runs on a synthetic experiment written by benchmarks.synthetic for each instrument flavor and number of
+compounds asked for. Preparing the inputs is never timed: the 8K experiments are written again before each run of an
+8K script, as the script renames the images. Output files go to a temporary Desktop folder, and the setup scripts save
+there instead of trying Iron first.
+
+Structures are looked up in a SMILES cache filled in advance in a temporary cache folder, so no database is needed.
+The structure cases are skipped when RDKit is not installed.
+
+The results are written as JSON with the version of the scripts, so two versions can be compared:
+
+    python -m benchmarks.suite run --compounds 8 96 384 -o results_new.json
+    python -m benchmarks.suite compare results_old.json results_new.json --threshold 0.1
+
+compare exits with status 1 when a case is slower than in the old results by more than the threshold.
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from contextlib import contextmanager
+from datetime import datetime
+from unittest import mock
+
+import pandas as pd
+import xlsxwriter
+
+from _version import __version__
+from SPR_to_ADLP_Functions import caches
+from SPR_to_ADLP_Functions import common_functions
+from benchmarks import synthetic
+
+# Modules of the script entry points. Each one saves its output under the module level homedir.
+SCRIPT_MODULES = {'Create_SPR_setup_file': 'script_spr_setup_file.Create_SPR_setup_file',
+                  'Create_Funct_Setup_File': 'script_spr_funct_setup_file.Create_Funct_Setup_File',
+                  'SPR_to_ADLP': 'script_spr_to_adlp_not_8k.SPR_to_ADLP',
+                  'SPR_to_ADLP_8K': 'script_spr_to_adlp_8k.SPR_to_ADLP_8K',
+                  'SPR_to_ADLP_Funct_8K': 'script_spr_to_adlp_funct_8k.SPR_to_ADLP_Funct_8K'}
+
+# Setup scripts whose save_output_file is replaced by save_to_desktop.
+SETUP_SCRIPTS = ('Create_SPR_setup_file', 'Create_Funct_Setup_File')
+
+# Substituents used to give every synthetic compound its own molecule.
+_SUBSTITUENTS = ('F', 'Cl', 'Br', 'O', 'N', 'C#N')
+
+parser = argparse.ArgumentParser(description='Benchmark the SPR to ADLP functions and scripts on synthetic data.')
+subparsers = parser.add_subparsers(dest='command')
+
+run_parser = subparsers.add_parser('run', help='Run the benchmarks and write the results as JSON.')
+run_parser.add_argument('--flavors', nargs='+', choices=synthetic.FLAVORS, default=list(synthetic.FLAVORS),
+                        help='Instrument flavors of the synthetic experiments.')
+run_parser.add_argument('--compounds', type=int, nargs='+', default=[8, 96, 384],
+                        help='Number of compounds in each synthetic experiment.')
+run_parser.add_argument('-n', '--repeat', type=int, default=3, help='Number of timed runs per case.')
+run_parser.add_argument('-k', '--filter', default=None,
+                        help='Only run the benchmarks whose name contains this text.')
+run_parser.add_argument('--no_structures', action='store_true', default=False,
+                        help='Skip the benchmarks that render structures.')
+run_parser.add_argument('-o', '--output', default=None,
+                        help='Path of the JSON results. Defaults to benchmark_results_<version>.json.')
+
+compare_parser = subparsers.add_parser('compare', help='Compare two JSON results.')
+compare_parser.add_argument('old', help='JSON results of the reference version.')
+compare_parser.add_argument('new', help='JSON results of the version to check.')
+compare_parser.add_argument('--threshold', type=float, default=0.1,
+                            help='Relative slow down of the best time above which a case is a regression.')
+compare_parser.add_argument('--min_seconds', type=float, default=0.001,
+                            help='Slow downs smaller than this many seconds are never regressions. Keeps the timing '
+                                 'noise of very fast cases out of the report.')
+
+
+def make_smiles(df_setup):
+    """
+    Gives every compound of a synthetic setup table a distinct, valid SMILES.
+
+    :param df_setup: Setup table written by synthetic.make_setup_table.
+    :return: Dictionary of BROAD_CORE_ID to SMILES, the keys used by get_structures_smiles_from_db.
+    """
+    dict_smiles = {}
+    for i, brd in enumerate(df_setup['Broad ID']):
+        chain = 'C' * (i % 16 + 1)
+        tail = 'C' * (i // 16 % 16 + 1)
+        substituent = _SUBSTITUENTS[i // 256 % len(_SUBSTITUENTS)]
+        dict_smiles[brd[5:13]] = 'O=C(N' + chain + ')c1ccc(' + substituent + ')cc1' + tail
+
+    return dict_smiles
+
+
+def save_to_desktop(home):
+    """
+    :param home: Home folder containing the Desktop folder.
+    :return: Function used in place of the save_output_file of the setup scripts. It writes the setup file the same
+        way, straight to the Desktop folder.
+    """
+    def save_output_file(df_final, plate_num=None, name=None):
+        file_name = 'setup' + ('_' + name if name else '') + ('_plate_' + str(plate_num) if plate_num else '')
+        df_final.to_excel(os.path.join(home, 'Desktop', file_name + '.xlsx'))
+    return save_output_file
+
+
+def time_case(func, setup=None, repeat=3):
+    """
+    Times a function.
+
+    :param func: Function to time. Called with the value returned by setup.
+    :param setup: Function called before every run, outside of the timer. None calls func without arguments.
+    :param repeat: Number of timed runs.
+    :return: List of the wall times in seconds.
+    """
+    ls_times = []
+    for _ in range(repeat):
+        if setup is None:
+            start = time.perf_counter()
+            func()
+        else:
+            arg = setup()
+            start = time.perf_counter()
+            func(arg)
+        ls_times.append(time.perf_counter() - start)
+
+    return ls_times
+
+
+def _rdkit_installed():
+    try:
+        importlib.import_module('rdkit.Chem')
+    except ImportError:
+        return False
+    return True
+
+
+def _list_images(path_img):
+    """Private function that lists the fit images of a folder, leaving out the legend of the 8K exports."""
+    return sorted(img for img in os.listdir(path_img) if img.endswith('.png') and 'Legend' not in img)
+
+
+def _worksheet(work_dir, name):
+    """Private function that opens an xlsxwriter workbook and its worksheet to insert images into."""
+    workbook = xlsxwriter.Workbook(os.path.join(work_dir, name + '.xlsx'))
+    return workbook, workbook.add_worksheet()
+
+
+@contextmanager
+def _quiet():
+    """Private context manager that hides the console output, logging and warnings of the functions timed."""
+    logger = logging.getLogger()
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        with warnings.catch_warnings(), open(os.devnull, 'w') as devnull, mock.patch('sys.stdout', devnull):
+            warnings.simplefilter('ignore')
+            yield
+    finally:
+        logger.setLevel(level)
+
+
+class Experiment:
+    """
+    Synthetic experiment of one flavor and size, and the cases run on it.
+
+    :param work_dir: Folder of the experiment.
+    :param flavor: One of synthetic.FLAVORS.
+    :param num_cmpds: Number of compounds.
+    """
+
+    def __init__(self, work_dir, flavor, num_cmpds):
+        self.work_dir = work_dir
+        self.flavor = flavor
+        self.num_cmpds = num_cmpds
+        self.data_dir = os.path.join(work_dir, 'data')
+        self.paths = self.generate()
+        self.df_setup = pd.read_csv(self.paths['path_mstr_tbl'])
+
+    def generate(self):
+        """Writes the experiment again from scratch. The same seed gives the same files."""
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+        return synthetic.generate_experiment(self.data_dir, self.flavor, self.num_cmpds)
+
+    @property
+    def is_8k(self):
+        return self.flavor in synthetic.FLAVORS_8K
+
+    @property
+    def num_fc_used(self):
+        return 1 if self.is_8k else len(synthetic.FC_USED)
+
+    def function_cases(self, structures=True):
+        """
+        :param structures: Include the cases that render structures.
+        :return: List of (benchmark name, func, setup) of the common_functions cases that apply to this flavor.
+        """
+        cases = [('rep_item_for_dot_df',
+                  lambda: common_functions.rep_item_for_dot_df(self.df_setup, 'Broad ID', times_dup=self.num_fc_used),
+                  None),
+                 ('get_predefined_comments', common_functions.get_predefined_comments, None)]
+
+        if self.is_8k:
+            cases.append(('read_excel_from_header',
+                          lambda: common_functions.read_excel_from_header(self.paths['path_ss_txt']), None))
+
+        if self.flavor != 'Biacore8K_functional':
+            instrument = 'Biacore8K' if self.is_8k else self.flavor
+            fc_used = list(range(1, 9)) if self.is_8k else list(synthetic.FC_USED)
+            cases.append(('spr_binding_top_for_dot_file',
+                          lambda: common_functions.spr_binding_top_for_dot_file(
+                              report_pt_file=self.paths['path_report_pt'], df_cmpd_set=self.df_setup,
+                              instrument=instrument, fc_used=fc_used, ref_fc_used_arr=[1]), None))
+
+        # xlsxwriter reads the images when the workbook is closed, so closing it is part of the case.
+        ls_imgs = list(zip(_list_images(self.paths['path_ss_img']), _list_images(self.paths['path_senso_img'])))
+
+        def insert_images(args):
+            workbook, worksheet = args
+            common_functions.spr_insert_ss_senso_images(ls_imgs, worksheet, self.paths['path_ss_img'],
+                                                        self.paths['path_senso_img'],
+                                                        biacore='Biacore8K' if self.is_8k else self.flavor)
+            workbook.close()
+
+        cases.append(('spr_insert_ss_senso_images', insert_images, lambda: _worksheet(self.work_dir, 'images')))
+
+        if structures:
+            cases.extend(self.structure_cases())
+
+        return cases
+
+    def structure_cases(self):
+        """
+        :return: List of (benchmark name, func, setup) of the structure cases. The default SMILES cache, in the cache
+            folder set up by run, is filled first.
+        """
+        smiles_cache = caches.SmilesCache()
+        smiles_cache.put_many(make_smiles(self.df_setup).items())
+        df_smiles = common_functions.get_structures_smiles_from_db(self.df_setup, smiles_cache=smiles_cache)
+
+        def render():
+            return common_functions.render_structure_imgs(df_smiles, dir=None, in_memory=True)
+
+        def insert_structures(args):
+            workbook, worksheet, ls_imgs = args
+            common_functions.spr_insert_structures(ls_imgs, worksheet)
+            workbook.close()
+
+        def setup_insert_structures():
+            ls_imgs = common_functions.rep_item_for_dot_df(render(), 'IMG_PATH', times_dup=self.num_fc_used)
+            return _worksheet(self.work_dir, 'structures') + (ls_imgs,)
+
+        def manage_structure_insertion(args):
+            writer, worksheet = args
+            common_functions.manage_structure_insertion(self.df_setup, self.num_fc_used, worksheet, True, writer)
+
+        def setup_manage_structure_insertion():
+            # Start from an empty image cache so the structures are rendered in every run.
+            shutil.rmtree(os.path.join(caches.get_cache_dir(), 'structures'), ignore_errors=True)
+            writer = pd.ExcelWriter(os.path.join(self.work_dir, 'manage.xlsx'), engine='xlsxwriter')
+            pd.DataFrame({'BROAD_ID': self.df_setup['Broad ID']}).to_excel(writer, sheet_name='Sheet1', index=False)
+            return writer, writer.sheets['Sheet1']
+
+        return [('get_structures_smiles_from_db',
+                 lambda: common_functions.get_structures_smiles_from_db(self.df_setup, smiles_cache=smiles_cache),
+                 None),
+                ('render_structure_imgs', render, None),
+                ('spr_insert_structures', insert_structures, setup_insert_structures),
+                ('manage_structure_insertion', manage_structure_insertion, setup_manage_structure_insertion)]
+
+    def script_cases(self):
+        """
+        :return: List of (benchmark name, func, setup) of the script entry points that read this flavor.
+        """
+        if self.flavor == 'Biacore8K_functional':
+            setup_script = 'Create_Funct_Setup_File'
+            setup_func = 'create_funct_setup_file'
+            adlp_script = 'SPR_to_ADLP_Funct_8K'
+        else:
+            setup_script = 'Create_SPR_setup_file'
+            setup_func = 'create_setup_file'
+            adlp_script = 'SPR_to_ADLP_8K' if self.is_8k else 'SPR_to_ADLP'
+
+        setup_module = importlib.import_module(SCRIPT_MODULES[setup_script])
+        adlp_module = importlib.import_module(SCRIPT_MODULES[adlp_script])
+
+        def create_setup_file():
+            getattr(setup_module, setup_func)(self.df_setup.copy(), process_for_8k=self.is_8k)
+
+        def create_adlp_file(paths):
+            adlp_module.spr_create_dot_upload_file(paths['config'], 'benchmark', clip=False, structures=False)
+
+        # The 8K scripts rename the images, so every run starts from a new copy of the experiment.
+        setup_adlp = self.generate if self.is_8k else lambda: self.paths
+
+        return [(setup_script + '.' + setup_func, create_setup_file, None),
+                (adlp_script + '.spr_create_dot_upload_file', create_adlp_file, setup_adlp)]
+
+
+def run(flavors, ls_num_cmpds, repeat=3, name_filter=None, structures=True):
+    """
+    Runs the benchmarks.
+
+    :param flavors: List of instrument flavors.
+    :param ls_num_cmpds: List of numbers of compounds.
+    :param repeat: Number of timed runs per case.
+    :param name_filter: Only run the benchmarks whose name contains this text. None runs all of them.
+    :param structures: Run the cases that render structures. They are skipped anyway if RDKit is not installed.
+    :return: Dictionary of the results, ready to be written as JSON.
+    """
+    if structures and not _rdkit_installed():
+        print('RDKit is not installed. Skipping the structure benchmarks.')
+        structures = False
+
+    results = {'version': str(__version__),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'started': datetime.now().isoformat(timespec='seconds'),
+               'repeat': repeat,
+               'results': []}
+
+    work_root = tempfile.mkdtemp(prefix='spr_adlp_benchmark_')
+    home = os.path.join(work_root, 'home')
+    os.makedirs(os.path.join(home, 'Desktop'))
+
+    patches = [mock.patch.object(importlib.import_module(module), 'homedir', home)
+               for module in SCRIPT_MODULES.values()]
+    patches.extend(mock.patch.object(importlib.import_module(SCRIPT_MODULES[script]), 'save_output_file',
+                                     save_to_desktop(home)) for script in SETUP_SCRIPTS)
+    patches.append(mock.patch.dict(os.environ, {caches.CACHE_DIR_ENV: os.path.join(work_root, 'cache')}))
+
+    try:
+        for patch in patches:
+            patch.start()
+
+        for flavor in flavors:
+            for num_cmpds in ls_num_cmpds:
+                work_dir = os.path.join(work_root, '{}_{}'.format(flavor, num_cmpds))
+                os.makedirs(work_dir)
+
+                with _quiet():
+                    experiment = Experiment(work_dir, flavor, num_cmpds)
+                    cases = experiment.function_cases(structures=structures) + experiment.script_cases()
+
+                for name, func, setup in cases:
+                    if name_filter is not None and name_filter not in name:
+                        continue
+
+                    with _quiet():
+                        ls_times = time_case(func, setup=setup, repeat=repeat)
+
+                    result = {'benchmark': name, 'flavor': flavor, 'compounds': num_cmpds,
+                              'best_s': round(min(ls_times), 6), 'mean_s': round(statistics.mean(ls_times), 6),
+                              'times_s': [round(t, 6) for t in ls_times]}
+                    results['results'].append(result)
+                    print('{benchmark:<55} {flavor:<21} {compounds:>6} cmpds  best {best_s:>8.3f} s  '
+                          'mean {mean_s:>8.3f} s'.format(**result))
+
+                shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        for patch in reversed(patches):
+            patch.stop()
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    return results
+
+
+def _key(result):
+    return result['benchmark'], result['flavor'], result['compounds']
+
+
+def compare(old_results, new_results, threshold=0.1, min_seconds=0.001):
+    """
+    Compares the best times of the cases found in both results.
+
+    :param old_results: Results of the reference version, as returned by run.
+    :param new_results: Results of the version to check.
+    :param threshold: Relative slow down above which a case is a regression, e.g. 0.1 for 10 %.
+    :param min_seconds: Slow downs smaller than this many seconds are never regressions.
+    :return: List of dictionaries, one per case found in both results, with the old and new best times, their ratio
+        and whether the case is a regression.
+    """
+    dict_old = {_key(result): result for result in old_results['results']}
+
+    ls_comparisons = []
+    for result in new_results['results']:
+        old = dict_old.get(_key(result))
+        if old is None:
+            continue
+
+        if old['best_s'] > 0:
+            ratio = result['best_s'] / old['best_s']
+        else:
+            ratio = 1.0 if result['best_s'] == 0 else float('inf')
+        ls_comparisons.append({'benchmark': result['benchmark'], 'flavor': result['flavor'],
+                               'compounds': result['compounds'], 'old_best_s': old['best_s'],
+                               'new_best_s': result['best_s'], 'ratio': ratio,
+                               'regression': (ratio > 1 + threshold and
+                                              result['best_s'] - old['best_s'] > min_seconds)})
+
+    return ls_comparisons
+
+
+def main(args=None):
+    args = parser.parse_args(args=args)
+
+    if args.command == 'run':
+        results = run(args.flavors, args.compounds, repeat=args.repeat, name_filter=args.filter,
+                      structures=not args.no_structures)
+        output = args.output or 'benchmark_results_{}.json'.format(results['version']).replace('+', '_')
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Results written to: ' + output)
+        return results
+
+    if args.command == 'compare':
+        with open(args.old) as f:
+            old_results = json.load(f)
+        with open(args.new) as f:
+            new_results = json.load(f)
+
+        ls_comparisons = compare(old_results, new_results, threshold=args.threshold,
+                                 min_seconds=args.min_seconds)
+        print('Comparing {} with {}'.format(old_results['version'], new_results['version']))
+        for comparison in ls_comparisons:
+            print('{benchmark:<55} {flavor:<21} {compounds:>6} cmpds  {old_best_s:>8.3f} s -> {new_best_s:>8.3f} s  '
+                  'x{ratio:.2f}'.format(**comparison) + ('  REGRESSION' if comparison['regression'] else ''))
+
+        num_regressions = sum(comparison['regression'] for comparison in ls_comparisons)
+        print('{} cases compared, {} regressions above {:.0%}.'.format(len(ls_comparisons), num_regressions,
+                                                                       args.threshold))
+        if num_regressions > 0:
+            sys.exit(1)
+        return ls_comparisons
+
+    parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+"""
+Generator of synthetic Biacore experiments for benchmarking.
+
+Writes everything one of the ADLP scripts reads for a run at any scale: the setup table, the steady state and kinetic
+fit exports, the folders of steady state and sensorgram PNG images, the report point workbook and the configuration
+file. The files follow the layout of the exports in tests/fixtures for each instrument flavor:
+
+- Biacore1, Biacore2, Biacore3 and BiacoreS200: tab separated fit exports, three flow channels referenced to FC1.
+- Biacore8K: Excel fit exports with the header on the row containing "Group", one compound per needle pass.
+- Biacore8K_functional: the same for the A-B-A functional assay read by script_spr_to_adlp_funct_8k.
+
+The values are random but the names, concentrations and run order are consistent across the files, so the scripts
+run to the end. Generated data is only meant for timing, not for checking results.
+
+Run from the project folder with: python -m benchmarks.synthetic --flavor Biacore8K --compounds 384 --out <folder>
+"""
+import argparse
+import os
+import struct
+import zlib
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+FLAVORS = ('Biacore1', 'Biacore2', 'Biacore3', 'BiacoreS200', 'Biacore8K', 'Biacore8K_functional')
+
+# Flavors run on the 8K and read by the 8K scripts.
+FLAVORS_8K = ('Biacore8K', 'Biacore8K_functional')
+
+# Flow channels of the non-8K runs: FC1 is the reference for FC2, FC3 and FC4.
+FC_USED = (2, 3, 4)
+
+SETUP_COLUMNS = ['Broad ID', 'Comment', 'MW', 'Sol. (uM)', 'Plate', 'Plate_Barcode', 'Barcode', 'BC Added', 'Well',
+                 'Conc. (mM)', 'Conc (uM)', '384W Dest.', 'Total Vol. (uL)', 'Test [Cpd] uM', 'fold_dil', 'num_pts',
+                 'Buffer (uL)', 'Cmpd to Add (uL)', 'DMSO to Add (uL)']
+
+PROJECT_CODE = '9999'
+RAW_DATA_FILENAME = '200101_' + PROJECT_CODE + '_affinity'
+
+parser = argparse.ArgumentParser(description='Generate a synthetic Biacore experiment.')
+parser.add_argument('--flavor', choices=FLAVORS, default='Biacore8K', help='Instrument flavor of the experiment.')
+parser.add_argument('--compounds', type=int, default=96, help='Number of compounds.')
+parser.add_argument('--num_pts', type=int, default=6, help='Number of points in each titration.')
+parser.add_argument('--seed', type=int, default=0, help='Seed of the random values.')
+parser.add_argument('--out', required=True, help='Folder the experiment is written to.')
+
+
+def make_setup_table(num_cmpds, num_pts=6, seed=0):
+    """
+    Generates a setup table in the format of tests/fixtures/spr_setup_table_*.csv.
+
+    :param num_cmpds: Number of compounds. Up to 10,000 as every compound gets a unique four digit BRD core.
+    :param num_pts: Number of points in each titration.
+    :param seed: Seed of the random values.
+    :return: DataFrame of the setup table.
+    """
+    rng = np.random.RandomState(seed)
+    cores = rng.choice(10000, num_cmpds, replace=False)
+    wells = [row + str(col).zfill(2) for col in range(1, 25) for row in 'ABCDEFGHIJKLMNOP']
+
+    df = pd.DataFrame({'Broad ID': ['BRD-K{:04d}{:04d}-001-01-{}'.format(rng.randint(10000), core, core % 10)
+                                    for core in cores],
+                       'Comment': 'Test',
+                       'MW': rng.uniform(200, 700, num_cmpds).round(3),
+                       'Sol. (uM)': '',
+                       'Plate': ['Plate_{:02d}'.format(i // 384 + 1) for i in range(num_cmpds)],
+                       'Plate_Barcode': ['SYN{:05d}'.format(i // 384 + 1) for i in range(num_cmpds)],
+                       'Barcode': rng.randint(10 ** 9, 2 * 10 ** 9, num_cmpds),
+                       'BC Added': '',
+                       'Well': [wells[i % 384] for i in range(num_cmpds)],
+                       'Conc. (mM)': 10,
+                       'Conc (uM)': 10000,
+                       '384W Dest.': [wells[i % 384] for i in range(num_cmpds)],
+                       'Total Vol. (uL)': 200,
+                       'Test [Cpd] uM': rng.choice([20, 50, 100], num_cmpds),
+                       'fold_dil': 2,
+                       'num_pts': num_pts,
+                       'Buffer (uL)': 190,
+                       'Cmpd to Add (uL)': 1,
+                       'DMSO to Add (uL)': 9})
+
+    return df.loc[:, SETUP_COLUMNS]
+
+
+def sample_names(df_setup):
+    """
+    :param df_setup: Setup table.
+    :return: List of the sample names the instrument uses for the compounds, e.g. BRD-6261_1, in setup order.
+    """
+    return ['BRD-' + brd[9:13] + '_' + str(i) for i, brd in enumerate(df_setup['Broad ID'], start=1)]
+
+
+def write_png(path, width=240, height=180, seed=0):
+    """
+    Writes a grayscale PNG that looks like a fit plot: a white background, a binding curve and some noise. Only zlib
+    is needed to encode it.
+
+    :param path: Path of the PNG file.
+    :param width: Width in pixels.
+    :param height: Height in pixels.
+    :param seed: Seed of the curve and the noise.
+    """
+    rng = np.random.RandomState(seed)
+    img = np.full((height, width), 255, dtype=np.uint8)
+
+    # Sparse noise keeps the compressed size closer to that of a real plot.
+    noise = rng.random_sample((height, width)) < 0.02
+    img[noise] = rng.randint(0, 255, noise.sum())
+
+    # Axes and a curve approaching saturation.
+    img[height - 10, 10:] = 0
+    img[:height - 10, 10] = 0
+    x = np.arange(10, width)
+    y = (height - 12) - ((height - 30) * (1 - np.exp(-(x - 10) / (width * rng.uniform(0.1, 0.4))))).astype(int)
+    img[y, x] = 0
+    img[np.maximum(y - 1, 0), x] = 0
+
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), img]).tobytes()
+
+    def chunk(chunk_type, data):
+        return (struct.pack('>I', len(data)) + chunk_type + data +
+                struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw, 6)))
+        f.write(chunk(b'IEND', b''))
+
+
+def _write_sheet(path, sheet_name, title_rows, columns, rows):
+    """Private function that writes a one sheet workbook with some title rows above the table."""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    for title_row in title_rows:
+        ws.append(title_row)
+    ws.append(columns)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def _write_8k_export(path, sheet_name, columns, rows):
+    """Private function that writes a Biacore 8K fit export. The header is the row that contains "Group"."""
+    title_rows = [[sheet_name], [], ['Data grouping', 'Serial'], [], ['', 'General']]
+    _write_sheet(path, sheet_name, title_rows, columns, rows)
+
+
+def _dilution_series(top, fold_dil, num_pts):
+    """Private function that returns the concentrations of a titration from the lowest to the highest."""
+    return sorted(top / float(fold_dil) ** i for i in range(num_pts))
+
+
+def _write_config(path, paths, meta):
+    """Private function that writes the configuration file read by the ADLP scripts."""
+    with open(path, 'w') as f:
+        f.write('[paths]\n')
+        for key, value in paths.items():
+            f.write('{}: {}\n'.format(key, value))
+        f.write('\n[meta]\n')
+        for key, value in meta.items():
+            f.write('{}: {}\n'.format(key, value))
+
+
+def _common_meta(instrument):
+    return {'experiment_date': '2020_01_01', 'project_code': PROJECT_CODE, 'operator': 'SYNTHETIC',
+            'instrument': instrument, 'protocol': PROJECT_CODE + '_v1', 'chip_lot': 'None', 'nucleotide': 'None',
+            'raw_data_filename': RAW_DATA_FILENAME, 'directory_folder': 'Synthetic'}
+
+
+def _protein_meta(channels):
+    meta = {}
+    for attr, value in [('BIP', 'BIP-0000-01'), ('RU', 2500.0), ('MW', 27000.0)]:
+        for fc in channels:
+            meta['fc{}_protein_{}'.format(fc, attr)] = value
+    return meta
+
+
+def _generate_not_8k(out_dir, flavor, df_setup, rng, image_size):
+    names = sample_names(df_setup)
+    ss_dir = os.path.join(out_dir, RAW_DATA_FILENAME + '_PWF')
+    senso_dir = os.path.join(out_dir, RAW_DATA_FILENAME + '_SWF')
+    os.makedirs(ss_dir)
+    os.makedirs(senso_dir)
+
+    # One fit per compound and flow channel, each with its own image.
+    ls_ss, ls_senso = [], []
+    img_num = 1
+    for name, mw in zip(names, df_setup['MW']):
+        for fc in FC_USED:
+            img_file = name + '_' + RAW_DATA_FILENAME + '_' + str(img_num) + '.png'
+            curve = 'Fc={}-1 corr'.format(fc)
+            kd = 10 ** rng.uniform(-8, -4)
+            ls_ss.append([name, kd, rng.uniform(20, 80), rng.uniform(0, 5), curve, mw, RAW_DATA_FILENAME, img_file])
+            ls_senso.append([name, 10 ** rng.uniform(3, 6), 10 ** rng.uniform(-3, 0), kd, rng.uniform(0, 5),
+                             rng.uniform(20, 80), curve, mw, RAW_DATA_FILENAME, img_file])
+            write_png(os.path.join(ss_dir, img_file), *image_size, seed=img_num)
+            write_png(os.path.join(senso_dir, img_file), *image_size, seed=-img_num % 2 ** 31)
+            img_num += 1
+
+    ss_txt = os.path.join(ss_dir, RAW_DATA_FILENAME + '.txt')
+    senso_txt = os.path.join(senso_dir, RAW_DATA_FILENAME + '.txt')
+    pd.DataFrame(ls_ss, columns=['Sample', 'KD (M)', 'Rmax (RU)', 'Chi² (RU²)', 'Curve', 'MW (Da)', 'Evaluation File',
+                                 'Image File']).to_csv(ss_txt, sep='\t', index=False)
+    pd.DataFrame(ls_senso, columns=['Sample', 'ka (1/Ms)', 'kd (1/s)', 'KD (M)', 'Chi² (RU²)', 'Rmax (RU)', 'Curve',
+                                    'MW (Da)', 'Evaluation File', 'Image File']).to_csv(senso_txt, sep='\t',
+                                                                                        index=False)
+
+    # Report points: the binding report point of every cycle on the raw and the reference subtracted channels.
+    rows = []
+    cycle = 1
+    for name, top, fold_dil, num_pts in zip(names, df_setup['Test [Cpd] uM'], df_setup['fold_dil'],
+                                            df_setup['num_pts']):
+        for conc in [0, 0] + _dilution_series(top, fold_dil, num_pts):
+            for fc in ['1'] + ['{}-1 corr'.format(fc) for fc in FC_USED]:
+                rows.append([cycle, fc, 'binding', rng.uniform(0, 60), 'Sample', 'Sample', conc, name])
+            cycle += 1
+
+    if flavor in ('Biacore1', 'Biacore3'):
+        columns = ['Cycle', 'Fc', 'Report Point', 'RelResp', 'AssayStep', 'CycleType', 'Sample_1_Conc',
+                   'Sample_1_Sample']
+    else:
+        # These exports start with a run column that the scripts drop.
+        columns = ['Run', 'Cycle', 'Fc', 'Report Point', 'RelResp [RU]', 'AssayStep', 'Cycle Type',
+                   'Sample_1_Conc [µM]', 'Sample_1_Sample']
+        rows = [[1] + row for row in rows]
+
+    report_pt = os.path.join(out_dir, RAW_DATA_FILENAME + '_rp.xlsx')
+    _write_sheet(report_pt, 'Report Point Table', [['Report Point Table'], ['Synthetic'], ['']], columns, rows)
+
+    meta = {'num_fc_used': len(FC_USED), 'ref_fc_used': 1, 'immobilized_fc': ','.join(str(fc) for fc in FC_USED)}
+    meta.update(_common_meta(flavor))
+    meta.update(_protein_meta(FC_USED))
+
+    return {'path_ss_img': ss_dir, 'path_ss_txt': ss_txt, 'path_senso_img': senso_dir, 'path_senso_txt': senso_txt,
+            'path_report_pt': report_pt}, meta
+
+
+def _generate_8k(out_dir, flavor, df_setup, rng, image_size):
+    functional = flavor == 'Biacore8K_functional'
+    names = sample_names(df_setup)
+    solution_col = 'A-B-A 1 Solution' if functional else 'Analyte 1 Solution'
+    ss_dir = os.path.join(out_dir, RAW_DATA_FILENAME + '_images_ss')
+    senso_dir = os.path.join(out_dir, RAW_DATA_FILENAME + '_images_kinetics')
+    os.makedirs(ss_dir)
+    os.makedirs(senso_dir)
+
+    # Compounds run in passes of 8, one per needle and channel.
+    channels = [i % 8 + 1 for i in range(len(names))]
+
+    ls_ss, ls_senso = [], []
+    for i, (name, channel) in enumerate(zip(names, channels), start=1):
+        kd = 10 ** rng.uniform(-8, -4)
+        common = [i, channel, 1, 'Synthetic ligand', '']
+        if functional:
+            ls_ss.append(common + [rng.uniform(0, 5), name, kd, rng.uniform(20, 80)])
+            ls_senso.append(common + [rng.uniform(0, 5), name, 10 ** rng.uniform(3, 6), 10 ** rng.uniform(-3, 0),
+                                      rng.uniform(20, 80), kd])
+            img_file = '{}-{}.png'.format(channel, i)
+        else:
+            ls_ss.append(common + [rng.uniform(0, 5), name, kd, rng.uniform(20, 80)])
+            ls_senso.append(common[:2] + common[3:] + [rng.uniform(0, 5), name, 10 ** rng.uniform(3, 6),
+                                                       10 ** rng.uniform(-3, 0), rng.uniform(20, 80), kd])
+            img_file = 'Fit_{};{}.png'.format(i, name)
+        write_png(os.path.join(ss_dir, img_file), *image_size, seed=i)
+        write_png(os.path.join(senso_dir, img_file), *image_size, seed=-i % 2 ** 31)
+
+    # Both image folders come with a legend that the scripts remove.
+    for img_dir in (ss_dir, senso_dir):
+        write_png(os.path.join(img_dir, 'Legend.png'), *image_size)
+
+    ss_columns = ['Group', 'Channel', 'Run', 'Immobilized ligand', 'Accepted', 'Affinity Chi² (RU²)', solution_col,
+                  'KD (M)', 'Rmax (RU)']
+    if functional:
+        senso_columns = ['Group', 'Channel', 'Run', 'Immobilized ligand', 'Accepted', 'Kinetics Chi² (RU²)',
+                         solution_col, 'ka (1/Ms)', 'kd (1/s)', 'Rmax', 'KD (M)']
+    else:
+        senso_columns = ['Group', 'Channel', 'Immobilized ligand', 'Accepted', 'Kinetics Chi² (RU²)', solution_col,
+                         'ka', 'kd', 'Rmax', 'KD (M)']
+
+    ss_txt = os.path.join(ss_dir, RAW_DATA_FILENAME + '_STEADY.xlsx')
+    senso_txt = os.path.join(senso_dir, RAW_DATA_FILENAME + '_KINETICS.xlsx')
+    _write_8k_export(ss_txt, 'Affinity 1', ss_columns, ls_ss)
+    _write_8k_export(senso_txt, 'Kinetics 1', senso_columns, ls_senso)
+
+    # Report points in 8K run order: for every pass of 8 compounds, two blanks and then the titrations.
+    rows = []
+    cycle = 1
+    for first in range(0, len(names), 8):
+        df_pass = df_setup.iloc[first:first + 8]
+        pass_names = names[first:first + 8]
+        ls_concs = [[0, 0] + _dilution_series(top, fold_dil, num_pts) for top, fold_dil, num_pts in
+                    zip(df_pass['Test [Cpd] uM'], df_pass['fold_dil'], df_pass['num_pts'])]
+        for step in range(max(len(concs) for concs in ls_concs)):
+            for needle, (name, concs) in enumerate(zip(pass_names, ls_concs)):
+                if step >= len(concs):
+                    continue
+                for sensorgram_type, flow_cell in [('Reference', 1), ('Corrected', '2-1')]:
+                    if functional:
+                        rows.append([cycle, needle + 1, flow_cell, sensorgram_type, 'A-B-A binding late_1',
+                                     'Analysis', rng.uniform(-60, 0), concs[step], name])
+                    else:
+                        rows.append([cycle, needle + 1, flow_cell, sensorgram_type, 'Analyte binding late_1',
+                                     rng.uniform(0, 60), 'Analysis', name, concs[step]])
+            cycle += 1
+
+    if functional:
+        columns = ['Cycle', 'Channel', 'Flow cell', 'Sensorgram type', 'Name', 'Step purpose',
+                   'Relative response (RU)', 'A-B-A 1 Concentration (µM)', 'A-B-A 1 Flanking solution']
+    else:
+        columns = ['Cycle', 'Channel', 'Flow cell', 'Sensorgram type', 'Name', 'Relative response (RU)',
+                   'Step name', 'Analyte 1 Solution', 'Analyte 1 Concentration (µM)']
+
+    report_pt = os.path.join(out_dir, RAW_DATA_FILENAME + '_report_pt.xlsx')
+    _write_sheet(report_pt, 'Report point table', [['Report point table'], ['']], columns, rows)
+
+    meta = {'immobilized_fc': ','.join(str(fc) for fc in range(1, 9))}
+    if functional:
+        meta['num_fc_used'] = 8
+        meta.update({'protein_floated_BIP': 'BIP-0000-02', 'protein_floated_conc_uM': 1.0,
+                     'protein_floated_MW': 15000.0})
+    meta.update(_common_meta('Biacore8K'))
+    meta.update(_protein_meta(range(1, 9)))
+
+    return {'path_ss_img': ss_dir, 'path_ss_txt': ss_txt, 'path_senso_img': senso_dir, 'path_senso_txt': senso_txt,
+            'path_report_pt': report_pt}, meta
+
+
+def generate_experiment(out_dir, flavor, num_cmpds, num_pts=6, seed=0, image_size=(240, 180)):
+    """
+    Writes a synthetic experiment to a folder.
+
+    :param out_dir: Folder the files are written to. Created if it does not exist.
+    :param flavor: One of FLAVORS.
+    :param num_cmpds: Number of compounds.
+    :param num_pts: Number of points in each titration.
+    :param seed: Seed of the random values.
+    :param image_size: Width and height of the fit images in pixels.
+    :return: Dictionary with the paths of the files, including 'config' for the configuration file and
+        'path_mstr_tbl' for the setup table.
+    """
+    if flavor not in FLAVORS:
+        raise ValueError('Flavor must be one of: ' + ', '.join(FLAVORS))
+
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.RandomState(seed)
+
+    df_setup = make_setup_table(num_cmpds, num_pts=num_pts, seed=seed)
+    path_mstr_tbl = os.path.join(out_dir, 'setup_table.csv')
+    df_setup.to_csv(path_mstr_tbl, index=False)
+
+    if flavor in FLAVORS_8K:
+        paths, meta = _generate_8k(out_dir, flavor, df_setup, rng, image_size)
+    else:
+        paths, meta = _generate_not_8k(out_dir, flavor, df_setup, rng, image_size)
+
+    paths['path_mstr_tbl'] = path_mstr_tbl
+    paths['config'] = os.path.join(out_dir, 'config.txt')
+    _write_config(paths['config'], {key: value for key, value in paths.items() if key.startswith('path_')}, meta)
+
+    return paths
+
+
+def main(args=None):
+    args = parser.parse_args(args=args)
+    paths = generate_experiment(args.out, args.flavor, args.compounds, num_pts=args.num_pts, seed=args.seed)
+    print('Configuration file: ' + paths['config'])
+    return paths
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,8 @@ import platform
 import argparse
 from datetime import datetime
 from _version import __version__
-import numpy as np
+from SPR_to_ADLP_Functions import plate_planner
+from SPR_to_ADLP_Functions import batch as batch_runner
 
 # Get the users Home Directory
 if platform.system() == "Windows":
@@ -14,28 +15,74 @@ if platform.system() == "Windows":
 else:
     homedir = os.environ['HOME']
 
+# Name of the placeholder rows for needles without a compound in the last pass of an 8k run.
+BLANK_NEEDLE = 'BLANK_NEEDLE'
+
 # Use argparse to parse the arguments instead of click.
 parser = argparse.ArgumentParser(description='Script for Creating an SPR setup file.')
 parser.add_argument("-c", "--clip", action='store_true', default=False)
-parser.add_argument("--b8k", action='store_true', default=False)
+parser.add_argument("--b8k", dest='b8k', action='store_const', const=True, default=None,
+                    help="Format the file for Biacore 8K without asking.")
+parser.add_argument("--not_8k", dest='b8k', action='store_const', const=False,
+                    help="Do not format the file for Biacore 8K and do not ask.")
+parser.add_argument("-s", "--setup_table", help="Path to the setup table csv file. Skips the prompt for the path.",
+                    default=None)
+parser.add_argument("-b", "--batch", help="Folder or glob pattern of setup table csv files. Creates a setup file for "
+                                          "each table.",
+                    default=None)
+parser.add_argument("-w", "--workers", help="Number of setup tables processed in parallel in batch mode. "
+                                            "Defaults to one per CPU.",
+                    type=int, default=None)
 
 
 def main(args=None):
     """Creates the setup file necessary to run an ABA functional assay protocol on a Biacore S200 or 8k instrument.
 
+    Without any options the script asks if the file is for the 8K and for the path of the setup table. The options
+    --b8k or --not_8k and --setup_table answer these questions so the script can run without user input. With --batch
+    a setup file is created for every setup table in a folder or matching a glob pattern.
+
      :param clip: Contents of the setup file are on the clipboard.
-     :param b8k: Boolean to indicate data format in for 8k or not.
+     :param b8k: Boolean to indicate data format in for 8k or not. Asks the user when not given.
+     :param setup_table: Path to the setup table csv file.
+     :param batch: Folder or glob pattern of setup table csv files.
+     :param workers: Number of setup tables processed in parallel in batch mode.
      :type clip: bool
     """
 
     # Extract the command line arguments
     args = parser.parse_args(args=args)
 
-    # Determine at runtime if the user wants to format the file for a Biacore 8k run.
+    # Determine if the user wants to format the file for a Biacore 8k run.
+    process_for_8k = args.b8k
+    if process_for_8k is None:
+        process_for_8k = ask_process_for_8k()
+
+    if args.batch:
+        return main_batch(batch=args.batch, process_for_8k=process_for_8k, workers=args.workers)
+
+    try:
+        if args.clip:
+            df_setup_ori = pd.read_clipboard()
+        else:
+            file = args.setup_table
+            if file is None:
+                file = input('Paste the path to the setup table: ')
+            df_setup_ori = pd.read_csv(file)
+    except:
+        raise ImportError("Issues reading contents of file.")
+
+    return create_funct_setup_file(df_setup_ori=df_setup_ori, process_for_8k=process_for_8k)
+
+
+def ask_process_for_8k():
+    """
+    Asks the user if the output table should be formatted for the Biacore 8K.
+
+    :return: True if the file should be formatted for the 8K.
+    """
     process_for_8k = False
 
-    # TODO: How to test using click?
-    # Ask user if they want the output table to be formatted for the 8K
     while True:
         process_for_8k_confirm = input("Do you want to format the file for Biacore 8K [y/N]?")
 
@@ -49,35 +96,58 @@ def main(args=None):
                 (process_for_8k_confirm == 'N')):
             break
 
+    return process_for_8k
+
+
+def main_batch(batch, process_for_8k, workers=None):
+    """
+    Creates a setup file for every setup table of a batch. The tables are independent so they are processed in
+    parallel.
+
+    :param batch: Folder or glob pattern of setup table csv files.
+    :param process_for_8k: Flag to indicate that the files should be formatted for the Biacore 8K.
+    :param workers: Number of worker processes. Defaults to one per CPU.
+    :return: Dictionary of setup table path to setup sheet DataFrame for the tables that succeeded.
+    """
+    ls_paths = batch_runner.find_input_files(batch)
+    print('Creating setup files for', len(ls_paths), 'setup tables.')
+
+    results, failures = batch_runner.run_batch(funct_setup_file_from_csv, ls_paths, workers=workers,
+                                               process_for_8k=process_for_8k)
+    batch_runner.report_failures(failures)
+
+    return results
+
+
+def funct_setup_file_from_csv(path, process_for_8k, name=None):
+    """
+    Reads a setup table csv file and creates its functional setup file.
+
+    :param path: Path to the setup table csv file.
+    :param process_for_8k: Flag to indicate that the file should be formatted for the Biacore 8K.
+    :param name: Name added to the output file name.
+    :return: The setup sheet DataFrame.
+    """
     try:
-        if args.clip:
-            df_setup_ori = pd.read_clipboard()
-        else:
-            # TODO: How to test using click?
-            # file = click.prompt("Paste the path to the setup table", type=click.Path(exists=True))
-            file = input('Paste the path to the setup table: ')
-            df_setup_ori = pd.read_csv(file)
+        df_setup_ori = pd.read_csv(path)
     except:
         raise ImportError("Issues reading contents of file.")
 
+    return create_funct_setup_file(df_setup_ori=df_setup_ori, process_for_8k=process_for_8k, name=name)
 
 
-    # If process_for_8k is True, preform checks of the current supported scenarios.
-    if process_for_8k:
-        if not len(df_setup_ori) % 8 == 0:
-            print("This script currently only supports runs using all 8 needles.\n")
-            print("Exiting program... Please try again.")
-            raise RuntimeError
-
-        if (len(df_setup_ori) > 32) & (int(df_setup_ori.iloc[1]['num_pts']) == 10):
-            print('Currently this script supports processing one 384W plate at a time.')
-            print("Exiting program... Please try again.")
-            raise RuntimeError
+def create_funct_setup_file(df_setup_ori, process_for_8k, name=None):
+    """
+    Builds the functional setup sheet from a setup table and saves it.
 
-        if (len(df_setup_ori) > 48) & (int(df_setup_ori.iloc[1]['num_pts']) == 6):
-            print('Currently this script supports processing one 384W plate at a time.')
-            print("Exiting program... Please try again.")
-            raise RuntimeError
+    :param df_setup_ori: Setup table DataFrame.
+    :param process_for_8k: Flag to indicate that the file should be formatted for the Biacore 8K.
+    :param name: Name added to the output file name, used to keep the files of a batch apart.
+    :return: The setup sheet DataFrame.
+    """
+    # The needles of a pass inject together, so an 8K run needs the same number of points for every compound.
+    if process_for_8k:
+        num_pts_curve = plate_planner.num_pts_of_run(df_setup_ori)
 
     try:
         # Read in the DataFrame.
@@ -189,165 +259,48 @@ def main(args=None):
         final_df = final_df.loc[:, ['Sample Solution', 'Flanking Solution (A)', 'CONC', 'MW', 'BAR']]
 
         # Need to sort the DF if flag b8k is true.
+        # Each pass of the 8k head runs the first blank of its 8 compounds, then their second blank, then the
+        # titrations interleaved across the needles. Compounds that do not fit on one 384W plate go to the next plate
+        # and needles without a compound in the last pass get a BLANK_NEEDLE row.
+        ls_df_plates = [final_df]
         if process_for_8k:
+            ls_df_plates = plate_planner.split_into_plates(final_df=final_df, num_cmpds=len(df_setup_ori),
+                                                           num_pts=num_pts_curve,
+                                                           empty_needle_row={'Sample Solution': BLANK_NEEDLE,
+                                                                             'Flanking Solution (A)': BLANK_NEEDLE,
+                                                                             'CONC': 0})
+            final_df = pd.concat(ls_df_plates, ignore_index=True)
 
-            """
-            Need to sort the df for 8k input such that each cmpd is grouped for 8 needles and sorted by conc. 
-            Stategy: 
-            1. Add a row number column. 
-            2. Add logic that address two zero conc. pts for each cmpd run.
-            3. Sort by zero conc., row number, concentration.
-            """
-            # Variables needed to reorganize compound titrations for 8k.
-            num_pts_curve = int(df_setup_ori.iloc[1]['num_pts'])
-            num_active_needles = 8
-            total_pts_per_pass = num_pts_curve * num_active_needles
-
-            # add column for sorting
-            final_df.loc[:, 'sort_zero'] = ''
-
-            # Variables needed to keep track of where a zero is located in original df
-            zero_num = 2
-            zero_count = 1
-
-            for i in range(zero_num):
-                for index, row in final_df.iterrows():
-                    if row['CONC'] == 0:
-                        if (index % 2 == 0) & (i == 0):
-                            final_df.loc[index, 'sort_zero'] = zero_count
-                            zero_count += 1
-                        elif (index % 2 != 0) & (i != 0):
-                            final_df.loc[index, 'sort_zero'] = zero_count
-                            zero_count += 1
-                    else:
-                        final_df.loc[index, 'sort_zero'] = np.nan
-
-            # Create a copy of the final df so that the final_df is preserved.
-            df_zeros = final_df.copy()
-            df_zeros = df_zeros.dropna(how='any', subset=['sort_zero'])
-
-            df_zeros = df_zeros.sort_values(['sort_zero'])
-            df_zeros = df_zeros.reset_index(drop=True)
-
-            # Create a list to store the sorted DataFrames of zero concentration.
-            ls_df_zeros = []
-
-            row_start = 0
-            row_end = num_active_needles
-
-            # Group into df's of 8 rows each corresponding to the 8 needles.
-            for i in range(0, int(len(df_zeros)), num_active_needles):
-                df_active = df_zeros.iloc[row_start:row_end, :]
-                df_active = df_active.reset_index(drop=True)
-                del df_active['sort_zero']
-                ls_df_zeros.append(df_active)
-                row_start += 8
-                row_end += 8
-
-            # At this point the blanks ordered are placed into separate DF's of length 8 for the 8 needles of the 8k.
-            # Now the non-blank concentrations must be handled...
-            df_non_zero = final_df[final_df['sort_zero'].isna()].copy()
-            df_non_zero.loc[:, 'sort_non_zero'] = ''
-            df_non_zero = df_non_zero.reset_index(drop=True)
-
-            # As done with the blanks, split DF into groups of 8 for the 8 needles
-            ls_dfs_non_zeros = []
-            row_start = 0
-            row_end = total_pts_per_pass
-
-            # Create a list of DataFrames separated by each pass of the 8k head.
-            for i in range(0, int(len(df_non_zero)), total_pts_per_pass):
-                df_active = df_non_zero.iloc[row_start:row_end, :]
-                df_active = df_active.reset_index(drop=True)
-                ls_dfs_non_zeros.append(df_active)
-                row_start += total_pts_per_pass
-                row_end += total_pts_per_pass
-
-            # For each df in the non zero df list..
-            # Pull out the df and label the sorting column so that sorting can be done.
-            ls_dfs_non_zeros_sorted = []
-
-            for df_active in ls_dfs_non_zeros:
-
-                non_zero_count = 1
-                row_count = 0
-                needle_num = 1
-
-                for i in range(0, num_pts_curve):
-
-                    for j in range(0, int(len(df_active)), num_pts_curve):
-                        df_active.loc[row_count, 'sort_non_zero'] = non_zero_count
-                        non_zero_count += 1
-                        row_count += num_pts_curve
-
-                    row_count = i + 1
-
-                # Sort based on the newly created 'sort_non_zero' column
-                df_active = df_active.sort_values(['sort_non_zero'])
-                df_active = df_active.reset_index(drop=True)
-
-                # Remove the columns needed for sorting
-                del df_active['sort_zero']
-                del df_active['sort_non_zero']
-
-                # Append the sorted group of 8 compound titrations to the list of dfs
-                ls_dfs_non_zeros_sorted.append(df_active)
-
-            # Need to paste all the zero and non-zero df's together in the right order.
-            if ((len(df_setup_ori) == 8) & (num_pts_curve == 10)) | ((len(df_setup_ori) == 8) & (num_pts_curve == 6)):
-                final_df = pd.concat([ls_df_zeros[0], ls_df_zeros[1],
-                                      ls_dfs_non_zeros_sorted[0]])
-
-            elif ((len(df_setup_ori) == 16) & (num_pts_curve == 10)) | (
-                    (len(df_setup_ori) == 16) & (num_pts_curve == 6)):
-                final_df = pd.concat([ls_df_zeros[0], ls_df_zeros[2], ls_dfs_non_zeros_sorted[0],
-                                      ls_df_zeros[1], ls_df_zeros[3], ls_dfs_non_zeros_sorted[1]])
-
-            elif ((len(df_setup_ori) == 24) & (num_pts_curve == 10)) | (
-                    (len(df_setup_ori) == 24) & (num_pts_curve == 6)):
-                final_df = pd.concat([ls_df_zeros[0], ls_df_zeros[3], ls_dfs_non_zeros_sorted[0],
-                                      ls_df_zeros[1], ls_df_zeros[4], ls_dfs_non_zeros_sorted[1],
-                                      ls_df_zeros[2], ls_df_zeros[5], ls_dfs_non_zeros_sorted[2]])
-
-            elif ((len(df_setup_ori) == 32) & (num_pts_curve == 10)) | (
-                    (len(df_setup_ori) == 32) & (num_pts_curve == 6)):
-                final_df = pd.concat([ls_df_zeros[0], ls_df_zeros[4], ls_dfs_non_zeros_sorted[0],
-                                      ls_df_zeros[1], ls_df_zeros[5], ls_dfs_non_zeros_sorted[1],
-                                      ls_df_zeros[2], ls_df_zeros[6], ls_dfs_non_zeros_sorted[2],
-                                      ls_df_zeros[3], ls_df_zeros[7], ls_dfs_non_zeros_sorted[3]])
-
-            elif (len(df_setup_ori) == 40) & (num_pts_curve == 6):
-                final_df = pd.concat([ls_df_zeros[0], ls_df_zeros[5], ls_dfs_non_zeros_sorted[0],
-                                      ls_df_zeros[1], ls_df_zeros[6], ls_dfs_non_zeros_sorted[1],
-                                      ls_df_zeros[2], ls_df_zeros[7], ls_dfs_non_zeros_sorted[2],
-                                      ls_df_zeros[3], ls_df_zeros[8], ls_dfs_non_zeros_sorted[3],
-                                      ls_df_zeros[4], ls_df_zeros[9], ls_dfs_non_zeros_sorted[4]])
-
-            elif (len(df_setup_ori) == 48) & (num_pts_curve == 6):
-                final_df = pd.concat([ls_df_zeros[0], ls_df_zeros[6], ls_dfs_non_zeros_sorted[0],
-                                      ls_df_zeros[1], ls_df_zeros[7], ls_dfs_non_zeros_sorted[1],
-                                      ls_df_zeros[2], ls_df_zeros[8], ls_dfs_non_zeros_sorted[2],
-                                      ls_df_zeros[3], ls_df_zeros[9], ls_dfs_non_zeros_sorted[3],
-                                      ls_df_zeros[4], ls_df_zeros[10], ls_dfs_non_zeros_sorted[4],
-                                      ls_df_zeros[5], ls_df_zeros[11], ls_dfs_non_zeros_sorted[5]])
-
-            final_df = final_df.reset_index(drop=True)
+            # Show what running the last pass with fewer needles saves compared with padding it.
+            plate_planner.print_throughput_report(num_cmpds=len(df_setup_ori), num_pts=num_pts_curve)
 
     except RuntimeError:
         print("Something is wrong. Check the original file.")
         raise
 
-        # Save the file to the desktop
-    save_output_file(df_final=final_df)
+    # Save the file to the desktop, one file per plate
+    if len(ls_df_plates) == 1:
+        save_output_file(df_final=final_df, name=name)
+    else:
+        for plate_num, df_plate in enumerate(ls_df_plates, start=1):
+            save_output_file(df_final=df_plate, plate_num=plate_num, name=name)
 
     return final_df
 
 
-def save_output_file(df_final):
+def save_output_file(df_final, plate_num=None, name=None):
     # Truncate the year in the file name.
     now = datetime.now()
     now = now.strftime('%y%m%d')
 
+    # Files created in one batch are told apart by the name of their setup table.
+    if name is not None:
+        now = now + '_' + name
+
+    # Campaigns split across several plates get one file per plate.
+    if plate_num is not None:
+        now = now + '_plate_' + str(plate_num)
+
     # Save file path for server Iron
     save_file_path_iron = os.path.join('iron', 'tdts_users', 'SPR Setup Files',
                                        now + '_spr_setup_funct_APPVersion_' + str(__version__))
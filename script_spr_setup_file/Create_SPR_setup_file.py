@@ -4,6 +4,8 @@ import os
 import platform
 import argparse
 import numpy as np
+from SPR_to_ADLP_Functions import plate_planner
+from SPR_to_ADLP_Functions import batch as batch_runner
 from _version import __version__
 
 # Get the users Home Directory
@@ -13,26 +15,36 @@ if platform.system() == "Windows":
 else:
     homedir = os.environ['HOME']
 
+# Name of the placeholder rows for needles without a compound in the last pass of an 8k run.
+BLANK_NEEDLE = 'BLANK_NEEDLE'
+
 # Use argparse to parse the arguments instead of click.
 parser = argparse.ArgumentParser(description='Script for Creating an SPR setup file.')
 parser.add_argument("-c", "--clip", help="Option to indicate setup table contents are on the clipboard.",
                     action='store_true',
                     default=False)
-
-
-def spr_setup_sheet(args=None):
-    """
-    Creates the setup file necessary to run a dose response protocol on a Biacore instrument.
-    :param clip: Optional flag to indicate that the contents of the setup file are on the clipboard.
+parser.add_argument("--b8k", dest='b8k', action='store_const', const=True, default=None,
+                    help="Format the file for Biacore 8K without asking.")
+parser.add_argument("--not_8k", dest='b8k', action='store_const', const=False,
+                    help="Do not format the file for Biacore 8K and do not ask.")
+parser.add_argument("-s", "--setup_table", help="Path to the setup table csv file. Skips the prompt for the path.",
+                    default=None)
+parser.add_argument("-b", "--batch", help="Folder or glob pattern of setup table csv files. Creates a setup file for "
+                                          "each table.",
+                    default=None)
+parser.add_argument("-w", "--workers", help="Number of setup tables processed in parallel in batch mode. "
+                                            "Defaults to one per CPU.",
+                    type=int, default=None)
+
+
+def ask_process_for_8k():
     """
+    Asks the user if the output table should be formatted for the Biacore 8K.
 
-    # Extract the command line arguments
-    args = parser.parse_args(args=args)
-
-    # Determine at runtime if the user wants to format the file for a Biacore 8k run.
+    :return: True if the file should be formatted for the 8K.
+    """
     process_for_8k = False
 
-    # Ask user if they want the output table to be formatted for the 8K
     while True:
         process_for_8k_confirm = input("Do you want to format the file for Biacore 8K [y/N]?")
 
@@ -45,22 +57,96 @@ def spr_setup_sheet(args=None):
             (process_for_8k_confirm == 'n') |
             (process_for_8k_confirm == 'N')):
             break
-    
+
+    return process_for_8k
+
+
+def spr_setup_sheet(args=None):
+    """
+    Creates the setup file necessary to run a dose response protocol on a Biacore instrument.
+
+    Without any options the script asks if the file is for the 8K and for the path of the setup table. The options
+    --b8k or --not_8k and --setup_table answer these questions so the script can run without user input. With --batch
+    a setup file is created for every setup table in a folder or matching a glob pattern.
+
+    :param args: List of command line arguments. Defaults to sys.argv.
+    :return: The setup sheet DataFrame or, in batch mode, a dictionary of setup table path to setup sheet DataFrame.
+    """
+
+    # Extract the command line arguments
+    args = parser.parse_args(args=args)
+
+    # Determine if the user wants to format the file for a Biacore 8k run.
+    process_for_8k = args.b8k
+    if process_for_8k is None:
+        process_for_8k = ask_process_for_8k()
+
+    if args.batch:
+        return spr_setup_sheet_batch(batch=args.batch, process_for_8k=process_for_8k, workers=args.workers)
+
     try:
         if args.clip:
             df_setup_ori = pd.read_clipboard()
         else:
-            file = input('Paste the path to the setup table: ')
+            file = args.setup_table
+            if file is None:
+                file = input('Paste the path to the setup table: ')
             df_setup_ori = pd.read_csv(file)
     except:
         raise ImportError("Issues reading contents of file.")
 
-    # If process_for_8k is True, preform checks of the current supported scenarios.
+    return create_setup_file(df_setup_ori=df_setup_ori, process_for_8k=process_for_8k)
+
+
+def spr_setup_sheet_batch(batch, process_for_8k, workers=None):
+    """
+    Creates a setup file for every setup table of a batch. The tables are independent so they are processed in
+    parallel.
+
+    :param batch: Folder or glob pattern of setup table csv files.
+    :param process_for_8k: Flag to indicate that the files should be formatted for the Biacore 8K.
+    :param workers: Number of worker processes. Defaults to one per CPU.
+    :return: Dictionary of setup table path to setup sheet DataFrame for the tables that succeeded.
+    """
+    ls_paths = batch_runner.find_input_files(batch)
+    print('Creating setup files for', len(ls_paths), 'setup tables.')
+
+    results, failures = batch_runner.run_batch(setup_file_from_csv, ls_paths, workers=workers,
+                                               process_for_8k=process_for_8k)
+    batch_runner.report_failures(failures)
+
+    return results
+
+
+def setup_file_from_csv(path, process_for_8k, name=None):
+    """
+    Reads a setup table csv file and creates its setup file.
+
+    :param path: Path to the setup table csv file.
+    :param process_for_8k: Flag to indicate that the file should be formatted for the Biacore 8K.
+    :param name: Name added to the output file name.
+    :return: The setup sheet DataFrame.
+    """
+    try:
+        df_setup_ori = pd.read_csv(path)
+    except:
+        raise ImportError("Issues reading contents of file.")
+
+    return create_setup_file(df_setup_ori=df_setup_ori, process_for_8k=process_for_8k, name=name)
+
+
+def create_setup_file(df_setup_ori, process_for_8k, name=None):
+    """
+    Builds the setup sheet from a setup table and saves it.
+
+    :param df_setup_ori: Setup table DataFrame.
+    :param process_for_8k: Flag to indicate that the file should be formatted for the Biacore 8K.
+    :param name: Name added to the output file name, used to keep the files of a batch apart.
+    :return: The setup sheet DataFrame.
+    """
+    # The needles of a pass inject together, so an 8K run needs the same number of points for every compound.
     if process_for_8k:
-        if not len(df_setup_ori) % 8 == 0:
-            print("This script currently only supports runs using all 8 needles.\n")
-            print("Exiting program... Please try again.")
-            raise RuntimeError
+        num_pts_curve = plate_planner.num_pts_of_run(df_setup_ori)
 
     # Reformat the original table for the Biacore instruments. (S200, T200, 8K)
     try:
@@ -74,261 +160,136 @@ def spr_setup_sheet(args=None):
         df_setup_trim = df_setup_ori.loc[:, ['Broad ID', 'MW', 'Plate_Barcode', 'Barcode', 'Test [Cpd] uM',
                                              'fold_dil', 'num_pts']]
 
-        # Start building the setup sheet.
-        # Store the dimensions of the DataFrame in variables that are used later in the method.
-        nRows, nCols = df_setup_trim.shape
-
-        # Create empty list used to build up the final DataFrame.
-        brd_list = []
-        mw_list = []
-        bar_list = []
-        conc_list = []
-        bar_plate_list = []
-
-        # Inner method uses the original DataFrame to construct each column of the setup sheet.
-        def create_lists(header, list):
-
-            if header == 'Broad ID':
-                unique_brd = 1
-                for cmpd in range(nRows):
-                    value = df_setup_trim.iloc[cmpd][header]
-
-                    for i in range(int(df_setup_trim.iloc[cmpd]['num_pts']) + 2):
-
-                        # As the SPR field limit is only 15 characters trim the BRD's
-                        if len(value) == 22:
-                            v = value[:3] + '-' + value[9:13] + '_' + str(unique_brd)
-                            list.append(v)
-                        else:
-                            v = value + '_' + str(unique_brd)
-                            list.append(v)
-                    unique_brd += 1
+        # Build the setup sheet with one row per injection.
+        final_df = create_setup_table(df_setup_trim=df_setup_trim, plate_bar=plate_bar)
+
+        if process_for_8k:
+            ls_df_plates = process_df_for_8k(df_setup_ori=df_setup_ori, final_df=final_df)
+
+            # Show what running the last pass with fewer needles saves compared with padding it.
+            plate_planner.print_throughput_report(num_cmpds=len(df_setup_ori), num_pts=num_pts_curve)
+
+            # Save one file per plate to the desktop
+            if len(ls_df_plates) == 1:
+                save_output_file(df_final=ls_df_plates[0], name=name)
             else:
-                for cmpd in range(nRows):
-                    value = df_setup_trim.iloc[cmpd][header]
-                    for i in range(int(df_setup_trim.iloc[cmpd]['num_pts']) + 2):
-                        list.append(value)
+                for plate_num, df_plate in enumerate(ls_df_plates, start=1):
+                    save_output_file(df_final=df_plate, plate_num=plate_num, name=name)
 
-        # Inner method needed to create the dose response column.
-        def dose_conc_list():
+            final_df = pd.concat(ls_df_plates, ignore_index=True)
+        else:
+            # Save the file to the desktop
+            save_output_file(df_final=final_df, name=name)
 
-            for cmpd in range(nRows):
+        return final_df
 
-                # empty list to store each concentration in the dose response
-                dose_list = []
+    except Exception:
+        raise RuntimeError('Something is wrong. Please check.')
 
-                # Include two blank injections for each compound
-                dose_list.append(0)
-                dose_list.append(0)
 
-                top = df_setup_trim.iloc[cmpd]['Test [Cpd] uM']  # store top dose in a variable.
+def dose_response_concentrations(df_setup_trim):
+    """
+    Computes the concentration of every injection in the setup sheet. Each compound gets two blank injections followed
+    by its dilution series sorted from the lowest to the highest concentration.
 
-                for i in range(int(df_setup_trim.iloc[cmpd]['num_pts'])):
-                    dose_list.append(top)
-                    top = top / float(
-                        df_setup_ori.iloc[cmpd]['fold_dil'])  # use value in original DataFrame to determine
-                    # the fold of dilution.
-                dose_list.sort(reverse=False)
+    The dilution series of all compounds are computed together as the columns of an array, one dilution step at a
+    time, so each concentration is the same repeated division as a serial dilution from the top concentration.
 
-                # Want one final concentration list.  So add each concentration in the dose_list to the final conc_list.
-                for c in dose_list:
-                    conc_list.append(c)
+    :param df_setup_trim: Setup table with the columns 'Test [Cpd] uM', 'fold_dil' and 'num_pts'.
+    :return: numpy array of concentrations in the order of the setup sheet.
+    """
+    top = df_setup_trim['Test [Cpd] uM'].to_numpy()
+    fold_dil = df_setup_trim['fold_dil'].to_numpy(dtype=float)
+    num_pts = df_setup_trim['num_pts'].to_numpy().astype(int)
+    max_pts = num_pts.max() if len(num_pts) > 0 else 0
 
-        # Create the columns in the setup sheet
-        create_lists(header='Broad ID', list=brd_list)
-        create_lists(header='MW', list=mw_list)
-        dose_conc_list()
-        create_lists(header='Barcode', list=bar_list)
+    # One row per compound: two blanks followed by the dilution series.
+    doses = np.zeros((len(top), max_pts + 2))
+    conc = top.astype(float)
+    for i in range(max_pts):
+        doses[:, i + 2] = conc
+        conc = conc / fold_dil
 
-        if plate_bar:
-            create_lists(header='Plate_Barcode', list=bar_plate_list)
+    # Points past the end of a shorter curve are pushed to the end of the row by the sort and then dropped.
+    in_curve = np.arange(max_pts + 2) < (num_pts[:, None] + 2)
+    doses[~in_curve] = np.inf
+    doses = np.sort(doses, axis=1)
+    conc_arr = doses[np.sort(in_curve, axis=1)[:, ::-1]]
 
-        # Create the final DataFrame from all of the lists.
-        if plate_bar:
-            final_df = pd.DataFrame({'BRD': brd_list, 'MW': mw_list, 'CONC': conc_list,
-                                 'BAR': bar_list, 'PLATE_BAR': bar_plate_list})
-        else:
-            final_df = pd.DataFrame({'BRD': brd_list, 'MW': mw_list, 'CONC': conc_list,
-                                     'BAR': bar_list})
+    # Without any dilutions the concentrations keep the type of the top concentrations.
+    if max_pts <= 1 and np.issubdtype(top.dtype, np.integer):
+        conc_arr = conc_arr.astype(top.dtype)
 
-        # Reorder the columns
-        if plate_bar:
-            final_df = final_df.loc[:, ['BRD', 'MW', 'CONC', 'BAR', 'PLATE_BAR']]
-        else:
-            final_df = final_df.loc[:, ['BRD', 'MW', 'CONC', 'BAR']]
+    return conc_arr
 
-        if process_for_8k:
-            final_df = process_df_for_8k(df_setup_ori=df_setup_ori, final_df=final_df)
 
-            # Save the file to the desktop
-            save_output_file(df_final=final_df)
-        else:
-            # Save the file to the desktop
-            save_output_file(df_final=final_df)
+def create_setup_table(df_setup_trim, plate_bar):
+    """
+    Expands the setup table to one row per injection. Every compound is repeated num_pts + 2 times, once for each
+    concentration of its dose response and the two blanks.
 
-        return final_df
+    :param df_setup_trim: Setup table trimmed to the columns needed for the setup sheet.
+    :param plate_bar: Flag to indicate that the plate barcode column should be included.
+    :return: DataFrame with the columns BRD, MW, CONC, BAR and optionally PLATE_BAR.
+    """
+    num_rows = len(df_setup_trim)
+    repeats = df_setup_trim['num_pts'].to_numpy().astype(int) + 2
 
-    except Exception:
-        raise RuntimeError('Something is wrong. Please check.')
+    # As the SPR field limit is only 15 characters trim the BRD's
+    brd = df_setup_trim['Broad ID'].astype(str)
+    brd = brd.where(brd.str.len() != 22, brd.str[:3] + '-' + brd.str[9:13])
+    brd = brd + '_' + pd.Series(np.arange(1, num_rows + 1), index=brd.index).astype(str)
+
+    final_df = pd.DataFrame({'BRD': np.repeat(brd.to_numpy(), repeats),
+                             'MW': np.repeat(df_setup_trim['MW'].to_numpy(), repeats),
+                             'CONC': dose_response_concentrations(df_setup_trim),
+                             'BAR': np.repeat(df_setup_trim['Barcode'].to_numpy(), repeats)})
+
+    if plate_bar:
+        final_df['PLATE_BAR'] = np.repeat(df_setup_trim['Plate_Barcode'].to_numpy(), repeats)
+
+    return final_df
 
 
 def process_df_for_8k(df_setup_ori, final_df):
     """
     Method that formats the setup file for the Biacore 8k Instrument
 
-    Complication: No easy way to sort the final_df for the 8k.
-    Must treat the zeros or blank injections differently as there are 2 blanks for every compound titration.
-    In addition, the 8k head sweeps across an entire 384 well plate so there will be more than one compound
-    titration for each of the 8 needles in a single pass of the 8 needled head and therefore more than
-    one set of blanks separated with compound titrations within the plate.
+    Complication: The 8k head has 8 needles that sweep across an entire 384 well plate, so each pass of the head runs
+    one compound titration per needle. Each pass must start with the first blank of its 8 compounds, followed by the
+    second blank of the same compounds, followed by the titrations interleaved across the needles (lowest
+    concentration for needles 1-8, then the next concentration for needles 1-8 and so on). Compounds that do not fit
+    on one plate are moved to the next plate. If the number of compounds is not a multiple of 8, the needles without a
+    compound in the last pass get a BLANK_NEEDLE row.
 
     Logic
-    1. From the final_df created for non-8k instruments above...
-    2. Locate and label the first and second blank injections (zeros).
-    3. Sort the blank injections
-    4. Remove the non-blank injections and save to a separate df.
-    5. Separate the sorted blank injections into df's of 8 rows each that correspond to the 8 needles of the 8k.
-    6. Add each 8 rowed df to a new list.
-    7. Reorder the list of df's so that they are consistent with the correct order across the plate from left to right.
-    8. Address the non-zero points by taking the original final_df above and removing the zero points.
-    9. Separate each group of titrations (number of points/ curve * 8 needles) into separate dfs.
-    10. Label each row of each separated df so that it can be sorted for the 8k needle.
-    11. Sort each df.
-    12. Concatenate the zero df and non-zero df's in the correct order into the final df.
-    """
+    1. In the final_df created for non-8k instruments above, every compound takes num_pts + 2 consecutive rows: two
+       blanks followed by its titration.
+    2. The plate planner splits the compounds across as many plates as needed and computes the injection order of
+       each plate as one integer array of row positions.
+    3. The rows of each plate are reordered with a single take.
 
-    # Variables needed to reorganize compound titrations for 8k.
-    num_pts_curve = int(df_setup_ori.iloc[1]['num_pts'])
-    num_active_needles = 8
-    total_pts_per_pass = num_pts_curve * num_active_needles
-
-    # add column for sorting
-    final_df.loc[:, 'sort_zero'] = ''
-
-    # Variables needed to keep track of where a zero is located in original df
-    zero_num = 2
-    zero_count = 1
-
-    for i in range(zero_num):
-        for index, row in final_df.iterrows():
-            if row['CONC'] == 0:
-                if (index % 2 == 0) & (i == 0):
-                    final_df.loc[index, 'sort_zero'] = zero_count
-                    zero_count += 1
-                elif (index % 2 != 0) & (i != 0):
-                    final_df.loc[index, 'sort_zero'] = zero_count
-                    zero_count += 1
-            else:
-                final_df.loc[index, 'sort_zero'] = np.nan
-
-    # Create a copy of the final df so that the final_df is preserved.
-    df_zeros = final_df.copy()
-    df_zeros = df_zeros.dropna(how='any', subset=['sort_zero'])
-
-    df_zeros = df_zeros.sort_values(['sort_zero'])
-    df_zeros = df_zeros.reset_index(drop=True)
-
-    # Create a list to store the sorted DataFrames of zero concentration.
-    ls_df_zeros = []
-
-    row_start = 0
-    row_end = num_active_needles
-
-    # Group into df's of 8 rows each corresponding to the 8 needles.
-    for i in range(0, int(len(df_zeros)), num_active_needles):
-        df_active = df_zeros.iloc[row_start:row_end, :]
-        df_active = df_active.reset_index(drop=True)
-        del df_active['sort_zero']
-        ls_df_zeros.append(df_active)
-        row_start += 8
-        row_end += 8
-
-    # At this point the blanks ordered are placed into separate DF's of length 8 for the 8 needles of the 8k.
-    # Now the non-blank concentrations must be handled...
-    df_non_zero = final_df[final_df['sort_zero'].isna()].copy()
-    df_non_zero.loc[:,'sort_non_zero'] = ''
-    df_non_zero = df_non_zero.reset_index(drop=True)
-
-    # As done with the blanks, split DF into groups of 8 for the 8 needles
-    ls_dfs_non_zeros = []
-    row_start = 0
-    row_end = total_pts_per_pass
-
-    # Create a list of DataFrames separated by each pass of the 8k head.
-    for i in range(0, int(len(df_non_zero)), total_pts_per_pass):
-        df_active = df_non_zero.iloc[row_start:row_end, :]
-        df_active = df_active.reset_index(drop=True)
-        ls_dfs_non_zeros.append(df_active)
-        row_start += total_pts_per_pass
-        row_end += total_pts_per_pass
-
-    # For each df in the non zero df list..
-    # Pull out the df and label the sorting column so that sorting can be done.
-    ls_dfs_non_zeros_sorted = []
-
-    for df_active in ls_dfs_non_zeros:
-
-        non_zero_count = 1
-        row_count = 0
-
-        for i in range(0, num_pts_curve):
-            for j in range(0, int(len(df_active)), num_pts_curve):
-                df_active.loc[row_count, 'sort_non_zero'] = non_zero_count
-                non_zero_count += 1
-                row_count += num_pts_curve
-
-            row_count = i + 1
-
-        # Sort based on the newly created 'sort_non_zero' column
-        df_active = df_active.sort_values(['sort_non_zero'])
-        df_active = df_active.reset_index(drop=True)
-
-        # Remove the columns needed for sorting
-        del df_active['sort_zero']
-        del df_active['sort_non_zero']
-
-        # Append the sorted group of 8 compound titrations to the list of dfs
-        ls_dfs_non_zeros_sorted.append(df_active)
-
-    # Dict where keys are num compounds run and value is the assignment of second_zero
-    # The second zero df in the list of zero df's is offset by the num cmpds run and num needles.
-    keys = np.arange(8, 296, 8)
-    vals = np.arange(1, 37, 1)
-    sec_zero_offset_dict = dict(zip(keys, vals))
-
-    # Create some counters
-    first_zero = 0
-    second_zero = sec_zero_offset_dict[len(df_setup_ori)]
-    non_zero = 0
-
-    # Calculate the number of needle passes in an experiment.
-    num_needle_pass = int(len(df_setup_ori)/num_active_needles)
-
-    # For each loop, Concat 1 needle pass of zeros and non-zero points.
-    ls_df_final =[]
-    for each_needle_pass in range(0, num_needle_pass):
-        final_df = pd.concat([ls_df_zeros[first_zero], ls_df_zeros[second_zero],
-                              ls_dfs_non_zeros_sorted[non_zero]])
-
-        # Append the zeros and non-zeros of one needle swip to a list of df's
-        ls_df_final.append(final_df)
-
-        first_zero += 1
-        second_zero += 1
-        non_zero += 1
-
-    # Concat all of the needle passes together for the final df.
-    final_df = pd.concat(ls_df_final)
-    final_df = final_df.reset_index(drop=True)
+    :return: List of DataFrames, one per plate, in injection order.
+    """
+    num_pts_curve = plate_planner.num_pts_of_run(df_setup_ori)
 
-    return final_df
+    return plate_planner.split_into_plates(final_df=final_df, num_cmpds=len(df_setup_ori), num_pts=num_pts_curve,
+                                           empty_needle_row={'BRD': BLANK_NEEDLE, 'CONC': 0})
 
 
-def save_output_file(df_final):
+def save_output_file(df_final, plate_num=None, name=None):
     # Truncate the year in the file name.
     now = datetime.now()
     now = now.strftime('%y%m%d_%H_%M')
 
+    # Files created in one batch are told apart by the name of their setup table.
+    if name is not None:
+        now = now + '_' + name
+
+    # Campaigns split across several plates get one file per plate.
+    if plate_num is not None:
+        now = now + '_plate_' + str(plate_num)
+
     # Save file path for server Iron
     if platform.system() == "Windows":
         save_file_path_iron = os.path.join('iron', 'tdts_users', 'SPR Setup Files',
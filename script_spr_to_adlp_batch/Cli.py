@@ -0,0 +1,41 @@
+"""
+Entry point to SPR_to_ADLP_Batch.py command line script.
+"""
+
+from script_spr_to_adlp_batch.SPR_to_ADLP_Batch import spr_create_dot_upload_file_batch
+import click
+
+# Using click to manage the command line interface
+@click.command()
+@click.argument('configs', nargs=-1, required=True)
+@click.option('--workers', '-j', type=int, default=None,
+              help="Number of experiments processed in parallel. Defaults to one per CPU.")
+@click.option('--summary_file', type=click.Path(dir_okay=False),
+              help="Optional path of a csv file to save the summary of the batch to.")
+@click.option('--structures', '-s', is_flag=True,
+              help="Option to indicate attempting to insert structures from database.")
+@click.option('--render_workers', '-w', type=int, default=1, show_default=True,
+              help="Number of processes used to render the chemical structures of each experiment.")
+@click.option('--profile', is_flag=True,
+              help="Option to save the time, bytes read and memory of each stage to a JSON file next to each ADLP "
+                   "file.")
+@click.option('--stream', is_flag=True,
+              help="Option to write the ADLP files row by row so memory stays flat for files with many rows.")
+@click.option('--format', 'export_format', type=click.Choice(['xlsx', 'csv', 'parquet']), default='xlsx',
+              show_default=True,
+              help="Format of the ADLP files. csv and parquet save the table with a manifest and a zip of the images.")
+@click.option('--preview', is_flag=True,
+              help="Option to also save the xlsx with the images when the format is csv or parquet.")
+@click.option('--prepare_images', is_flag=True,
+              help="Option to scale the images down to the height of the rows and recompress them before they are "
+                   "embedded.")
+def main(configs, workers, summary_file, structures, render_workers, profile, stream, export_format, preview,
+         prepare_images):
+    """
+    Creates an ADLP file for each configuration file in CONFIGS. CONFIGS are configuration files, folders of .txt
+    configuration files or glob patterns, and may mix instruments.
+    """
+    spr_create_dot_upload_file_batch(ls_configs=list(configs), workers=workers, summary_file=summary_file,
+                                     structures=structures, render_workers=render_workers, profile=profile,
+                                     stream=stream, export_format=export_format, preview=preview,
+                                     prepare_images=prepare_images)
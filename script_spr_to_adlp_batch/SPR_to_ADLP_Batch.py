@@ -0,0 +1,139 @@
+"""
+Creates the ADLP files of many experiments in one run.
+
+Each configuration file is sent to the script of its instrument: Biacore 8K functional assays, with a floated protein
+in the meta section, to script_spr_to_adlp_funct_8k, other Biacore 8K experiments to script_spr_to_adlp_8k and all
+other instruments to script_spr_to_adlp_not_8k. The experiments are independent so they are spread across worker
+processes. An experiment that fails does not stop the others, and a summary of every run is printed at the end.
+"""
+import configparser
+import importlib
+import logging
+import os
+import time
+
+import pandas as pd
+
+from SPR_to_ADLP_Functions import batch as batch_runner
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+
+# Module of each script, imported in the worker process that runs it.
+SCRIPTS = {'not_8k': 'script_spr_to_adlp_not_8k.SPR_to_ADLP',
+           '8k': 'script_spr_to_adlp_8k.SPR_to_ADLP_8K',
+           'funct_8k': 'script_spr_to_adlp_funct_8k.SPR_to_ADLP_Funct_8K'}
+
+SUMMARY_COLUMNS = ['CONFIG', 'SCRIPT', 'STATUS', 'ROWS', 'SECONDS', 'ERROR']
+
+
+def detect_script(config_file):
+    """
+    Finds the script that creates the ADLP file of an experiment from the instrument in its configuration file.
+
+    :param config_file: Path of the configuration file.
+    :return: Key of the script in SCRIPTS.
+    """
+    config = configparser.ConfigParser()
+    if not config.read(config_file) or not config.has_option('meta', 'instrument'):
+        raise ValueError('The configuration file has no instrument in its meta section: ' + config_file)
+
+    if config.get('meta', 'instrument') != 'Biacore8K':
+        return 'not_8k'
+    if config.has_option('meta', 'protein_floated_BIP'):
+        return 'funct_8k'
+    return '8k'
+
+
+def find_config_files(ls_configs):
+    """
+    Lists the configuration files of a batch.
+
+    :param ls_configs: List of configuration files, folders of .txt configuration files or glob patterns.
+    :return: List of file paths in the order given, without duplicates.
+    """
+    ls_paths = []
+    for config in ls_configs:
+        if os.path.isfile(config):
+            ls_paths.append(config)
+        else:
+            ls_paths.extend(batch_runner.find_input_files(config, extension='.txt'))
+
+    return list(dict.fromkeys(ls_paths))
+
+
+def create_adlp_file(config_file, name, structures=False, **kwargs):
+    """
+    Creates the ADLP file of one experiment with the script of its instrument.
+
+    :param config_file: Path of the configuration file.
+    :param name: Name of the ADLP file, passed as save_file.
+    :param structures: Optional flag that indicates if the program should attempt to insert chemical structures.
+    :param kwargs: Other options passed to spr_create_dot_upload_file, such as stream or export_format.
+    :return: Dictionary with the script used, the number of rows of the ADLP file and the run time in seconds.
+    """
+    start = time.perf_counter()
+    script = detect_script(config_file)
+    module = importlib.import_module(SCRIPTS[script])
+    try:
+        df_final_for_dot = module.spr_create_dot_upload_file(config_file=config_file, save_file=name, clip=False,
+                                                             structures=structures, **kwargs)
+    except Exception as e:
+        # Only the last exception is sent back from a worker process, so the error that caused it is added to it.
+        cause = e.__cause__ or e.__context__
+        if cause is None:
+            raise
+        raise RuntimeError(str(e) + ' Caused by ' + type(cause).__name__ + ': ' + str(cause)) from e
+
+    return {'SCRIPT': script, 'ROWS': len(df_final_for_dot), 'SECONDS': round(time.perf_counter() - start, 1)}
+
+
+def summarize(ls_paths, results, failures):
+    """
+    Puts the outcome of every run of a batch in one table.
+
+    :param ls_paths: List of configuration files in the order they were given.
+    :param results: Dictionary of configuration file to the result of create_adlp_file, as returned by run_batch.
+    :param failures: Dictionary of configuration file to exception, as returned by run_batch.
+    :return: DataFrame with one row per configuration file and the columns in SUMMARY_COLUMNS.
+    """
+    ls_rows = []
+    for path in ls_paths:
+        if path in results:
+            row = dict(results[path], CONFIG=path, STATUS='OK')
+        else:
+            error = failures[path]
+            row = {'CONFIG': path, 'STATUS': 'FAILED', 'ERROR': type(error).__name__ + ': ' + str(error)}
+        ls_rows.append(row)
+
+    return pd.DataFrame(ls_rows, columns=SUMMARY_COLUMNS)
+
+
+def spr_create_dot_upload_file_batch(ls_configs, workers=None, summary_file=None, **kwargs):
+    """
+    Creates the ADLP file of every experiment of a batch. Each ADLP file is named after its configuration file and
+    saved to the users desktop.
+
+    :param ls_configs: List of configuration files, folders of .txt configuration files or glob patterns.
+    :param workers: Number of experiments processed in parallel. Defaults to one per CPU.
+    :param summary_file: Optional path of a csv file the summary is saved to.
+    :param kwargs: Options passed to spr_create_dot_upload_file of every experiment, such as structures,
+        render_workers, profile, stream, export_format, preview or prepare_images.
+    :return: The summary DataFrame. A RuntimeError is raised after the summary is printed if any experiment failed.
+    """
+    ls_paths = find_config_files(ls_configs)
+    print('Creating ADLP files for', len(ls_paths), 'experiments.')
+
+    results, failures = batch_runner.run_batch(create_adlp_file, ls_paths, workers=workers, **kwargs)
+
+    df_summary = summarize(ls_paths, results, failures)
+    print('\n' + df_summary.fillna('').to_string(index=False))
+    if summary_file:
+        df_summary.to_csv(summary_file, index=False)
+        logging.info('Batch summary saved to ' + summary_file)
+
+    if len(failures) > 0:
+        raise RuntimeError(str(len(failures)) + ' of ' + str(len(ls_paths)) + ' experiments failed.')
+
+    print("The ADLP results were saved to your desktop.")
+    return df_summary
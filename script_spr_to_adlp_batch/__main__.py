@@ -0,0 +1,8 @@
+from script_spr_to_adlp_batch.Cli import main
+
+if __name__ == '__main__':
+    # Load environmental variables
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    main()
\ No newline at end of file
@@ -16,5 +16,23 @@ import click
               help="Option to indicate that the contents of the setup file are on the clipboard.")
 @click.option('--structures','-s', is_flag=True,
               help="Option to indicate attempting to insert structures from database.")
-def main(config_file, save_file, clip, structures):
-    spr_create_dot_upload_file(config_file=config_file, save_file=save_file, clip=clip, structures=structures)
\ No newline at end of file
+@click.option('--render_workers', '-w', type=int, default=1, show_default=True,
+              help="Number of processes used to render the chemical structures.")
+@click.option('--profile', is_flag=True,
+              help="Option to save the time, bytes read and memory of each stage to a JSON file next to the ADLP "
+                   "file.")
+@click.option('--stream', is_flag=True,
+              help="Option to write the ADLP file row by row so memory stays flat for files with many rows.")
+@click.option('--format', 'export_format', type=click.Choice(['xlsx', 'csv', 'parquet']), default='xlsx',
+              show_default=True,
+              help="Format of the ADLP file. csv and parquet save the table with a manifest and a zip of the images.")
+@click.option('--preview', is_flag=True,
+              help="Option to also save the xlsx with the images when the format is csv or parquet.")
+@click.option('--prepare_images', is_flag=True,
+              help="Option to scale the images down to the height of the rows and recompress them before they are "
+                   "embedded. Prepared images are cached so unchanged images are only prepared once.")
+def main(config_file, save_file, clip, structures, render_workers, profile, stream, export_format, preview,
+         prepare_images):
+    spr_create_dot_upload_file(config_file=config_file, save_file=save_file, clip=clip, structures=structures,
+                               render_workers=render_workers, profile=profile, stream=stream,
+                               export_format=export_format, preview=preview, prepare_images=prepare_images)
\ No newline at end of file
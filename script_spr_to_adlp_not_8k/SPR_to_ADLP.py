@@ -20,7 +20,9 @@ else:
 logging.basicConfig(level=logging.INFO)
 
 
-def spr_create_dot_upload_file(config_file, save_file, clip, structures=False):
+def spr_create_dot_upload_file(config_file, save_file, clip, structures=False, render_workers=1, profile=False,
+                               stream=False, export_format='xlsx', preview=False,
+                               prepare_images=False):
     """
     Function the aggregates all data from and SPR binding experiment run with compounds at dose into one Excel File.
 
@@ -28,29 +30,43 @@ def spr_create_dot_upload_file(config_file, save_file, clip, structures=False):
     :arg save_file: Name of the final Excel file.
     :arg clip: Optional flag that indicates if the setup table exists on the clipboard.
     :param structures: Optional flag that indicates if the program should attempt to insert chemical structures.
+    :param render_workers: Number of processes used to render the chemical structures.
+    :param profile: Optional flag to record the time, bytes read and memory of each stage of the run in a JSON
+        file saved next to the ADLP file.
+    :param stream: Optional flag to write the ADLP file row by row in constant memory mode.
+    :param export_format: Format of the ADLP file, xlsx, csv or parquet. The csv and parquet tables are saved with a
+        manifest and a zip of the images instead of embedding the images.
+    :param preview: Optional flag to also save the xlsx with the images when exporting to csv or parquet.
+    :param prepare_images: Optional flag to scale the images down to the height of the rows and recompress them before
+        they are embedded. Prepared images are cached so unchanged images are only prepared once.
     :return None
 
     """
+    SPR_to_ADLP_Functions.exporters.check_export_format(export_format)
+
+    with SPR_to_ADLP_Functions.profiling.profile_run('SPR_to_ADLP', enabled=profile):
+        return _spr_create_dot_upload_file(config_file=config_file, save_file=save_file, clip=clip,
+                                           structures=structures, render_workers=render_workers,
+                                           stream=stream, export_format=export_format, preview=preview,
+                                           prepare_images=prepare_images)
 
-    # ADLP save file path
-    # Note the version is saved to the file name so that data can be linked to the script version.
-    save_file = save_file.replace('.xlsx', '')
-    adlp_save_file_path = os.path.join(homedir, 'Desktop', save_file + '_APPVersion_' + str(__version__))
-    adlp_save_file_path = adlp_save_file_path.replace('.', '_')
-    adlp_save_file_path = adlp_save_file_path + '.xlsx'
 
+def read_config(config_file, clip):
+    """
+    Stage that collects the paths and the metadata of the experiment from the configuration file.
+
+    :param config_file: Text file containing all of the metadata for an SPR experiment run at dose.
+    :param clip: Flag that indicates if the setup table exists on the clipboard.
+    :return: Tuple of the paths of the setup table, the steady state and sensorgram images, the steady state and kinetic
+        fit files, the report point file and a dictionary of the metadata.
+    """
     try:
         logging.info('Collecting metadata from configuration file...')
         config = configparser.ConfigParser()
         config.read(config_file)
 
         # Get all of the file paths from the configuration file and store in variables so they are available
-        if clip:
-            df_cmpd_set = pd.read_clipboard()
-        else:
-            path_master_tbl = config.get('paths', 'path_mstr_tbl')
-            df_cmpd_set = pd.read_csv(path_master_tbl)
-
+        path_master_tbl = None if clip else config.get('paths', 'path_mstr_tbl')
         path_ss_img = config.get('paths', 'path_ss_img')
         path_senso_img = config.get('paths', 'path_senso_img')
         path_ss_txt = config.get('paths', 'path_ss_txt')
@@ -79,26 +95,38 @@ def spr_create_dot_upload_file(config_file, save_file, clip, structures=False):
                                 'channels.')
 
         # Continue collecting variables from the configuration file.
-        experiment_date = config.get('meta','experiment_date')
-        project_code = config.get('meta','project_code')
-        operator = config.get('meta','operator')
-        instrument = config.get('meta','instrument')
-        protocol = config.get('meta','protocol')
-        chip_lot = config.get('meta','chip_lot')
-        nucleotide = config.get('meta','nucleotide')
-        raw_data_filename = config.get('meta','raw_data_filename')
-        directory_folder = config.get('meta','directory_folder')
-
+        meta = {'num_fc_used': int(num_fc_used),
+                'ref_fc_used_arr': ref_fc_used_arr,
+                'immobilized_fc_arr': immobilized_fc_arr,
+                'experiment_date': config.get('meta','experiment_date'),
+                'project_code': config.get('meta','project_code'),
+                'operator': config.get('meta','operator'),
+                'instrument': config.get('meta','instrument'),
+                'protocol': config.get('meta','protocol'),
+                'chip_lot': config.get('meta','chip_lot'),
+                'nucleotide': config.get('meta','nucleotide'),
+                'raw_data_filename': config.get('meta','raw_data_filename'),
+                'directory_folder': config.get('meta','directory_folder')}
+
+        # Protein RU, MW, and BIP of the corresponding flow channels
         if immobilized_fc_arr[0] == 2 and int(num_fc_used) == 1:
             fc2_protein_BIP = config.get('meta','fc2_protein_BIP')
             fc2_protein_RU = float(config.get('meta','fc2_protein_RU'))
             fc2_protein_MW = float(config.get('meta','fc2_protein_MW'))
 
+            meta['protein_ru_dict'] = {'FC2-1Corr': fc2_protein_RU}
+            meta['protein_mw_dict'] = {'FC2-1Corr': fc2_protein_MW}
+            meta['protein_bip_dict'] = {'FC2-1Corr': fc2_protein_BIP}
+
         elif immobilized_fc_arr[0] == 4 and int(num_fc_used) == 1:
             fc4_protein_BIP = config.get('meta', 'fc4_protein_BIP')
             fc4_protein_RU = float(config.get('meta', 'fc4_protein_RU'))
             fc4_protein_MW = float(config.get('meta', 'fc4_protein_MW'))
 
+            meta['protein_ru_dict'] = {'FC4-3Corr': fc4_protein_RU}
+            meta['protein_mw_dict'] = {'FC4-3Corr': fc4_protein_MW}
+            meta['protein_bip_dict'] = {'FC4-3Corr': fc4_protein_BIP}
+
         else:
             fc2_protein_BIP = config.get('meta', 'fc2_protein_BIP')
             fc2_protein_RU = float(config.get('meta', 'fc2_protein_RU'))
@@ -109,16 +137,102 @@ def spr_create_dot_upload_file(config_file, save_file, clip, structures=False):
             fc4_protein_BIP = config.get('meta','fc4_protein_BIP')
             fc4_protein_RU = float(config.get('meta','fc4_protein_RU'))
             fc4_protein_MW = float(config.get('meta','fc4_protein_MW'))
+
+            meta['protein_ru_dict'] = {'FC2-1Corr': fc2_protein_RU, 'FC3-1Corr': fc3_protein_RU,
+                                       'FC4-1Corr': fc4_protein_RU, 'FC4-3Corr': fc4_protein_RU}
+            meta['protein_mw_dict'] = {'FC2-1Corr': fc2_protein_MW, 'FC3-1Corr': fc3_protein_MW,
+                                       'FC4-1Corr': fc4_protein_MW, 'FC4-3Corr': fc4_protein_MW}
+            meta['protein_bip_dict'] = {'FC2-1Corr': fc2_protein_BIP, 'FC3-1Corr': fc3_protein_BIP,
+                                        'FC4-1Corr': fc4_protein_BIP, 'FC4-3Corr': fc4_protein_BIP}
         logging.info('Finished collecting metadata from configuration file. Proceeding...')
     except:
         raise RuntimeError('Something is wrong with the config file. Please check.')
 
+    return path_master_tbl, path_ss_img, path_senso_img, path_ss_txt, path_senso_txt, path_report_pt, meta
+
+
+def read_report_points(report_pt_file, df_cmpd_set, meta):
+    """
+    Stage that extracts the RU of each compound at its top concentration from the report point file.
+
+    :param report_pt_file: Report point file read ahead by the loader, or its path.
+    :param df_cmpd_set: SPR Setup table as a DataFrame.
+    :param meta: Dictionary of the metadata from the configuration file.
+    :return: Series of the RU at the top concentration, one per row of the ADLP file.
+    """
+    return SPR_to_ADLP_Functions.common_functions.spr_binding_top_for_dot_file(
+        report_pt_file=report_pt_file,
+        df_cmpd_set=df_cmpd_set,
+        instrument=meta['instrument'],
+        fc_used=meta['immobilized_fc_arr'],
+        ref_fc_used_arr=meta['ref_fc_used_arr'])
+
+
+def read_steady_state(ss_file):
+    """
+    Stage that reads the steady state fit file.
+
+    :param ss_file: Steady state fit file read ahead by the loader, or its path.
+    :return: DataFrame of the steady state fits in the order of the rows of the ADLP file.
+    """
+    # Read in the steady state text file into a DataFrame
+    logging.info('Reading data from steady state fit file...')
+    with SPR_to_ADLP_Functions.profiling.stage('read_steady_state'):
+        SPR_to_ADLP_Functions.profiling.add_file_read(ss_file)
+        df_ss_txt = pd.read_csv(ss_file, sep='\t')
+
+    # Create new columns to sort the DataFrame as the original is out of order.
+    df_ss_txt['sample_order'] = df_ss_txt['Image File'].str.split('_', expand=True)[1]
+    df_ss_txt['sample_order'] = pd.to_numeric(df_ss_txt['sample_order'])
+    df_ss_txt['fc_num'] = pd.to_numeric(df_ss_txt['Curve'].str[3])
+    df_ss_txt = df_ss_txt.sort_values(by=['sample_order', 'fc_num'])
+    df_ss_txt = df_ss_txt.reset_index(drop=True)
+    df_ss_txt['KD_SS_UM'] = round(df_ss_txt['KD (M)'] * 1000000, 3)
+
+    return df_ss_txt
+
+
+def read_kinetics(senso_file):
+    """
+    Stage that reads the kinetic fit file.
+
+    :param senso_file: Kinetic fit file read ahead by the loader, or its path.
+    :return: DataFrame of the kinetic fits in the order of the rows of the ADLP file.
+    """
+    # Read in the sensorgram data into a DataFrame
+    logging.info('Reading data from kinetic fit file...')
+    with SPR_to_ADLP_Functions.profiling.stage('read_kinetics'):
+        SPR_to_ADLP_Functions.profiling.add_file_read(senso_file)
+        df_senso_txt = pd.read_csv(senso_file, sep='\t')
+    df_senso_txt['sample_order'] = df_senso_txt['Image File'].str.split('_', expand=True)[1]
+    df_senso_txt['sample_order'] = pd.to_numeric(df_senso_txt['sample_order'])
+    df_senso_txt['fc_num'] = pd.to_numeric(df_senso_txt['Curve'].str[3])
+    df_senso_txt = df_senso_txt.sort_values(by=['sample_order', 'fc_num'])
+    df_senso_txt = df_senso_txt.reset_index(drop=True)
+
+    # Rename the flow channels
+    df_senso_txt['FC'] = df_senso_txt['Curve'].apply(lambda x: x.replace('c', 'C'))
+    df_senso_txt['FC'] = df_senso_txt['FC'].apply(lambda x: x.replace('=', ''))
+    df_senso_txt['FC'] = df_senso_txt['FC'].apply(lambda x: x.replace(' ', ''))
+
+    return df_senso_txt
+
+
+def create_adlp_df(df_cmpd_set, meta, ru_top_cmpd, df_ss_txt, df_senso_txt, path_ss_img, path_senso_img):
+    """
+    Stage that builds the DataFrame of the ADLP file.
+
+    :return: DataFrame of the ADLP file without the images.
+    """
     logging.info('Creating the ADLP File...')
+    num_fc_used = meta['num_fc_used']
+    project_code = meta['project_code']
+    experiment_date = meta['experiment_date']
+
     # Start building the final Dotmatics DataFrame
     df_final_for_dot = pd.DataFrame()
 
     # Start by adding the Broad ID in the correct order.
-    num_fc_used = int(num_fc_used)
     df_final_for_dot['BROAD_ID'] = pd.Series(SPR_to_ADLP_Functions.common_functions.rep_item_for_dot_df(df_cmpd_set, col_name='Broad ID',
                                                                  times_dup=num_fc_used))
 
@@ -142,26 +256,8 @@ def spr_create_dot_upload_file(config_file, save_file, clip, structures=False):
         SPR_to_ADLP_Functions.common_functions.rep_item_for_dot_df(df_cmpd_set, col_name='Test [Cpd] uM',
                                                                    times_dup=num_fc_used))
 
-    # Extract the RU Max for each compound using the report point file.
-    df_final_for_dot['RU_TOP_CMPD'] = SPR_to_ADLP_Functions.common_functions.spr_binding_top_for_dot_file(
-        report_pt_file=path_report_pt,
-        df_cmpd_set=df_cmpd_set,
-        instrument=instrument,
-        fc_used=immobilized_fc_arr,
-        ref_fc_used_arr=ref_fc_used_arr)
-
-    # Extract the steady state data and add to DataFrame
-    # Read in the steady state text file into a DataFrame
-    logging.info('Reading data from steady state fit file...')
-    df_ss_txt = pd.read_csv(path_ss_txt, sep='\t')
-
-    # Create new columns to sort the DataFrame as the original is out of order.
-    df_ss_txt['sample_order'] = df_ss_txt['Image File'].str.split('_', expand=True)[1]
-    df_ss_txt['sample_order'] = pd.to_numeric(df_ss_txt['sample_order'])
-    df_ss_txt['fc_num'] = pd.to_numeric(df_ss_txt['Curve'].str[3])
-    df_ss_txt = df_ss_txt.sort_values(by=['sample_order', 'fc_num'])
-    df_ss_txt = df_ss_txt.reset_index(drop=True)
-    df_ss_txt['KD_SS_UM'] = round(df_ss_txt['KD (M)'] * 1000000, 3)
+    # Add the RU Max for each compound from the report point file.
+    df_final_for_dot['RU_TOP_CMPD'] = ru_top_cmpd
 
     # Add the KD steady state
     df_final_for_dot['KD_SS_UM'] = df_ss_txt['KD_SS_UM']
@@ -172,16 +268,6 @@ def spr_create_dot_upload_file(config_file, save_file, clip, structures=False):
     # Add the Fitted_Rmax_steady_state_affinity
     df_final_for_dot['FITTED_RMAX_SS_AFFINITY'] = df_ss_txt['Rmax (RU)']
 
-    # Extract the sensorgram data and add to DataFrame
-    # Read in the sensorgram data into a DataFrame
-    logging.info('Reading data from kinetic fit file...')
-    df_senso_txt = pd.read_csv(path_senso_txt, sep='\t')
-    df_senso_txt['sample_order'] = df_senso_txt['Image File'].str.split('_', expand=True)[1]
-    df_senso_txt['sample_order'] = pd.to_numeric(df_senso_txt['sample_order'])
-    df_senso_txt['fc_num'] = pd.to_numeric(df_senso_txt['Curve'].str[3])
-    df_senso_txt = df_senso_txt.sort_values(by=['sample_order', 'fc_num'])
-    df_senso_txt = df_senso_txt.reset_index(drop=True)
-
     # Add columns from df_senso_txt
     df_final_for_dot['KA_1_1_BINDING'] = df_senso_txt['ka (1/Ms)']
     df_final_for_dot['KD_LITTLE_1_1_BINDING'] = round(df_senso_txt['kd (1/s)'], 3)
@@ -194,34 +280,13 @@ def spr_create_dot_upload_file(config_file, save_file, clip, structures=False):
     df_final_for_dot['FITTED_RMAX_1_1_BINDING'] = df_senso_txt['Rmax (RU)']
     df_final_for_dot['COMMENTS'] = ''
 
-    # Rename the flow channels and add the flow channel column
-    df_senso_txt['FC'] = df_senso_txt['Curve'].apply(lambda x: x.replace('c', 'C'))
-    df_senso_txt['FC'] = df_senso_txt['FC'].apply(lambda x: x.replace('=', ''))
-    df_senso_txt['FC'] = df_senso_txt['FC'].apply(lambda x: x.replace(' ', ''))
+    # Add the flow channel column
     df_final_for_dot['FC'] = df_senso_txt['FC']
 
     # Protein RU, MW, and BIP to corresponding columns
-    if immobilized_fc_arr[0] == 2 and int(num_fc_used) == 1:
-        protein_ru_dict = {'FC2-1Corr': fc2_protein_RU}
-        protein_mw_dict = {'FC2-1Corr': fc2_protein_MW}
-        protein_bip_dict = {'FC2-1Corr': fc2_protein_BIP}
-
-    elif immobilized_fc_arr[0] == 4 and int(num_fc_used) == 1:
-        protein_ru_dict = {'FC4-3Corr': fc4_protein_RU}
-        protein_mw_dict = {'FC4-3Corr': fc4_protein_MW}
-        protein_bip_dict = {'FC4-3Corr': fc4_protein_BIP}
-
-    else:
-        protein_ru_dict = {'FC2-1Corr': fc2_protein_RU, 'FC3-1Corr': fc3_protein_RU, 'FC4-1Corr': fc4_protein_RU,
-                           'FC4-3Corr': fc4_protein_RU}
-        protein_mw_dict = {'FC2-1Corr': fc2_protein_MW, 'FC3-1Corr': fc3_protein_MW, 'FC4-1Corr': fc4_protein_MW,
-                           'FC4-3Corr': fc4_protein_MW}
-        protein_bip_dict = {'FC2-1Corr': fc2_protein_BIP, 'FC3-1Corr': fc3_protein_BIP, 'FC4-1Corr': fc4_protein_BIP,
-                            'FC4-3Corr': fc4_protein_BIP}
-
-    df_final_for_dot['PROTEIN_RU'] = df_final_for_dot['FC'].map(protein_ru_dict)
-    df_final_for_dot['PROTEIN_MW'] = df_final_for_dot['FC'].map(protein_mw_dict)
-    df_final_for_dot['PROTEIN_ID'] = df_final_for_dot['FC'].map(protein_bip_dict)
+    df_final_for_dot['PROTEIN_RU'] = df_final_for_dot['FC'].map(meta['protein_ru_dict'])
+    df_final_for_dot['PROTEIN_MW'] = df_final_for_dot['FC'].map(meta['protein_mw_dict'])
+    df_final_for_dot['PROTEIN_ID'] = df_final_for_dot['FC'].map(meta['protein_bip_dict'])
 
     # Add the MW for each compound.
     df_final_for_dot['MW'] = round(pd.Series(SPR_to_ADLP_Functions.
@@ -229,15 +294,15 @@ def spr_create_dot_upload_file(config_file, save_file, clip, structures=False):
                                                                                   times_dup=num_fc_used)), 3)
 
     # Continue adding columns to final DataFrame
-    df_final_for_dot['INSTRUMENT'] = instrument
+    df_final_for_dot['INSTRUMENT'] = meta['instrument']
     df_final_for_dot['ASSAY_MODE'] = 'Multi-Cycle'
     df_final_for_dot['EXP_DATE'] = experiment_date
-    df_final_for_dot['NUCLEOTIDE'] = nucleotide
-    df_final_for_dot['CHIP_LOT'] = chip_lot
-    df_final_for_dot['OPERATOR'] = operator
-    df_final_for_dot['PROTOCOL_ID'] = protocol
-    df_final_for_dot['RAW_DATA_FILE'] = raw_data_filename
-    df_final_for_dot['DIR_FOLDER'] = directory_folder
+    df_final_for_dot['NUCLEOTIDE'] = meta['nucleotide']
+    df_final_for_dot['CHIP_LOT'] = meta['chip_lot']
+    df_final_for_dot['OPERATOR'] = meta['operator']
+    df_final_for_dot['PROTOCOL_ID'] = meta['protocol']
+    df_final_for_dot['RAW_DATA_FILE'] = meta['raw_data_filename']
+    df_final_for_dot['DIR_FOLDER'] = meta['directory_folder']
 
     # Add the unique ID #
     df_final_for_dot['UNIQUE_ID'] = df_senso_txt['Sample'] + '_' + df_final_for_dot['FC'] + '_' + project_code + \
@@ -276,59 +341,50 @@ def spr_create_dot_upload_file(config_file, save_file, clip, structures=False):
                                                 'OPERATOR', 'PROTOCOL_ID', 'RAW_DATA_FILE', 'DIR_FOLDER', 'UNIQUE_ID',
                                                 'SS_IMG_ID', 'SENSO_IMG_ID']]
 
-    # Create a Pandas Excel writer using XlsxWriter as the engine.
-    writer = pd.ExcelWriter(adlp_save_file_path, engine='xlsxwriter')
-
-    # Convert the DataFrame to an XlsxWriter Excel object.
-    df_final_for_dot.to_excel(writer, sheet_name='Sheet1', startcol=0, index=None)
-
-    # Get the xlsxwriter workbook and worksheet objects.
-    workbook = writer.book
-    worksheet1 = writer.sheets['Sheet1']
-
-    # Add a drop down list of comments.
-    # Calculate the number of rows to add the drop down menu.
-    num_cpds = len(df_cmpd_set.index)
-    num_data_pts = (num_cpds * 3) + 1
+    return df_final_for_dot
+
+
+Stage = SPR_to_ADLP_Functions.pipeline.Stage
+
+# Stages of the script. The report point, steady state and kinetic files are parsed and the SMILES are looked up at the
+# same time.
+PIPELINE = SPR_to_ADLP_Functions.pipeline.Pipeline([
+    Stage('config', read_config, inputs=['config_file', 'clip'],
+          outputs=['path_master_tbl', 'path_ss_img', 'path_senso_img', 'path_ss_txt', 'path_senso_txt',
+                   'path_report_pt', 'meta']),
+    *SPR_to_ADLP_Functions.loader.LOAD_STAGES,
+    Stage('setup_table', SPR_to_ADLP_Functions.common_functions.read_setup_table, inputs=['path_master_tbl', 'clip'],
+          outputs=['df_cmpd_set']),
+    Stage('report_points', read_report_points, inputs=['report_pt_file', 'df_cmpd_set', 'meta'],
+          outputs=['ru_top_cmpd']),
+    Stage('steady_state', read_steady_state, inputs=['ss_file'], outputs=['df_ss_txt']),
+    Stage('kinetics', read_kinetics, inputs=['senso_file'], outputs=['df_senso_txt']),
+    Stage('smiles', SPR_to_ADLP_Functions.common_functions.get_structure_smiles, inputs=['df_cmpd_set', 'structures'],
+          outputs=['df_struct_smiles']),
+    Stage('adlp_df', create_adlp_df,
+          inputs=['df_cmpd_set', 'meta', 'ru_top_cmpd', 'df_ss_txt', 'df_senso_txt', 'path_ss_img', 'path_senso_img'],
+          outputs=['df_final_for_dot']),
+    SPR_to_ADLP_Functions.stages.save_stage(rows_per_cmpd=3, column_width=25,
+                                            img_columns=('Image File', 'Image File')),
+])
+
+
+def _spr_create_dot_upload_file(config_file, save_file, clip, structures=False, render_workers=1, stream=False,
+                                export_format='xlsx', preview=False, prepare_images=False):
+    """Private function that does the work of spr_create_dot_upload_file."""
 
-    # Write the comments to the comment sheet.
-    comments_list = SPR_to_ADLP_Functions.common_functions.get_predefined_comments()
-
-    # Convert comments list to DataFrame
-    comments_list.to_excel(writer, sheet_name='Sheet2', startcol=0, index=0)
-
-    # For larger drop down lists > 255 characters its necessary to create a list on a seperate worksheet.
-    worksheet1.data_validation('T1:T' + str(num_data_pts),
-                                    {'validate': 'list',
-                                     'source': '=Sheet2!$A$2:$A$' + str(len(comments_list) + 1)
-                                     })
-
-    # Freeze the top row of the excel worksheet.
-    worksheet1.freeze_panes(1, 0)
-
-    # Add a cell format object to align text center.
-    cell_format = workbook.add_format()
-    cell_format.set_align('center')
-    cell_format.set_align('vcenter')
-    worksheet1.set_column('A:AK', 25, cell_format)
-
-    # Start preparing to insert the steady state and sensorgram images.
-    # Get list of image files from df_ss_txt Dataframe.
-    list_ss_img = df_ss_txt['Image File'].tolist()
-
-    # Get list of images files in the df_senso_txt DataFrame.
-    list_sonso_img = df_senso_txt['Image File'].tolist()
+    # ADLP save file path
+    # Note the version is saved to the file name so that data can be linked to the script version.
+    save_file = save_file.replace('.xlsx', '')
+    adlp_save_file_path = os.path.join(homedir, 'Desktop', save_file + '_APPVersion_' + str(__version__))
+    adlp_save_file_path = adlp_save_file_path.replace('.', '_')
+    adlp_save_file_path = adlp_save_file_path + '.xlsx'
+    SPR_to_ADLP_Functions.profiling.set_output_path(adlp_save_file_path)
 
-    # Create a list of tuples containing the names of the steady state image and sensorgram image.
-    tuple_list_imgs = list(zip(list_ss_img, list_sonso_img))
+    values = PIPELINE.run({'config_file': config_file, 'clip': clip, 'adlp_save_file_path': adlp_save_file_path,
+                           'structures': structures, 'render_workers': render_workers, 'stream': stream,
+                           'export_format': export_format, 'preview': preview, 'prepare_images': prepare_images})
 
-    # Insert steady-state and sensogram images into file.
-    SPR_to_ADLP_Functions.common_functions.spr_insert_ss_senso_images(tuple_list_imgs, worksheet1, path_ss_img,
-                                                                      path_senso_img, biacore=instrument)
-    # Insert structure images
-    SPR_to_ADLP_Functions.common_functions.manage_structure_insertion(df_cmpd_set=df_cmpd_set,
-                                                                       num_fc_used=num_fc_used, worksheet=worksheet1,
-                                                                       structures=structures, writer=writer)
     print('\nProgram Done!')
     print("The ADLP result was saved to your desktop.")
-    return df_final_for_dot
\ No newline at end of file
+    return values['df_final_for_dot']
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Entry point to the ADLP server and its client.
+"""
+
+from script_spr_to_adlp_server import client
+import click
+
+
+# Using click to manage the command line interface
+@click.group()
+def main():
+    """
+    Keeps the ADLP scripts loaded in a local server so back to back runs skip the start up of Python, pandas and
+    RDKit. Start the server with "serve" in one terminal and send experiments to it with "run".
+    """
+
+
+@main.command()
+@click.option('--server_file', type=click.Path(dir_okay=False),
+              help="Optional path of the file the server writes its address and key to.")
+def serve(server_file):
+    """Starts the server. It runs until it is stopped with "stop" or Ctrl+C."""
+    # The server modules are only imported here so the client commands start quickly.
+    from script_spr_to_adlp_server.SPR_to_ADLP_Server import serve as serve_forever
+    serve_forever(server_file=server_file)
+
+
+@main.command()
+@click.option('--config_file', prompt="Please paste the path of the configuration file", type=click.Path(exists=True))
+@click.option('--save_file', default=None,
+              help="Name of the ADLP result file NO .xlsx extension NEEDED. Defaults to the name of the configuration "
+                   "file.")
+@click.option('--structures', '-s', is_flag=True,
+              help="Option to indicate attempting to insert structures from database.")
+@click.option('--render_workers', '-w', type=int, default=1, show_default=True,
+              help="Number of processes used to render the chemical structures.")
+@click.option('--profile', is_flag=True,
+              help="Option to save the time, bytes read and memory of each stage to a JSON file next to the ADLP "
+                   "file.")
+@click.option('--stream', is_flag=True,
+              help="Option to write the ADLP file row by row so memory stays flat for files with many rows.")
+@click.option('--format', 'export_format', type=click.Choice(['xlsx', 'csv', 'parquet']), default='xlsx',
+              show_default=True,
+              help="Format of the ADLP file. csv and parquet save the table with a manifest and a zip of the images.")
+@click.option('--preview', is_flag=True,
+              help="Option to also save the xlsx with the images when the format is csv or parquet.")
+@click.option('--prepare_images', is_flag=True,
+              help="Option to scale the images down to the height of the rows and recompress them before they are "
+                   "embedded.")
+@click.option('--server_file', type=click.Path(dir_okay=False),
+              help="Optional path of the file the server wrote its address and key to.")
+def run(config_file, save_file, structures, render_workers, profile, stream, export_format, preview, prepare_images,
+        server_file):
+    """Creates the ADLP file of an experiment on the server."""
+    response = client.submit(config_file, save_file=save_file, server_file=server_file, structures=structures,
+                             render_workers=render_workers, profile=profile, stream=stream,
+                             export_format=export_format, preview=preview, prepare_images=prepare_images)
+    click.echo(response['output'], nl=False)
+    if response['status'] != 'OK':
+        raise click.ClickException(response['error'])
+    click.echo('{} rows in {} s with {}.'.format(response['result']['ROWS'], response['result']['SECONDS'],
+                                                 response['result']['SCRIPT']))
+
+
+@main.command()
+@click.option('--server_file', type=click.Path(dir_okay=False),
+              help="Optional path of the file the server wrote its address and key to.")
+def status(server_file):
+    """Shows whether the server is running and how many jobs it has run."""
+    response = client.request({'command': 'status'}, server_file=server_file)
+    click.echo('ADLP server {} up for {} s, {} jobs run{}.'.format(response['pid'], response['uptime_seconds'],
+                                                                   response['jobs'],
+                                                                   ', running a job' if response['busy'] else ''))
+
+
+@main.command()
+@click.option('--server_file', type=click.Path(dir_okay=False),
+              help="Optional path of the file the server wrote its address and key to.")
+def stop(server_file):
+    """Stops the server once its running job is done."""
+    client.request({'command': 'stop'}, server_file=server_file)
+    click.echo('ADLP server stopped.')
@@ -0,0 +1,208 @@
+"""
+Local server that keeps the ADLP scripts loaded between runs.
+
+Each run of a script starts Python and imports pandas, openpyxl, xlrd and, with structures, RDKit and SQLAlchemy,
+which can take longer than processing a small plate. The server imports them once and then creates ADLP files for jobs
+sent by the client, so back to back runs skip the imports and reuse the resultsdb engine and the local caches.
+
+The server listens on a Unix socket in the cache folder, or on a localhost port on Windows. Its address and a random
+key are written to server.json in the cache folder, readable only by the user, and connections without the key are
+refused. Jobs are run one at a time as each job runs in the working directory of its client.
+"""
+import contextlib
+import importlib
+import io
+import json
+import logging
+import os
+import platform
+import secrets
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from script_spr_to_adlp_batch.SPR_to_ADLP_Batch import SCRIPTS, create_adlp_file
+from script_spr_to_adlp_server.client import default_server_file, request
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+
+# Modules imported when the server starts. Those that are not installed are skipped.
+WARM_MODULES = ['pandas', 'numpy', 'openpyxl', 'xlrd', 'xlsxwriter', 'PIL.Image', 'rdkit.Chem.Draw', 'sqlalchemy',
+                'cx_Oracle'] + list(SCRIPTS.values())
+
+
+class AdlpServer:
+    """
+    Server that runs the jobs sent by the client in this process.
+    """
+
+    def __init__(self, server_file=None, warm_modules=WARM_MODULES):
+        """
+        :param server_file: Path of the file the address and key of the server are written to. Defaults to server.json
+            in the cache folder.
+        :param warm_modules: Names of the modules imported when the server starts.
+        """
+        self.server_file = server_file or default_server_file()
+        self.warm_modules = warm_modules
+        self.start_time = None
+        self.num_jobs = 0
+        self._authkey = secrets.token_bytes(32)
+        self._listener = None
+        self._family = None
+        self._stopping = False
+
+        # Jobs are run one at a time. Status requests are answered while a job runs.
+        self._job_lock = threading.Lock()
+
+    def warm_up(self):
+        """
+        Imports the modules used by the scripts.
+
+        :return: List of the modules imported.
+        """
+        ls_imported = []
+        for module_name in self.warm_modules:
+            try:
+                importlib.import_module(module_name)
+                ls_imported.append(module_name)
+            except ImportError as e:
+                logging.info('%s is not installed and will not be preloaded (%s).', module_name, e)
+
+        return ls_imported
+
+    def run_job(self, config_file, save_file, cwd, options):
+        """
+        Creates the ADLP file of an experiment.
+
+        :param config_file: Absolute path of the configuration file.
+        :param save_file: Name of the ADLP file.
+        :param cwd: Working directory of the client, which relative paths in the configuration file are read from.
+        :param options: Options passed to spr_create_dot_upload_file.
+        :return: Dictionary of the response to the client.
+        """
+        with self._job_lock:
+            if self._stopping:
+                return {'status': 'FAILED', 'error': 'The ADLP server is stopping.', 'output': ''}
+            server_cwd = os.getcwd()
+            output = io.StringIO()
+            try:
+                os.chdir(cwd)
+                with contextlib.redirect_stdout(output):
+                    result = create_adlp_file(config_file, name=save_file, **options)
+                response = {'status': 'OK', 'result': result}
+            except Exception as e:
+                response = {'status': 'FAILED', 'error': type(e).__name__ + ': ' + str(e)}
+            finally:
+                os.chdir(server_cwd)
+                self.num_jobs += 1
+
+        response['output'] = output.getvalue()
+        logging.info('Job %s %s: %s', self.num_jobs, response['status'], config_file)
+        return response
+
+    def handle(self, message):
+        """
+        :param message: Dictionary with the 'command' sent by the client: 'run', 'status' or 'stop'.
+        :return: Dictionary of the response.
+        """
+        command = message.get('command')
+        if command == 'run':
+            return self.run_job(message['config_file'], message['save_file'], message['cwd'], message['options'])
+        if command == 'status':
+            return {'status': 'OK', 'pid': os.getpid(), 'uptime_seconds': round(time.time() - self.start_time),
+                    'jobs': self.num_jobs, 'busy': self._job_lock.locked()}
+        if command == 'stop':
+            self._stopping = True
+            return {'status': 'OK'}
+        return {'status': 'FAILED', 'error': 'Unknown command: ' + str(command)}
+
+    def _serve_connection(self, conn):
+        with conn:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return
+            conn.send(self.handle(message))
+
+        if self._stopping:
+            # A connection wakes up the accept call so the server loop sees that it is stopping.
+            with contextlib.suppress(OSError):
+                Client(self._listener.address, family=self._family, authkey=self._authkey).close()
+
+    def _write_server_file(self):
+        info = {'address': self._listener.address, 'family': self._family, 'authkey': self._authkey.hex(),
+                'pid': os.getpid()}
+        fd = os.open(self.server_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(info, f)
+
+    def start(self):
+        """
+        Preloads the modules and starts listening. Raises a RuntimeError if a server is already running.
+        """
+        try:
+            request({'command': 'status'}, server_file=self.server_file)
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError('An ADLP server is already running. Stop it with: python -m script_spr_to_adlp_server '
+                               'stop')
+        os.makedirs(os.path.dirname(os.path.abspath(self.server_file)), exist_ok=True)
+
+        start = time.perf_counter()
+        ls_imported = self.warm_up()
+        logging.info('Preloaded %s modules in %.1f s.', len(ls_imported), time.perf_counter() - start)
+
+        if platform.system() == 'Windows':
+            self._family = 'AF_INET'
+            address = ('localhost', 0)
+        else:
+            self._family = 'AF_UNIX'
+            address = os.path.join(os.path.dirname(os.path.abspath(self.server_file)), 'server.sock')
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(address)
+
+        self._listener = Listener(address, family=self._family, authkey=self._authkey)
+        self._write_server_file()
+        self.start_time = time.time()
+        logging.info('ADLP server listening on %s. Stop it with: python -m script_spr_to_adlp_server stop',
+                     self._listener.address)
+
+    def serve_forever(self):
+        """
+        Answers the client until it is told to stop. Each connection is served in its own thread.
+        """
+        try:
+            while not self._stopping:
+                try:
+                    conn = self._listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    # Clients without the key are refused.
+                    logging.info('Refused a connection (%s).', e)
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            # A job that is running is finished first.
+            with self._job_lock:
+                self._listener.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.server_file)
+            logging.info('ADLP server stopped after %s jobs.', self.num_jobs)
+
+
+def serve(server_file=None):
+    """
+    Starts the ADLP server and answers the client until it is stopped.
+
+    :param server_file: Optional path of the file the address and key of the server are written to.
+    :return: The AdlpServer.
+    """
+    server = AdlpServer(server_file=server_file)
+    server.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return server
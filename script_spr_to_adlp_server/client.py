@@ -0,0 +1,59 @@
+"""
+Client of the ADLP server. Only the standard library is imported, so submitting a job does not pay for loading pandas
+and the other modules the server already holds.
+"""
+import json
+import os
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+
+def default_server_file():
+    """
+    :return: Path of the file the running server writes its address and key to. It is kept in the cache folder, as
+        caches.get_cache_dir gives it, which is not imported here so the client does not load pandas.
+    """
+    cache_dir = os.getenv('SPR_ADLP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.spr_adlp_cache'))
+    return os.path.join(cache_dir, 'server.json')
+
+
+def request(message, server_file=None):
+    """
+    Sends a message to the server and waits for its response.
+
+    :param message: Dictionary with the 'command' and its arguments.
+    :param server_file: Path of the server file. Defaults to the one in the cache folder.
+    :return: Dictionary of the response.
+    """
+    server_file = server_file or default_server_file()
+    try:
+        with open(server_file) as f:
+            info = json.load(f)
+        address = info['address'] if isinstance(info['address'], str) else tuple(info['address'])
+        conn = Client(address, family=info['family'], authkey=bytes.fromhex(info['authkey']))
+    except (OSError, ValueError, KeyError, EOFError, AuthenticationError):
+        raise RuntimeError('No ADLP server is running. Start one with: python -m script_spr_to_adlp_server serve')
+
+    with conn:
+        conn.send(message)
+        return conn.recv()
+
+
+def submit(config_file, save_file=None, server_file=None, **options):
+    """
+    Creates the ADLP file of an experiment on the server.
+
+    :param config_file: Path of the configuration file.
+    :param save_file: Name of the ADLP file. Defaults to the name of the configuration file.
+    :param server_file: Path of the server file. Defaults to the one in the cache folder.
+    :param options: Options passed to spr_create_dot_upload_file, such as structures or export_format.
+    :return: Dictionary of the response, with the 'status' of the run, its printed 'output' and either its 'result' or
+        its 'error'.
+    """
+    # The server runs in its own folder, so paths are sent as seen from here.
+    config_file = os.path.abspath(config_file)
+    if save_file is None:
+        save_file = os.path.splitext(os.path.basename(config_file))[0]
+
+    return request({'command': 'run', 'config_file': config_file, 'save_file': save_file, 'cwd': os.getcwd(),
+                    'options': options}, server_file=server_file)
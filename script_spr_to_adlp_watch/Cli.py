@@ -0,0 +1,48 @@
+"""
+Entry point to SPR_to_ADLP_Watch.py command line script.
+"""
+
+from script_spr_to_adlp_watch.SPR_to_ADLP_Watch import spr_watch_folder
+import click
+
+# Using click to manage the command line interface
+@click.command()
+@click.argument('watch_dir', type=click.Path(exists=True, file_okay=False))
+@click.option('--poll_interval', type=float, default=30, show_default=True,
+              help="Number of seconds between checks of the folder.")
+@click.option('--settle_seconds', type=float, default=60, show_default=True,
+              help="Number of seconds the files of an experiment must stay unchanged before it is processed.")
+@click.option('--workers', '-j', type=int, default=1, show_default=True,
+              help="Number of experiments processed in parallel.")
+@click.option('--state_file', type=click.Path(dir_okay=False),
+              help="Optional path of the file the processed experiments are kept in. Defaults to a file in the cache "
+                   "folder.")
+@click.option('--skip_existing', is_flag=True,
+              help="Option to only process the experiments that are added after the watcher starts.")
+@click.option('--structures', '-s', is_flag=True,
+              help="Option to indicate attempting to insert structures from database.")
+@click.option('--render_workers', '-w', type=int, default=1, show_default=True,
+              help="Number of processes used to render the chemical structures of each experiment.")
+@click.option('--profile', is_flag=True,
+              help="Option to save the time, bytes read and memory of each stage to a JSON file next to each ADLP "
+                   "file.")
+@click.option('--stream', is_flag=True,
+              help="Option to write the ADLP files row by row so memory stays flat for files with many rows.")
+@click.option('--format', 'export_format', type=click.Choice(['xlsx', 'csv', 'parquet']), default='xlsx',
+              show_default=True,
+              help="Format of the ADLP files. csv and parquet save the table with a manifest and a zip of the images.")
+@click.option('--preview', is_flag=True,
+              help="Option to also save the xlsx with the images when the format is csv or parquet.")
+@click.option('--prepare_images', is_flag=True,
+              help="Option to scale the images down to the height of the rows and recompress them before they are "
+                   "embedded.")
+def main(watch_dir, poll_interval, settle_seconds, workers, state_file, skip_existing, structures, render_workers,
+         profile, stream, export_format, preview, prepare_images):
+    """
+    Watches WATCH_DIR and its subfolders and creates the ADLP file of every experiment once its configuration file and
+    exports are complete.
+    """
+    spr_watch_folder(watch_dir=watch_dir, poll_interval=poll_interval, settle_seconds=settle_seconds, workers=workers,
+                     state_file=state_file, skip_existing=skip_existing, structures=structures,
+                     render_workers=render_workers, profile=profile, stream=stream, export_format=export_format,
+                     preview=preview, prepare_images=prepare_images)
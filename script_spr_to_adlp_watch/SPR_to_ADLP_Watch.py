@@ -0,0 +1,316 @@
+"""
+Watches a folder for new Biacore exports and creates their ADLP files as they arrive.
+
+The folder and its subfolders are polled for configuration files. An experiment is ready once its export set is
+complete: the configuration file, the setup table, the steady state and kinetics tables, the report point file and both
+image folders are present. It must also have stayed unchanged for settle_seconds. Each file of the set is compared by
+size and modification time between polls, so exports that are still being copied are not picked up. Configuration files
+without a setup table, which is read from the clipboard, are never ready as the watcher runs unattended.
+
+Ready experiments are created in worker processes with the batch script while the folder keeps being polled, so the
+next export does not wait for the previous one. Each configuration file is processed once. The processed files are kept
+in a state file in the cache folder so a restarted watcher does not create them again. Editing a configuration file,
+for example to fix the error of a run that failed, makes it be processed again.
+"""
+import configparser
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from SPR_to_ADLP_Functions import batch as batch_runner
+from SPR_to_ADLP_Functions import caches
+from script_spr_to_adlp_batch.SPR_to_ADLP_Batch import create_adlp_file, detect_script
+
+# Configure logger
+logging.basicConfig(level=logging.INFO)
+
+# Files and image folders of the export set listed in the paths section of the configuration file.
+FILE_PATHS = ['path_mstr_tbl', 'path_ss_txt', 'path_senso_txt', 'path_report_pt']
+IMAGE_FOLDER_PATHS = ['path_ss_img', 'path_senso_img']
+
+
+def default_state_file(watch_dir):
+    """
+    :param watch_dir: Folder being watched.
+    :return: Path of the state file of the folder in the cache folder.
+    """
+    key = hashlib.sha256(os.path.abspath(watch_dir).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(caches.get_cache_dir(), 'watch_' + key + '.json')
+
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+def export_set_signature(config_file):
+    """
+    Size and modification time of every file of the export set of a configuration file.
+
+    :param config_file: Path of the configuration file.
+    :return: Tuple of (path, size, modification time) tuples, or None if the export set is not complete yet.
+    """
+    config = configparser.ConfigParser()
+    try:
+        config.read(config_file)
+        ls_files = [config.get('paths', key) for key in FILE_PATHS]
+        ls_folders = [config.get('paths', key) for key in IMAGE_FOLDER_PATHS]
+    except configparser.Error:
+        return None
+
+    try:
+        ls_stats = [_file_stat(path) for path in [config_file] + ls_files]
+        for folder in ls_folders:
+            ls_imgs = sorted(f for f in os.listdir(folder) if not f.startswith('.'))
+            if not any(f.lower().endswith('.png') for f in ls_imgs):
+                return None
+            ls_stats.extend(_file_stat(os.path.join(folder, f)) for f in ls_imgs)
+    except OSError:
+        return None
+
+    return tuple(ls_stats)
+
+
+class ExportWatcher:
+    """
+    Polls a folder for complete export sets and creates their ADLP files.
+    """
+
+    def __init__(self, watch_dir, settle_seconds=60, workers=1, state_file=None, **kwargs):
+        """
+        :param watch_dir: Folder watched, with its subfolders, for configuration files.
+        :param settle_seconds: Number of seconds an export set must stay unchanged before it is processed.
+        :param workers: Number of experiments processed in parallel.
+        :param state_file: Path of the file the processed configuration files are kept in. Defaults to a file in the
+            cache folder named after watch_dir.
+        :param kwargs: Options passed to spr_create_dot_upload_file of every experiment, such as structures,
+            render_workers, profile, stream, export_format, preview or prepare_images.
+        """
+        self.watch_dir = watch_dir
+        self.settle_seconds = settle_seconds
+        self.workers = workers
+        self.state_file = state_file or default_state_file(watch_dir)
+        self.kwargs = kwargs
+
+        # Configuration file to the size, modification time, ADLP file name and outcome of its last run.
+        self.processed = self._load_state()
+
+        # Configuration file to the signature of its export set and the time it was first seen with it.
+        self._pending = {}
+
+        # Text file to its size, modification time and whether it is a configuration file.
+        self._txt_files = {}
+
+        # Running future to the configuration file and its size and modification time when it was submitted.
+        self._running = {}
+
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_state(self):
+        tmp_path = self.state_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.processed, f, indent=1)
+        os.replace(tmp_path, self.state_file)
+
+    def find_config_files(self):
+        """
+        :return: Sorted list of the configuration files in the folder and its subfolders.
+        """
+        ls_configs = []
+        for dir_path, ls_dirs, ls_files in os.walk(self.watch_dir):
+            ls_dirs[:] = [d for d in ls_dirs if not d.startswith('.')]
+            for file_name in ls_files:
+                if file_name.startswith('.') or not file_name.lower().endswith('.txt'):
+                    continue
+                path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+
+                # The Biacore exports are text files too, so each file is only parsed again when it changes.
+                cached = self._txt_files.get(path)
+                if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+                    try:
+                        detect_script(path)
+                        is_config = True
+                    except (ValueError, configparser.Error, UnicodeDecodeError):
+                        is_config = False
+                    cached = (stat.st_size, stat.st_mtime_ns, is_config)
+                    self._txt_files[path] = cached
+                if cached[2]:
+                    ls_configs.append(path)
+
+        return sorted(ls_configs)
+
+    def is_processed(self, config_file):
+        """
+        :param config_file: Path of the configuration file.
+        :return: True if the configuration file has been processed and has not changed since.
+        """
+        entry = self.processed.get(config_file)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(config_file)
+        except OSError:
+            return True
+        return [entry['size'], entry['mtime_ns']] == [stat.st_size, stat.st_mtime_ns]
+
+    def find_ready(self, now=None):
+        """
+        Checks every configuration file that has not been processed and finds the experiments that are ready.
+
+        :param now: Time of the poll. Defaults to the current time.
+        :return: List of the configuration files whose export set is complete and has not changed for settle_seconds.
+        """
+        now = time.time() if now is None else now
+        ls_running = [config_file for config_file, _ in self._running.values()]
+        ls_ready = []
+        for config_file in self.find_config_files():
+            if config_file in ls_running or self.is_processed(config_file):
+                continue
+
+            signature = export_set_signature(config_file)
+            if signature is None:
+                self._pending.pop(config_file, None)
+                continue
+
+            # An export set is ready once it is seen unchanged on a later poll, at least settle_seconds after it was
+            # first seen complete.
+            first_seen = self._pending.get(config_file)
+            if first_seen is None or first_seen[0] != signature:
+                self._pending[config_file] = (signature, now)
+            elif now - first_seen[1] >= self.settle_seconds:
+                ls_ready.append(config_file)
+
+        return ls_ready
+
+    def output_name(self, config_file):
+        """
+        :param config_file: Path of the configuration file.
+        :return: Name of the ADLP file. Configuration files with the same name get a numbered suffix, as in a batch.
+        """
+        if config_file in self.processed:
+            return self.processed[config_file]['name']
+        return batch_runner.output_names(list(self.processed) + [config_file])[-1]
+
+    def mark_existing(self):
+        """
+        Records every complete export set already in the folder as processed, without creating its ADLP file.
+
+        :return: List of the configuration files recorded.
+        """
+        ls_existing = []
+        for config_file in self.find_config_files():
+            if not self.is_processed(config_file) and export_set_signature(config_file) is not None:
+                stat = os.stat(config_file)
+                self.processed[config_file] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                               'name': self.output_name(config_file), 'status': 'SKIPPED'}
+                ls_existing.append(config_file)
+
+        self._save_state()
+        logging.info('{} existing experiments will not be processed.'.format(len(ls_existing)))
+        return ls_existing
+
+    def submit(self, executor, config_file):
+        """
+        Starts creating the ADLP file of an experiment in a worker process.
+
+        :param executor: ProcessPoolExecutor running the experiments.
+        :param config_file: Path of the configuration file.
+        """
+        stat = os.stat(config_file)
+        name = self.output_name(config_file)
+
+        # The name is reserved so experiments submitted in the same poll do not get the same one.
+        self.processed.setdefault(config_file, {'size': None, 'mtime_ns': None, 'name': name, 'status': 'RUNNING'})
+        self._pending.pop(config_file, None)
+
+        print('Processing: ' + config_file)
+        future = executor.submit(create_adlp_file, config_file, name=name, **self.kwargs)
+        self._running[future] = (config_file, stat)
+
+    def collect(self, block=False):
+        """
+        Records the outcome of the experiments that are done.
+
+        :param block: Flag to wait for every running experiment to be done.
+        :return: List of the configuration files that are done.
+        """
+        if block:
+            wait(list(self._running))
+
+        ls_done = []
+        for future in [future for future in self._running if future.done()]:
+            config_file, stat = self._running.pop(future)
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'name': self.output_name(config_file)}
+            try:
+                entry.update(future.result())
+                entry['status'] = 'OK'
+                print('Done: ' + config_file + ' (' + str(entry['ROWS']) + ' rows in ' + str(entry['SECONDS']) +
+                      ' s)')
+            except Exception as e:
+                entry.update({'status': 'FAILED', 'error': type(e).__name__ + ': ' + str(e)})
+                print('Failed: ' + config_file + ' (' + entry['error'] + ')')
+            self.processed[config_file] = entry
+            ls_done.append(config_file)
+
+        if ls_done:
+            self._save_state()
+        return ls_done
+
+    def run(self, poll_interval=30, max_polls=None):
+        """
+        Polls the folder until interrupted, processing the experiments as they become ready. The experiments that are
+        running when the watcher is interrupted are finished before it stops.
+
+        :param poll_interval: Number of seconds between polls.
+        :param max_polls: Optional number of polls after which the watcher stops.
+        """
+        logging.info('Watching ' + self.watch_dir + ' for new experiments. Press Ctrl+C to stop.')
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            num_polls = 0
+            try:
+                while max_polls is None or num_polls < max_polls:
+                    self.collect()
+                    for config_file in self.find_ready():
+                        self.submit(executor, config_file)
+                    num_polls += 1
+                    if max_polls is None or num_polls < max_polls:
+                        time.sleep(poll_interval)
+            except KeyboardInterrupt:
+                logging.info('Stopping once the running experiments are done...')
+            finally:
+                self.collect(block=True)
+
+
+def spr_watch_folder(watch_dir, poll_interval=30, settle_seconds=60, workers=1, state_file=None, skip_existing=False,
+                     max_polls=None, **kwargs):
+    """
+    Watches a folder and creates the ADLP file of every new experiment once its export set is complete. The ADLP files
+    are named after their configuration files and saved to the users desktop.
+
+    :param watch_dir: Folder watched, with its subfolders, for configuration files.
+    :param poll_interval: Number of seconds between polls.
+    :param settle_seconds: Number of seconds an export set must stay unchanged before it is processed.
+    :param workers: Number of experiments processed in parallel.
+    :param state_file: Optional path of the file the processed configuration files are kept in.
+    :param skip_existing: Flag to only process the experiments that are added after the watcher starts.
+    :param max_polls: Optional number of polls after which the watcher stops.
+    :param kwargs: Options passed to spr_create_dot_upload_file of every experiment.
+    :return: The ExportWatcher.
+    """
+    watcher = ExportWatcher(watch_dir, settle_seconds=settle_seconds, workers=workers, state_file=state_file, **kwargs)
+    if skip_existing:
+        watcher.mark_existing()
+    watcher.run(poll_interval=poll_interval, max_polls=max_polls)
+    return watcher
@@ -0,0 +1,62 @@
+"""Module for testing the batch runner used by the setup file scripts."""
+
+from unittest import TestCase
+import os
+import tempfile
+
+from SPR_to_ADLP_Functions.batch import find_input_files, output_names, run_batch, report_failures
+
+
+def count_lines(path, name=None, offset=0):
+    """Module level so it can be sent to a worker process."""
+    if 'bad' in path:
+        raise ValueError('Bad file.')
+    with open(path) as f:
+        return name, len(f.readlines()) + offset
+
+
+class TestBatch(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.ls_paths = []
+        for i, file_name in enumerate(['a.csv', 'b.csv', 'notes.txt']):
+            path = os.path.join(self.tmp_dir.name, file_name)
+            with open(path, 'w') as f:
+                f.write('x\n' * (i + 1))
+            self.ls_paths.append(path)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_find_input_files_in_folder(self):
+        self.assertEqual(self.ls_paths[:2], find_input_files(self.tmp_dir.name))
+
+    def test_find_input_files_glob(self):
+        self.assertEqual(self.ls_paths[1:], find_input_files(os.path.join(self.tmp_dir.name, '[bn]*')))
+
+    def test_find_input_files_none_found(self):
+        with self.assertRaises(ValueError):
+            find_input_files(os.path.join(self.tmp_dir.name, '*.xlsx'))
+
+    def test_output_names_are_unique(self):
+        self.assertEqual(['a', 'b', 'a_2'], output_names(['x/a.csv', 'x/b.csv', 'y/a.csv']))
+
+    def test_run_batch(self):
+        for workers in [1, 2]:
+            with self.subTest(workers=workers):
+                results, failures = run_batch(count_lines, self.ls_paths, workers=workers, offset=10)
+
+                self.assertEqual({self.ls_paths[0]: ('a', 11), self.ls_paths[1]: ('b', 12),
+                                  self.ls_paths[2]: ('notes', 13)}, results)
+                self.assertEqual({}, failures)
+
+    def test_failed_file_does_not_stop_batch(self):
+        ls_paths = [os.path.join(self.tmp_dir.name, 'bad.csv')] + self.ls_paths[:1]
+
+        results, failures = run_batch(count_lines, ls_paths, workers=1)
+
+        self.assertEqual({self.ls_paths[0]: ('a', 1)}, results)
+        self.assertEqual([ls_paths[0]], list(failures))
+        with self.assertRaises(RuntimeError):
+            report_failures(failures)
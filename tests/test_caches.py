@@ -0,0 +1,207 @@
+"""
+Module for testing the local caches used when inserting structures.
+"""
+
+from unittest import TestCase
+from unittest.mock import patch
+import os
+import tempfile
+import pandas as pd
+
+from SPR_to_ADLP_Functions.caches import SmilesCache, StructureImageCache
+from SPR_to_ADLP_Functions.common_functions import get_structures_smiles_from_db, render_structure_imgs
+
+
+class TestSmilesCache(TestCase):
+    """Tests the SQLite SMILES cache."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'smiles.sqlite')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_put_and_get(self):
+        cache = SmilesCache(path=self.path)
+        cache.put_many([('81106261', 'smile1'), ('00024350', 'smile2')])
+
+        self.assertEqual({'81106261': 'smile1'}, cache.get_many(['81106261', '00000000']))
+
+    def test_not_found_is_not_cached(self):
+        cache = SmilesCache(path=self.path)
+        cache.put_many([('81106261', None), ('00024350', float('nan'))])
+
+        self.assertEqual(0, len(cache))
+
+    def test_expired_entries_are_misses_but_usable_offline(self):
+        cache = SmilesCache(path=self.path, ttl_seconds=-1)
+        cache.put_many([('81106261', 'smile1')])
+
+        self.assertEqual({}, cache.get_many(['81106261']))
+        self.assertEqual({'81106261': 'smile1'}, cache.get_many(['81106261'], include_expired=True))
+
+    def test_least_recently_used_are_evicted(self):
+        cache = SmilesCache(path=self.path, max_entries=2)
+        with patch('time.time', return_value=1.0):
+            cache.put_many([('1', 'smile1'), ('2', 'smile2')])
+        with patch('time.time', return_value=2.0):
+            cache.get_many(['1'])
+        with patch('time.time', return_value=3.0):
+            cache.put_many([('3', 'smile3')])
+
+        self.assertEqual(2, len(cache))
+        self.assertEqual({'1': 'smile1', '3': 'smile3'}, cache.get_many(['1', '2', '3'], include_expired=True))
+
+    def test_not_found_is_remembered(self):
+        cache = SmilesCache(path=self.path)
+        cache.put_not_found(['00000000'])
+
+        self.assertEqual({'00000000'}, cache.get_not_found(['00000000', '81106261']))
+
+    def test_not_found_expires(self):
+        cache = SmilesCache(path=self.path, ttl_seconds=-1)
+        cache.put_not_found(['00000000'])
+
+        self.assertEqual(set(), cache.get_not_found(['00000000']))
+
+    def test_found_smiles_clears_not_found(self):
+        cache = SmilesCache(path=self.path)
+        cache.put_not_found(['81106261'])
+        cache.put_many([('81106261', 'smile1')])
+
+        self.assertEqual(set(), cache.get_not_found(['81106261']))
+
+
+class TestGetStructSmilesCached(TestCase):
+    """Tests that get_structures_smiles_from_db only goes to resultsdb for cache misses."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = SmilesCache(path=os.path.join(self.tmp_dir.name, 'smiles.sqlite'))
+        self.df_setup_tbl = pd.DataFrame({'Broad ID': ['BRD-K81106261-001-01-4', 'BRD-K00024350-001-01-9',
+                                                       'BRD-K81106261-001-01-4']})
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    @patch('SPR_to_ADLP_Functions.common_functions._connect')
+    def test_no_connection_when_all_cached(self, mock_connect):
+        self.cache.put_many([('81106261', 'smile1'), ('00024350', 'smile2')])
+
+        result = get_structures_smiles_from_db(df_mstr_tbl=self.df_setup_tbl, smiles_cache=self.cache)
+
+        self.assertEqual(0, mock_connect.call_count)
+        self.assertEqual(['smile1', 'smile2', 'smile1'], result['SMILES'].tolist())
+        self.assertEqual(list(self.df_setup_tbl['Broad ID']), result['Broad ID'].tolist())
+
+    @patch('SPR_to_ADLP_Functions.common_functions._connect', side_effect=Exception('No network'))
+    def test_offline_uses_cache(self, mock_connect):
+        self.cache.put_many([('81106261', 'smile1')])
+
+        with patch('crypt.Crypt'):
+            result = get_structures_smiles_from_db(df_mstr_tbl=self.df_setup_tbl, smiles_cache=self.cache)
+
+        self.assertEqual(['smile1', 'smile1'], result['SMILES'].dropna().tolist())
+        self.assertTrue(pd.isna(result.loc[1, 'SMILES']))
+
+    @patch('SPR_to_ADLP_Functions.common_functions._connect', side_effect=Exception('No network'))
+    def test_offline_with_empty_cache_returns_none(self, mock_connect):
+        with patch('crypt.Crypt'):
+            result = get_structures_smiles_from_db(df_mstr_tbl=self.df_setup_tbl, smiles_cache=self.cache)
+
+        self.assertIsNone(result)
+
+    @patch('sqlalchemy.select')
+    @patch('sqlalchemy.Table')
+    @patch('sqlalchemy.MetaData')
+    @patch('sqlalchemy.create_engine')
+    @patch('SPR_to_ADLP_Functions.common_functions._connect')
+    def test_all_misses_unknown_to_resultsdb(self, mock_connect, mock_engine, mock_meta, mock_table, mock_select):
+        self.cache.put_many([('81106261', 'smile1')])
+        mock_connect.return_value.execute.return_value.fetchall.return_value = []
+
+        with patch('crypt.Crypt') as MockCrypt:
+            MockCrypt.return_value.f.decrypt.return_value = b'test'
+            result = get_structures_smiles_from_db(df_mstr_tbl=self.df_setup_tbl, smiles_cache=self.cache)
+
+        self.assertEqual(['smile1', 'smile1'], result['SMILES'].dropna().tolist())
+        self.assertTrue(pd.isna(result.loc[1, 'SMILES']))
+        self.assertEqual({'00024350'}, self.cache.get_not_found(['00024350']))
+
+        # The unknown compound is not looked up again on the next run.
+        with patch('crypt.Crypt'):
+            get_structures_smiles_from_db(df_mstr_tbl=self.df_setup_tbl, smiles_cache=self.cache)
+        self.assertEqual(1, mock_connect.call_count)
+
+
+class TestStructureImageCache(TestCase):
+    """Tests the content addressed structure image cache."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def write_bytes(num_bytes):
+        def render(path):
+            with open(path, 'wb') as f:
+                f.write(b'0' * num_bytes)
+        return render
+
+    def test_key_depends_on_smiles_and_size(self):
+        self.assertEqual(StructureImageCache.key('CCO', (250, 250)), StructureImageCache.key('CCO', (250, 250)))
+        self.assertNotEqual(StructureImageCache.key('CCO', (250, 250)), StructureImageCache.key('CCO', (300, 300)))
+        self.assertNotEqual(StructureImageCache.key('CCO', (250, 250)), StructureImageCache.key('CCN', (250, 250)))
+
+    def test_put_and_get(self):
+        cache = StructureImageCache(cache_dir=self.tmp_dir.name)
+        self.assertIsNone(cache.get('CCO', (250, 250)))
+
+        img_path = cache.put('CCO', (250, 250), self.write_bytes(10))
+        self.assertEqual(img_path, cache.get('CCO', (250, 250)))
+        self.assertEqual(['{}.png'.format(StructureImageCache.key('CCO', (250, 250)))], os.listdir(self.tmp_dir.name))
+
+    def test_prune_removes_least_recently_used(self):
+        old_cache = StructureImageCache(cache_dir=self.tmp_dir.name, max_bytes=20)
+        old_path = old_cache.put('C', (250, 250), self.write_bytes(10))
+        os.utime(old_path, (1, 1))
+        recent_path = old_cache.put('CC', (250, 250), self.write_bytes(10))
+
+        # A new run adds another image and prunes the cache down to 20 bytes.
+        cache = StructureImageCache(cache_dir=self.tmp_dir.name, max_bytes=20)
+        new_path = cache.put('CCC', (250, 250), self.write_bytes(10))
+        cache.prune()
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(recent_path))
+        self.assertTrue(os.path.exists(new_path))
+
+    def test_render_structure_imgs_renders_each_molecule_once(self):
+        cache = StructureImageCache(cache_dir=self.tmp_dir.name)
+        df_smiles = pd.DataFrame({'Broad ID': ['BRD-1', 'BRD-2', 'BRD-3', 'BRD-4'],
+                                  'SMILES': ['OCC', 'CCO', None, 'c1ccccc1']})
+
+        df_with_paths = render_structure_imgs(df_with_smiles=df_smiles, dir=None, image_cache=cache)
+
+        # OCC and CCO are the same molecule.
+        self.assertEqual(2, len(os.listdir(self.tmp_dir.name)))
+        self.assertEqual(df_with_paths.loc[0, 'IMG_PATH'], df_with_paths.loc[1, 'IMG_PATH'])
+        self.assertEqual('Not Found', df_with_paths.loc[2, 'IMG_PATH'])
+
+    def test_parallel_render_matches_serial_order(self):
+        df_smiles = pd.DataFrame({'Broad ID': ['BRD-1', 'BRD-2', 'BRD-3', 'BRD-4', 'BRD-5'],
+                                  'SMILES': ['c1ccccc1', 'CCO', None, 'CCN', 'c1ccccc1']})
+
+        with tempfile.TemporaryDirectory() as serial_dir:
+            df_serial = render_structure_imgs(df_with_smiles=df_smiles, dir=None,
+                                              image_cache=StructureImageCache(cache_dir=serial_dir))
+            df_parallel = render_structure_imgs(df_with_smiles=df_smiles, dir=None, workers=2,
+                                                image_cache=StructureImageCache(cache_dir=self.tmp_dir.name))
+
+        self.assertEqual([os.path.basename(p) for p in df_serial['IMG_PATH']],
+                         [os.path.basename(p) for p in df_parallel['IMG_PATH']])
+        self.assertEqual(list(df_smiles['Broad ID']), list(df_parallel['Broad ID']))
+        self.assertEqual(3, len(os.listdir(self.tmp_dir.name)))
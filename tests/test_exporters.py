@@ -0,0 +1,146 @@
+"""Module for testing the CSV and Parquet export of the ADLP file."""
+
+from unittest import TestCase, mock, skipIf
+from io import BytesIO
+import importlib.util
+import os
+import tempfile
+import zipfile
+
+import pandas as pd
+from click.testing import CliRunner
+
+from SPR_to_ADLP_Functions import exporters
+from benchmarks import synthetic
+import script_spr_to_adlp_8k.Cli
+import script_spr_to_adlp_8k.SPR_to_ADLP_8K
+import script_spr_to_adlp_not_8k.SPR_to_ADLP
+
+
+class TestWriteImageBundle(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        for img in ['ss_1.png', 'senso_1.png', 'ss_2.png', 'senso_2.png', 'cmpd.png']:
+            synthetic.write_png(os.path.join(self.tmp_dir.name, img), width=40, height=30)
+        self.bundle_path = os.path.join(self.tmp_dir.name, 'bundle.zip')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_images_in_bundle(self):
+        df_bundle = exporters.write_image_bundle(self.bundle_path, [('ss_1.png', 'senso_1.png'),
+                                                                    ('ss_2.png', 'senso_2.png')],
+                                                 self.tmp_dir.name, self.tmp_dir.name)
+
+        self.assertEqual(['steady_state/ss_1.png', 'steady_state/ss_2.png'], df_bundle['SS_IMG'].tolist())
+        self.assertEqual(['sensorgram/senso_1.png', 'sensorgram/senso_2.png'], df_bundle['SENSO_IMG'].tolist())
+        self.assertNotIn('STRUCTURE_IMG', df_bundle.columns)
+        with zipfile.ZipFile(self.bundle_path) as bundle:
+            self.assertEqual(sorted(df_bundle['SS_IMG'].tolist() + df_bundle['SENSO_IMG'].tolist()),
+                             sorted(bundle.namelist()))
+            self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in bundle.infolist()))
+
+    def test_structures_added_once(self):
+        img = BytesIO(b'png data')
+        path = os.path.join(self.tmp_dir.name, 'cmpd.png')
+        df_bundle = exporters.write_image_bundle(self.bundle_path, [('ss_1.png', 'senso_1.png')],
+                                                 self.tmp_dir.name, self.tmp_dir.name,
+                                                 ls_structure_imgs=[img, img, 'Not Found', path, path])
+
+        self.assertEqual(['structures/structure_2.png', 'structures/structure_2.png', None, 'structures/cmpd.png',
+                          'structures/cmpd.png'], df_bundle['STRUCTURE_IMG'].tolist())
+        with zipfile.ZipFile(self.bundle_path) as bundle:
+            self.assertEqual(b'png data', bundle.read('structures/structure_2.png'))
+            self.assertEqual(4, len(bundle.namelist()))
+
+
+class TestWriteTable(TestCase):
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            exporters.write_table(pd.DataFrame({'A': [1]}), 'adlp.json', 'json')
+        with self.assertRaises(ValueError):
+            exporters.check_export_format('json')
+
+    def test_check_export_format(self):
+        for export_format in ['xlsx', 'csv']:
+            exporters.check_export_format(export_format)
+
+        with mock.patch.object(exporters, 'PARQUET_ENGINES', ['no_parquet_engine']):
+            with self.assertRaisesRegex(RuntimeError, 'pyarrow or fastparquet'):
+                exporters.check_export_format('parquet')
+
+    @skipIf(importlib.util.find_spec('pyarrow') or importlib.util.find_spec('fastparquet'),
+            'A Parquet engine is installed.')
+    def test_parquet_without_engine(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(RuntimeError):
+                exporters.write_table(pd.DataFrame({'A': [1]}), os.path.join(tmp_dir, 'adlp.parquet'), 'parquet')
+
+
+class TestExportScripts(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.desktop = os.path.join(self.tmp_dir.name, 'home', 'Desktop')
+        os.makedirs(self.desktop)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def run_script(self, module, flavor, **kwargs):
+        paths = synthetic.generate_experiment(os.path.join(self.tmp_dir.name, 'data'), flavor, 10)
+        with mock.patch.object(module, 'homedir', os.path.join(self.tmp_dir.name, 'home')):
+            return module.spr_create_dot_upload_file(paths['config'], 'exported', clip=False, structures=False,
+                                                     export_format='csv', **kwargs)
+
+    def exported_files(self):
+        ls_files = os.listdir(self.desktop)
+        ls_tables = [f for f in ls_files if f.endswith('.csv') and not f.endswith('_manifest.csv')]
+        self.assertEqual(1, len(ls_tables))
+        return [os.path.join(self.desktop, f) for f in exporters.export_paths(ls_tables[0], 'csv')], ls_files
+
+    def test_csv_not_8k(self):
+        df_final_for_dot = self.run_script(script_spr_to_adlp_not_8k.SPR_to_ADLP, 'Biacore1')
+
+        (table_path, manifest_path, bundle_path), ls_files = self.exported_files()
+        self.assertEqual(sorted(ls_files), sorted(os.path.basename(path) for path in
+                                                  [table_path, manifest_path, bundle_path]))
+
+        df_table = pd.read_csv(table_path)
+        self.assertEqual(list(df_final_for_dot.columns), list(df_table.columns))
+        self.assertEqual(30, len(df_table))
+
+        df_manifest = pd.read_csv(manifest_path)
+        self.assertEqual(df_table['SS_IMG_ID'].tolist(), df_manifest['SS_IMG_ID'].tolist())
+        self.assertTrue(all(img_id.endswith(os.path.basename(img))
+                            for img_id, img in zip(df_manifest['SS_IMG_ID'], df_manifest['SS_IMG'])))
+        with zipfile.ZipFile(bundle_path) as bundle:
+            self.assertEqual(set(df_manifest['SS_IMG']) | set(df_manifest['SENSO_IMG']), set(bundle.namelist()))
+
+    def test_parquet_without_engine_fails_before_renames(self):
+        paths = synthetic.generate_experiment(os.path.join(self.tmp_dir.name, 'data'), 'Biacore8K', 10)
+        ls_img_dirs = [paths['path_ss_img'], paths['path_senso_img']]
+        ls_before = [sorted(os.listdir(img_dir)) for img_dir in ls_img_dirs]
+
+        with mock.patch.object(exporters, 'PARQUET_ENGINES', ['no_parquet_engine']), \
+                mock.patch.object(script_spr_to_adlp_8k.SPR_to_ADLP_8K, 'homedir',
+                                  os.path.join(self.tmp_dir.name, 'home')), \
+                mock.patch.object(script_spr_to_adlp_8k.SPR_to_ADLP_8K, 'rename_images') as mock_rename:
+            result = CliRunner().invoke(script_spr_to_adlp_8k.Cli.main, ['--config_file', paths['config'],
+                                                                         '--save_file', 'exported',
+                                                                         '--format', 'parquet'])
+
+        self.assertEqual(1, result.exit_code)
+        self.assertIn('pyarrow or fastparquet', str(result.exception))
+        self.assertEqual(0, mock_rename.call_count)
+        self.assertEqual(ls_before, [sorted(os.listdir(img_dir)) for img_dir in ls_img_dirs])
+        self.assertEqual([], os.listdir(self.desktop))
+
+    def test_preview_8k(self):
+        self.run_script(script_spr_to_adlp_8k.SPR_to_ADLP_8K, 'Biacore8K', preview=True)
+
+        ls_paths, ls_files = self.exported_files()
+        self.assertTrue(all(os.path.isfile(path) for path in ls_paths))
+        self.assertEqual(1, len([f for f in ls_files if f.endswith('.xlsx')]))
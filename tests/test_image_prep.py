@@ -0,0 +1,141 @@
+"""Module for testing the preparation of the steady state and sensorgram images before they are embedded."""
+
+from unittest import TestCase, mock
+import os
+import shutil
+import tempfile
+import zipfile
+
+from PIL import Image
+
+from SPR_to_ADLP_Functions import caches, image_prep
+from benchmarks import bench_startup, synthetic
+import script_spr_to_adlp_not_8k.SPR_to_ADLP
+
+
+class TestPrepareImg(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.save_path = os.path.join(self.tmp_dir.name, 'prepared.png')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_scaled_down_to_height(self):
+        source_path = os.path.join(self.tmp_dir.name, 'large.png')
+        synthetic.write_png(source_path, width=1200, height=900)
+
+        image_prep.prepare_img(source_path, self.save_path, max_height=313)
+
+        with Image.open(self.save_path) as img:
+            self.assertEqual((417, 313), img.size)
+        self.assertLess(os.path.getsize(self.save_path), os.path.getsize(source_path))
+
+    def test_small_image_kept(self):
+        source_path = os.path.join(self.tmp_dir.name, 'small.png')
+        synthetic.write_png(source_path, width=240, height=180)
+
+        image_prep.prepare_img(source_path, self.save_path, max_height=313)
+
+        with Image.open(self.save_path) as img:
+            self.assertEqual((240, 180), img.size)
+        self.assertLessEqual(os.path.getsize(self.save_path), os.path.getsize(source_path))
+
+    def test_palette_keeps_pixels(self):
+        source_path = os.path.join(self.tmp_dir.name, 'plot.png')
+        img = Image.new('RGB', (200, 100), 'white')
+        img.paste((200, 30, 30), (20, 20, 180, 40))
+        img.paste((30, 30, 200), (20, 60, 180, 80))
+        img.save(source_path)
+
+        image_prep.prepare_img(source_path, self.save_path, max_height=313)
+
+        with Image.open(self.save_path) as prepared:
+            self.assertEqual('P', prepared.mode)
+            self.assertEqual(img.tobytes(), prepared.convert('RGB').tobytes())
+
+    def test_pillow_not_loaded_at_startup(self):
+        # Pillow is only loaded when images are prepared, so importing the scripts does not load it.
+        self.assertNotIn('PIL', bench_startup.optional_modules_loaded())
+
+    def test_row_height_pixels(self):
+        self.assertEqual([313, 280], [image_prep.row_height_pixels(235), image_prep.row_height_pixels(210)])
+
+
+class TestPrepareSsSensoImgs(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.image_cache = caches.PreparedImageCache(cache_dir=os.path.join(self.tmp_dir.name, 'cache'))
+        for seed, img in enumerate(['ss_1.png', 'senso_1.png', 'ss_2.png', 'senso_2.png']):
+            synthetic.write_png(os.path.join(self.tmp_dir.name, img), width=800, height=600, seed=seed)
+        self.tuple_list_imgs = [('ss_1.png', 'senso_1.png'), ('ss_2.png', 'senso_2.png'), ('ss_1.png', 'senso_1.png')]
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def prepare(self):
+        return image_prep.prepare_ss_senso_imgs(self.tuple_list_imgs, self.tmp_dir.name, self.tmp_dir.name,
+                                                max_height=280, workers=2, image_cache=self.image_cache)
+
+    def test_prepared_in_cache(self):
+        tuple_list_prepared, path_ss_img, path_senso_img = self.prepare()
+
+        self.assertEqual(self.image_cache.cache_dir, path_ss_img)
+        self.assertEqual(self.image_cache.cache_dir, path_senso_img)
+        self.assertEqual(tuple_list_prepared[0], tuple_list_prepared[2])
+        self.assertEqual(4, len(set(img for pair in tuple_list_prepared for img in pair)))
+        for ss_img, senso_img in tuple_list_prepared:
+            with Image.open(os.path.join(path_ss_img, ss_img)) as img:
+                self.assertEqual(280, img.height)
+
+    def test_unchanged_images_not_prepared_again(self):
+        tuple_list_prepared = self.prepare()[0]
+
+        def copy_img(source_path, save_path, max_height):
+            shutil.copyfile(source_path, save_path)
+
+        with mock.patch.object(image_prep, 'prepare_img', side_effect=copy_img) as mock_prepare_img:
+            self.assertEqual(tuple_list_prepared, self.prepare()[0])
+            mock_prepare_img.assert_not_called()
+
+            # A changed image is prepared again.
+            source_path = os.path.join(self.tmp_dir.name, 'ss_2.png')
+            os.utime(source_path, ns=(0, os.stat(source_path).st_mtime_ns + 10 ** 9))
+            self.prepare()
+            mock_prepare_img.assert_called_once_with(source_path, mock.ANY, 280)
+
+    def test_unreadable_image_embedded_unchanged(self):
+        with open(os.path.join(self.tmp_dir.name, 'ss_2.png'), 'wb') as f:
+            f.write(b'not a png')
+
+        tuple_list_prepared, path_ss_img, _ = self.prepare()
+
+        with open(os.path.join(path_ss_img, tuple_list_prepared[1][0]), 'rb') as f:
+            self.assertEqual(b'not a png', f.read())
+
+
+class TestPrepareImagesScript(TestCase):
+
+    def test_embedded_images_fit_rows(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            home = os.path.join(tmp_dir, 'home')
+            os.makedirs(os.path.join(home, 'Desktop'))
+            paths = synthetic.generate_experiment(os.path.join(tmp_dir, 'data'), 'Biacore1', 4,
+                                                  image_size=(1200, 900))
+
+            with mock.patch.dict(os.environ, {caches.CACHE_DIR_ENV: os.path.join(tmp_dir, 'cache')}), \
+                    mock.patch.object(script_spr_to_adlp_not_8k.SPR_to_ADLP, 'homedir', home):
+                for stream in [False, True]:
+                    script_spr_to_adlp_not_8k.SPR_to_ADLP.spr_create_dot_upload_file(
+                        paths['config'], 'stream' if stream else 'default', clip=False, structures=False,
+                        stream=stream, prepare_images=True)
+
+            for file_name in os.listdir(os.path.join(home, 'Desktop')):
+                with zipfile.ZipFile(os.path.join(home, 'Desktop', file_name)) as z:
+                    ls_media = [name for name in z.namelist() if name.startswith('xl/media/')]
+                    self.assertEqual(24, len(ls_media))
+                    for name in ls_media:
+                        with Image.open(z.open(name)) as img:
+                            self.assertEqual(313, img.height)
@@ -0,0 +1,60 @@
+"""Module for testing the loader that reads the files of an experiment ahead of the stages that parse them."""
+
+from unittest import TestCase, mock
+import io
+import os
+import tempfile
+import threading
+
+from SPR_to_ADLP_Functions import loader, profiling
+from SPR_to_ADLP_Functions.pipeline import Pipeline, Stage
+
+
+class TestLoader(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'ss.txt')
+        with open(self.path, 'wb') as f:
+            f.write(b'Curve\tKD (M)\n')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_read_ahead(self):
+        buffer = loader.read_ahead(self.path)
+
+        self.assertIsInstance(buffer, io.BytesIO)
+        self.assertEqual(b'Curve\tKD (M)\n', buffer.read())
+        self.assertEqual(self.path, buffer.name)
+
+    def test_read_ahead_missing_file(self):
+        # The path is given to the stage that parses the file, which reports the error.
+        missing = os.path.join(self.tmp_dir.name, 'missing.txt')
+        self.assertEqual(missing, loader.read_ahead(missing))
+
+    def test_bytes_read_ahead_are_profiled(self):
+        buffer = loader.read_ahead(self.path)
+
+        with profiling.profile_run('test') as profiler:
+            with profiling.stage('read_steady_state'):
+                profiling.add_file_read(buffer)
+            profile = profiler.to_dict()
+        self.assertEqual(13, profile['stages'][0]['bytes_read'])
+
+    def test_files_load_together(self):
+        # Each load waits for the other two, so the run only finishes if the three files are loaded at the same time.
+        barrier = threading.Barrier(3, timeout=10)
+
+        def read_ahead(path):
+            barrier.wait()
+            return path.upper()
+
+        pipeline = Pipeline(loader.LOAD_STAGES + [
+            Stage('steady_state', lambda ss_file: ss_file + '_fits', inputs=['ss_file'], outputs=['df_ss_txt'])])
+
+        with mock.patch.object(loader, 'read_ahead', side_effect=read_ahead):
+            values = pipeline.run({'path_report_pt': 'rpt', 'path_ss_txt': 'ss', 'path_senso_txt': 'senso'})
+
+        self.assertEqual(('RPT', 'SS', 'SENSO', 'SS_fits'),
+                         (values['report_pt_file'], values['ss_file'], values['senso_file'], values['df_ss_txt']))
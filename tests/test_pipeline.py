@@ -0,0 +1,61 @@
+"""Module for testing the stage graph the ADLP scripts are run with."""
+
+from unittest import TestCase
+import threading
+
+from SPR_to_ADLP_Functions import profiling
+from SPR_to_ADLP_Functions.pipeline import Pipeline, Stage
+
+
+class TestPipeline(TestCase):
+
+    def test_order(self):
+        pipeline = Pipeline([Stage('total', lambda a, b: a + b, inputs=['a', 'b'], outputs=['total']),
+                             Stage('a', lambda x: x + 1, inputs=['x'], outputs=['a']),
+                             Stage('b', lambda x: (x * 2, x * 3), inputs=['x'], outputs=['b', 'c'])])
+
+        self.assertEqual(['a', 'b', 'total'], [stage.name for stage in pipeline.order(['x'])])
+        for workers in [1, 4]:
+            self.assertEqual({'x': 2, 'a': 3, 'b': 4, 'c': 6, 'total': 7}, pipeline.run({'x': 2}, workers=workers))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('a', len, outputs=['a']), Stage('b', len, outputs=['a'])])
+
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('a', lambda b: b, inputs=['b'], outputs=['a']),
+                      Stage('b', lambda a: a, inputs=['a'], outputs=['b'])]).run({})
+
+    def test_independent_stages_run_together(self):
+        # Each stage waits for the other, so the run only finishes if they run at the same time.
+        barrier = threading.Barrier(2, timeout=10)
+        pipeline = Pipeline([Stage('ss', lambda: barrier.wait() is not None, outputs=['ss']),
+                             Stage('senso', lambda: barrier.wait() is not None, outputs=['senso'])])
+
+        self.assertEqual({'ss': True, 'senso': True}, pipeline.run({}))
+
+    def test_profiled_run_is_serial(self):
+        ls_threads = []
+        pipeline = Pipeline([Stage(name, lambda: ls_threads.append(threading.get_ident()), outputs=[name])
+                             for name in ['ss', 'senso', 'report_points']])
+
+        with profiling.profile_run('test'):
+            pipeline.run({})
+        self.assertEqual([threading.get_ident()] * 3, ls_threads)
+
+    def test_failure(self):
+        def fail():
+            raise RuntimeError('Issue reading in data.')
+
+        ls_started = []
+        pipeline = Pipeline([Stage('ss', fail, outputs=['ss']),
+                             Stage('senso', lambda: 'senso', outputs=['senso']),
+                             Stage('save', lambda ss, senso: ls_started.append('save'), inputs=['ss', 'senso'])])
+
+        values = {}
+        with self.assertRaisesRegex(RuntimeError, 'Issue reading in data.'):
+            pipeline.run(values)
+
+        # The outputs of the stages that finished are kept and the stages after the failure are not started.
+        self.assertEqual({'senso': 'senso'}, values)
+        self.assertEqual([], ls_started)
@@ -0,0 +1,109 @@
+"""Module for testing the Biacore 8K plate planner."""
+
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+
+from SPR_to_ADLP_Functions.plate_planner import cmpds_per_plate, needle_pass_order, plan_plates, split_into_plates, \
+    throughput_report, EMPTY_NEEDLE
+
+
+class TestPlatePlanner(TestCase):
+
+    def test_cmpds_per_plate(self):
+        self.assertEqual(32, cmpds_per_plate(num_pts=10))
+        self.assertEqual(48, cmpds_per_plate(num_pts=6))
+        self.assertEqual(40, cmpds_per_plate(num_pts=7))
+
+    def test_titration_too_long_for_plate(self):
+        with self.assertRaises(ValueError):
+            cmpds_per_plate(num_pts=47)
+
+    def test_needle_pass_order_one_pass(self):
+        # 8 compounds with 2 points each take 4 rows: blank, blank, low, high.
+        order = needle_pass_order(num_cmpds=8, num_pts=2)
+
+        first_blanks = list(range(0, 32, 4))
+        second_blanks = list(range(1, 32, 4))
+        low = list(range(2, 32, 4))
+        high = list(range(3, 32, 4))
+        self.assertEqual(first_blanks + second_blanks + low + high, list(order))
+
+    def test_needle_pass_order_is_permutation(self):
+        order = needle_pass_order(num_cmpds=48, num_pts=6)
+        self.assertEqual(list(range(48 * 8)), sorted(order))
+
+    def test_plan_plates_splits_campaign(self):
+        ls_orders = plan_plates(num_cmpds=2000, num_pts=10)
+
+        self.assertEqual(63, len(ls_orders))
+        self.assertEqual([32 * 12] * 62 + [16 * 12], [len(order) for order in ls_orders])
+        self.assertEqual(list(range(2000 * 12)), sorted(np.concatenate(ls_orders)))
+
+        # Every plate holds consecutive compounds of the setup table.
+        self.assertEqual(32 * 12, ls_orders[1].min())
+        self.assertEqual(list(needle_pass_order(32, 10) + 32 * 12), list(ls_orders[1]))
+
+    def test_split_into_plates(self):
+        num_cmpds, num_pts = 56, 6
+        final_df = pd.DataFrame({'BRD': np.repeat(['BRD_' + str(i) for i in range(num_cmpds)], num_pts + 2)})
+
+        ls_df_plates = split_into_plates(final_df=final_df, num_cmpds=num_cmpds, num_pts=num_pts)
+
+        self.assertEqual([48 * 8, 8 * 8], [len(df) for df in ls_df_plates])
+        self.assertEqual(['BRD_' + str(i) for i in range(48, 56)], list(ls_df_plates[1]['BRD'].iloc[:8]))
+        self.assertEqual(list(range(8 * 8)), list(ls_df_plates[1].index))
+
+    def test_split_into_plates_mixed_points(self):
+        with self.assertRaises(ValueError):
+            split_into_plates(final_df=pd.DataFrame({'BRD': range(10)}), num_cmpds=8, num_pts=6)
+
+    def test_needle_pass_order_partial_pass(self):
+        # 10 compounds need a second pass that only uses 2 needles.
+        order = needle_pass_order(num_cmpds=10, num_pts=2)
+
+        self.assertEqual(2 * 8 * 4, len(order))
+        self.assertEqual(list(range(10 * 4)), sorted(order[order != EMPTY_NEEDLE]))
+        self.assertEqual([32, 36] + [EMPTY_NEEDLE] * 6, list(order[32:40]))
+
+    def test_split_into_plates_partial_pass(self):
+        num_cmpds, num_pts = 12, 6
+        final_df = pd.DataFrame({'BRD': np.repeat(['BRD_' + str(i) for i in range(num_cmpds)], num_pts + 2),
+                                 'CONC': 1.0})
+
+        ls_df_plates = split_into_plates(final_df=final_df, num_cmpds=num_cmpds, num_pts=num_pts,
+                                         empty_needle_row={'BRD': 'BLANK_NEEDLE', 'CONC': 0})
+
+        self.assertEqual(1, len(ls_df_plates))
+        df_plate = ls_df_plates[0]
+        self.assertEqual(2 * 8 * 8, len(df_plate))
+        self.assertEqual(['BRD_8', 'BRD_9', 'BRD_10', 'BRD_11'] + ['BLANK_NEEDLE'] * 4,
+                         list(df_plate['BRD'].iloc[64:72]))
+        self.assertEqual(4 * 8, (df_plate['BRD'] == 'BLANK_NEEDLE').sum())
+        self.assertEqual(0, df_plate.loc[df_plate['BRD'] == 'BLANK_NEEDLE', 'CONC'].sum())
+
+    def test_throughput_report(self):
+        report = throughput_report(num_cmpds=12, num_pts=6)
+
+        self.assertEqual({'compounds': 12, 'plates': 1, 'needle_passes': 2, 'instrument_cycles': 16,
+                          'dummy_compounds_avoided': 4, 'wells_saved': 32}, report)
+
+    def test_throughput_report_matches_plates(self):
+        # The report counts the injections and the placeholder rows of the plates that are actually saved.
+        for num_cmpds, num_pts in [(1, 6), (7, 10), (9, 6), (16, 6), (50, 6), (33, 10)]:
+            with self.subTest(num_cmpds=num_cmpds, num_pts=num_pts):
+                final_df = pd.DataFrame({'BRD': np.repeat(['BRD_' + str(i) for i in range(num_cmpds)], num_pts + 2)})
+                ls_df_plates = split_into_plates(final_df, num_cmpds=num_cmpds, num_pts=num_pts,
+                                                 empty_needle_row={'BRD': 'BLANK_NEEDLE'})
+                df_all = pd.concat(ls_df_plates)
+                report = throughput_report(num_cmpds=num_cmpds, num_pts=num_pts)
+
+                self.assertEqual(len(ls_df_plates), report['plates'])
+                self.assertEqual(len(df_all) // 8, report['instrument_cycles'])
+                self.assertEqual((df_all['BRD'] == 'BLANK_NEEDLE').sum(), report['wells_saved'])
+
+                # Padding fills the empty needles with dummy compounds and keeps the same plates and passes.
+                num_padded = -(-num_cmpds // 8) * 8
+                self.assertEqual(num_padded - num_cmpds, report['dummy_compounds_avoided'])
+                self.assertEqual(report['instrument_cycles'],
+                                 throughput_report(num_cmpds=num_padded, num_pts=num_pts)['instrument_cycles'])
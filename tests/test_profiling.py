@@ -0,0 +1,77 @@
+"""Module for testing the stage profiler of the ADLP scripts."""
+
+from unittest import TestCase
+import json
+import os
+import tempfile
+
+from SPR_to_ADLP_Functions import profiling
+
+
+class TestProfiling(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.tmp_dir.name, 'adlp_result.xlsx')
+        self.input_path = os.path.join(self.tmp_dir.name, 'input.csv')
+        with open(self.input_path, 'wb') as f:
+            f.write(b'0' * 1000)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_stages_do_nothing_outside_of_a_run(self):
+        with profiling.stage('read') as record:
+            profiling.add_file_read(self.input_path)
+            profiling.set_output_path(self.output_path)
+
+        self.assertIsNone(record)
+        self.assertEqual(['input.csv'], os.listdir(self.tmp_dir.name))
+
+    def test_disabled_run_writes_nothing(self):
+        with profiling.profile_run('test', enabled=False) as profiler:
+            profiling.set_output_path(self.output_path)
+            with profiling.stage('read'):
+                pass
+
+        self.assertIsNone(profiler)
+        self.assertFalse(os.path.exists(profiling.sidecar_path_for(self.output_path)))
+
+    def test_sidecar(self):
+        with profiling.profile_run('test'):
+            profiling.set_output_path(self.output_path)
+            with profiling.stage('read'):
+                profiling.add_file_read(self.input_path)
+                with profiling.stage('parse'):
+                    data = [bytearray(100000)]
+            with profiling.stage('write'):
+                del data
+
+        with open(os.path.join(self.tmp_dir.name, 'adlp_result_profile.json')) as f:
+            profile = json.load(f)
+
+        self.assertEqual('test', profile['run'])
+        self.assertEqual(self.output_path, profile['output'])
+        self.assertEqual(['read', 'parse', 'write'], [stage['stage'] for stage in profile['stages']])
+        self.assertEqual([0, 1, 0], [stage['depth'] for stage in profile['stages']])
+        self.assertEqual([1000, 0, 0], [stage['bytes_read'] for stage in profile['stages']])
+
+        # The allocation of the inner stage counts for the stage it is part of.
+        self.assertGreaterEqual(profile['stages'][1]['peak_mem_bytes'], 100000)
+        self.assertGreaterEqual(profile['stages'][0]['peak_mem_bytes'], 100000)
+        self.assertGreaterEqual(profile['total_wall_s'], 0)
+
+    def test_sidecar_written_when_run_fails(self):
+        with self.assertRaises(RuntimeError):
+            with profiling.profile_run('test'):
+                profiling.set_output_path(self.output_path)
+                with profiling.stage('read'):
+                    raise RuntimeError('Crash')
+
+        with open(profiling.sidecar_path_for(self.output_path)) as f:
+            profile = json.load(f)
+        self.assertEqual(['read'], [stage['stage'] for stage in profile['stages']])
+
+        # The profiler of the failed run is no longer active.
+        with profiling.stage('after') as record:
+            self.assertIsNone(record)
@@ -0,0 +1,83 @@
+"""Module for testing the image rename journal used by the Biacore 8K scripts."""
+
+from unittest import TestCase
+import os
+import tempfile
+
+from SPR_to_ADLP_Functions.rename_journal import write_journal, apply_journal, rollback_journal, commit_journal, \
+    read_journal, journal_path, DELETED_SUFFIX
+
+
+class TestRenameJournal(TestCase):
+    """Tests that images can be renamed, restored after a crash and finalised without copying the folder."""
+
+    def setUp(self) -> None:
+        """Creates an image folder with two images and a legend."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path_img = self.tmp_dir.name
+
+        for name in ['img_1.png', 'img_2.png', 'Legend.png']:
+            with open(os.path.join(self.path_img, name), 'w') as f:
+                f.write(name)
+
+        self.renames = [('Legend.png', 'Legend.png' + DELETED_SUFFIX),
+                        ('img_1.png', 'BRD-6261_1.png'),
+                        ('img_2.png', 'BRD-4350_2.png')]
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def list_images(self):
+        return sorted(f for f in os.listdir(self.path_img) if f.endswith('.png'))
+
+    def test_apply_and_commit(self):
+        write_journal(self.path_img, self.renames)
+        apply_journal(self.path_img)
+        commit_journal(self.path_img)
+
+        self.assertEqual(['BRD-4350_2.png', 'BRD-6261_1.png'], self.list_images())
+        self.assertEqual(['BRD-4350_2.png', 'BRD-6261_1.png'], sorted(os.listdir(self.path_img)))
+
+    def test_rollback_restores_original_names(self):
+        write_journal(self.path_img, self.renames)
+        apply_journal(self.path_img)
+        rollback_journal(self.path_img)
+
+        self.assertEqual(['Legend.png', 'img_1.png', 'img_2.png'], self.list_images())
+        self.assertIsNone(read_journal(self.path_img))
+
+    def test_rollback_of_partially_applied_journal(self):
+        write_journal(self.path_img, self.renames)
+
+        # Simulate a crash after the first image was renamed.
+        os.rename(os.path.join(self.path_img, 'Legend.png'), os.path.join(self.path_img, 'Legend.png' + DELETED_SUFFIX))
+        os.rename(os.path.join(self.path_img, 'img_1.png'), os.path.join(self.path_img, 'BRD-6261_1.png'))
+        rollback_journal(self.path_img)
+
+        self.assertEqual(['Legend.png', 'img_1.png', 'img_2.png'], self.list_images())
+
+    def test_apply_is_idempotent(self):
+        write_journal(self.path_img, self.renames)
+        os.rename(os.path.join(self.path_img, 'img_1.png'), os.path.join(self.path_img, 'BRD-6261_1.png'))
+        apply_journal(self.path_img)
+
+        self.assertEqual(['BRD-4350_2.png', 'BRD-6261_1.png'], self.list_images())
+
+    def test_existing_journal_is_not_overwritten(self):
+        write_journal(self.path_img, self.renames)
+
+        with self.assertRaises(RuntimeError):
+            write_journal(self.path_img, self.renames)
+
+    def test_missing_image_raises(self):
+        write_journal(self.path_img, [('img_3.png', 'BRD-0000_3.png')])
+
+        with self.assertRaises(FileNotFoundError):
+            apply_journal(self.path_img)
+
+    def test_no_journal_is_a_no_op(self):
+        rollback_journal(self.path_img)
+        commit_journal(self.path_img)
+
+        self.assertFalse(os.path.exists(journal_path(self.path_img)))
+        self.assertEqual(['Legend.png', 'img_1.png', 'img_2.png'], self.list_images())
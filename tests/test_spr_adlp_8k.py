@@ -2,7 +2,11 @@
 
 from unittest import TestCase
 from unittest.mock import patch
+import os
+import tempfile
 from script_spr_to_adlp_8k.Cli import main
+from script_spr_to_adlp_8k import SPR_to_ADLP_8K
+from benchmarks import synthetic
 import pandas as pd
 from click.testing import CliRunner
 
@@ -40,15 +44,12 @@ class SPR_to_ADLP_8K_Cli(TestCase):
                                                                         44.11, 51.18, 63.29, 17.97, 17.97]})
 
     @patch('SPR_to_ADLP_Functions.common_functions.spr_binding_top_for_dot_file')
-    @patch('shutil.rmtree')
-    @patch('shutil.copytree')
     @patch('SPR_to_ADLP_Functions.common_functions.manage_structure_insertion')
     @patch('SPR_to_ADLP_Functions.common_functions.spr_insert_ss_senso_images', return_value='Image Place Holder')
     @patch('script_spr_to_adlp_8k.SPR_to_ADLP_8K.rename_images')
     @patch('pandas.ExcelWriter')
     @patch('pandas.DataFrame.to_excel')
-    def test_Cli_and_adlp_df_created_Biacore8k(self, mock_1, mock_2, mock_3, mock_4, mock_5, mock_6, mock_7,
-                                               mock_8) -> None:
+    def test_Cli_and_adlp_df_created_Biacore8k(self, mock_1, mock_2, mock_3, mock_4, mock_5, mock_6) -> None:
         """
         Test that the final DataFrame for ADLP upload is created in memory.  Note that all methods related to writing
         the DataFrame to a file using Pandas and the xlsxwriter engine have been patched.
@@ -58,9 +59,7 @@ class SPR_to_ADLP_8K_Cli(TestCase):
         :param mock_3: Mocks the rename_images method
         :param mock_4: Mocks the spr_insert_images method
         :param mock_5: Mocks the manage_structure_insertion method
-        :param mock_6: Mocks the shutil.copytree method used to restore image files in the event of a crash
-        :param mock_7: Mocks the shutil.rmtree method used to restore image files in the event of a crash
-        :param mock_8: Mocks the spr_binding_top_for_dot_file method as this is computationally expensive
+        :param mock_6: Mocks the spr_binding_top_for_dot_file method as this is computationally expensive
         :return: None
         """
 
@@ -68,7 +67,7 @@ class SPR_to_ADLP_8K_Cli(TestCase):
         mock_3.side_effect = [SPR_to_ADLP_8K_Cli.df_ss_txt_test, SPR_to_ADLP_8K_Cli.df_senso_txt_test]
 
         # Define the Return value of the mocked spr_binding_top_for_dot_file function
-        mock_8.side_effect = [SPR_to_ADLP_8K_Cli.df_ru_top_result]
+        mock_6.side_effect = [SPR_to_ADLP_8K_Cli.df_ru_top_result]
 
         # Use the click CliRunner object for testing Click implemented Cli programs.
         runner = CliRunner()
@@ -77,4 +76,29 @@ class SPR_to_ADLP_8K_Cli(TestCase):
                                                             '--save_file','Test.xlsx'])
 
         print(result.output)
-        self.assertEqual(0, result.exit_code)
\ No newline at end of file
+        self.assertEqual(0, result.exit_code)
+
+
+class SPR_to_ADLP_8K_Rollback(TestCase):
+    """Tests that the images get their original names back when a stage after the renames fails."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.experiment = synthetic.generate_experiment(os.path.join(self.tmp_dir.name, 'exp'), 'Biacore8K', 8)
+        self.home = os.path.join(self.tmp_dir.name, 'home')
+        os.makedirs(os.path.join(self.home, 'Desktop'))
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_images_restored(self):
+        ls_img_dirs = [self.experiment['path_ss_img'], self.experiment['path_senso_img']]
+        ls_before = [sorted(os.listdir(img_dir)) for img_dir in ls_img_dirs]
+
+        with patch.object(SPR_to_ADLP_8K, 'homedir', self.home), \
+                patch('SPR_to_ADLP_Functions.common_functions.spr_insert_ss_senso_images', side_effect=OSError):
+            with self.assertRaisesRegex(RuntimeError, 'Issue writing DataFrame to Excel file.'):
+                SPR_to_ADLP_8K.spr_create_dot_upload_file(config_file=self.experiment['config'], save_file='Test',
+                                                          clip=False)
+
+        self.assertEqual(ls_before, [sorted(os.listdir(img_dir)) for img_dir in ls_img_dirs])
@@ -0,0 +1,68 @@
+"""Module for testing SPR_to_ADLP_Funct_8K.py Script"""
+
+from unittest import TestCase
+from unittest.mock import patch
+import os
+import tempfile
+import pandas as pd
+
+from script_spr_to_adlp_funct_8k.SPR_to_ADLP_Funct_8K import ReportPointTable, calc_max_theory_disp, \
+    spr_displacement_top_conc
+
+
+class TestReportPointTable(TestCase):
+    """Tests that the functional 8K report point file is parsed once and serves both calculations."""
+
+    tmp_dir = None
+    report_path = None
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Writes a small report point file with two compounds on channels 1 and 2."""
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.report_path = os.path.join(cls.tmp_dir.name, 'report_pt.xlsx')
+
+        df_report_pt = pd.DataFrame({'Cycle': [1, 1, 2, 2, 3, 3],
+                                     'Channel': [1, 2, 1, 2, 1, 2],
+                                     'Flow cell': ['2-1'] * 6,
+                                     'Sensorgram type': ['Corrected'] * 6,
+                                     'Name': ['A-B-A binding late_1'] * 6,
+                                     'Step purpose': ['Analysis'] * 6,
+                                     'Relative response (RU)': [-10.0, -20.0, -12.0, -22.0, -4.0, -8.0],
+                                     'A-B-A 1 Concentration (µM)': [0, 0, 0, 0, 50, 50],
+                                     'A-B-A 1 Flanking solution': ['BRD-6261_1', 'BRD-4350_2'] * 3})
+
+        with pd.ExcelWriter(cls.report_path) as writer:
+            df_report_pt.to_excel(writer, sheet_name='Report point table', startrow=2, index=False)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmp_dir.cleanup()
+
+    def _cmpd_set(self):
+        return pd.DataFrame({'Broad ID': ['BRD-K81106261-001-01-4', 'BRD-K00024350-001-01-9'],
+                             'Test [Cpd] uM': [50, 50]})
+
+    def test_max_theory_disp(self):
+        result = calc_max_theory_disp(ReportPointTable(TestReportPointTable.report_path), [1, 2])
+        self.assertEqual([11.0, 21.0], list(result))
+
+    def test_displacement_top_conc(self):
+        df_cmpd_set = self._cmpd_set()
+        result = spr_displacement_top_conc(ReportPointTable(TestReportPointTable.report_path), df_cmpd_set)
+        self.assertEqual([4.0, 8.0], list(result))
+
+        # The setup table is read by other stages of the run at the same time, so it is left as it is.
+        pd.testing.assert_frame_equal(self._cmpd_set(), df_cmpd_set)
+
+    def test_report_point_file_read_once(self):
+        with patch('pandas.read_excel', wraps=pd.read_excel) as mock_read:
+            report_pt_table = ReportPointTable(TestReportPointTable.report_path)
+            calc_max_theory_disp(report_pt_table, [1, 2])
+            spr_displacement_top_conc(report_pt_table, self._cmpd_set())
+
+        self.assertEqual(1, mock_read.call_count)
+
+    def test_paths_still_accepted(self):
+        result = calc_max_theory_disp(TestReportPointTable.report_path, [1, 2])
+        self.assertEqual([11.0, 21.0], list(result))
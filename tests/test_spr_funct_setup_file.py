@@ -0,0 +1,117 @@
+from unittest import TestCase
+from unittest.mock import patch
+import os
+import tempfile
+from script_spr_funct_setup_file.Create_Funct_Setup_File import main, create_funct_setup_file
+import pandas as pd
+
+
+class FunctSetupFile8k(TestCase):
+    """
+    Tests the 8K ordering of the functional (A-B-A) setup file.
+    """
+
+    @patch('script_spr_funct_setup_file.Create_Funct_Setup_File.save_output_file')
+    @patch('builtins.input', side_effect=['y', 'tests/fixtures/spr_setup_table_16_cpds_6_pt_dose.csv'])
+    def test_needle_passes(self, mock_input, mock_save):
+        df_result = main(args=[])
+
+        self.assertEqual(['Sample Solution', 'Flanking Solution (A)', 'CONC', 'MW', 'BAR'], list(df_result.columns))
+        self.assertEqual(16 * 8, len(df_result))
+
+        for start in range(0, len(df_result), 64):
+            df_pass = df_result.iloc[start:start + 64]
+            ls_flank = list(df_pass['Flanking Solution (A)'].iloc[:8])
+
+            # Two blanks for each of the 8 needles, then the titrations interleaved across the needles.
+            self.assertEqual([0] * 16, list(df_pass['CONC'].iloc[:16]))
+            self.assertEqual(ls_flank * 8, list(df_pass['Flanking Solution (A)']))
+
+        # The second pass starts with the ninth compound.
+        self.assertEqual(['1', '9'], list(df_result['Flanking Solution (A)'].iloc[[0, 64]].str.split('_').str[-1]))
+        self.assertEqual(1, mock_save.call_count)
+
+    @patch('script_spr_funct_setup_file.Create_Funct_Setup_File.save_output_file')
+    def test_campaign_split_across_plates(self, mock_save):
+        """
+        A campaign larger than one 384 well plate is saved as one file per plate.
+        """
+        df_campaign = pd.concat([pd.read_csv('tests/fixtures/spr_setup_table_40_cpds_6_pt_dose.csv')] * 2)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            campaign_path = os.path.join(tmp_dir, 'campaign.csv')
+            df_campaign.to_csv(campaign_path, index=False)
+
+            with patch('builtins.input', side_effect=['y', campaign_path]):
+                df_result = main(args=[])
+
+        self.assertEqual(80 * 8, len(df_result))
+        self.assertEqual([1, 2], [c[1]['plate_num'] for c in mock_save.call_args_list])
+        self.assertEqual([48 * 8, 32 * 8], [len(c[1]['df_final']) for c in mock_save.call_args_list])
+
+    @patch('script_spr_funct_setup_file.Create_Funct_Setup_File.save_output_file')
+    def test_partial_needle_pass(self, mock_save):
+        """
+        A run that is not a multiple of 8 compounds uses BLANK_NEEDLE rows for the needles without a compound.
+        """
+        df_cmpds = pd.read_csv('tests/fixtures/spr_setup_table_16_cpds_6_pt_dose.csv').iloc[:12]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cmpds_path = os.path.join(tmp_dir, 'cmpds.csv')
+            df_cmpds.to_csv(cmpds_path, index=False)
+
+            with patch('builtins.input', side_effect=['y', cmpds_path]):
+                df_result = main(args=[])
+
+        self.assertEqual(16 * 8, len(df_result))
+        df_last_pass = df_result.iloc[64:]
+        self.assertEqual(['BLANK_NEEDLE'] * 4, list(df_last_pass['Sample Solution'].iloc[4:8]))
+        self.assertEqual(['BLANK_NEEDLE'] * 4, list(df_last_pass['Flanking Solution (A)'].iloc[-4:]))
+
+    @patch('script_spr_funct_setup_file.Create_Funct_Setup_File.save_output_file')
+    def test_runs_of_fewer_or_more_than_8_cpds(self, mock_save):
+        """
+        Runs of 1, 7 and 9 compounds fill the needles without a compound of their last pass with BLANK_NEEDLE rows.
+        """
+        df_fixture = pd.read_csv('tests/fixtures/spr_setup_table_16_cpds_6_pt_dose.csv')
+
+        for num_cmpds in [1, 7, 9]:
+            with self.subTest(num_cmpds=num_cmpds):
+                df_result = create_funct_setup_file(df_setup_ori=df_fixture.iloc[:num_cmpds].copy(),
+                                                    process_for_8k=True)
+
+                num_passes = -(-num_cmpds // 8)
+                num_empty = num_passes * 8 - num_cmpds
+                self.assertEqual(num_passes * 8 * 8, len(df_result))
+                self.assertEqual(num_empty * 8, (df_result['Sample Solution'] == 'BLANK_NEEDLE').sum())
+                self.assertEqual(['BLANK_NEEDLE'] * num_empty,
+                                 list(df_result['Flanking Solution (A)'].iloc[len(df_result) - num_empty:]))
+
+                # Each compound keeps its 8 injections.
+                self.assertEqual([8] * num_cmpds, list(df_result.loc[df_result['Sample Solution'] != 'BLANK_NEEDLE']
+                                                       .groupby('Flanking Solution (A)', sort=False).size()))
+
+    @patch('script_spr_funct_setup_file.Create_Funct_Setup_File.save_output_file')
+    def test_mixed_num_pts(self, mock_save):
+        """
+        The needles of a pass inject together, so an 8K run with compounds of different curve lengths is refused.
+        """
+        df_cmpds = pd.read_csv('tests/fixtures/spr_setup_table_16_cpds_6_pt_dose.csv').iloc[:9].copy()
+        df_cmpds.loc[3, 'num_pts'] = 8
+
+        with self.assertRaisesRegex(ValueError, 'same number of points'):
+            create_funct_setup_file(df_setup_ori=df_cmpds, process_for_8k=True)
+        self.assertEqual(0, mock_save.call_count)
+
+    @patch('builtins.input')
+    @patch('script_spr_funct_setup_file.Create_Funct_Setup_File.save_output_file')
+    def test_batch(self, mock_save, mock_input):
+        """
+        Batch mode creates a setup file for every setup table without asking anything.
+        """
+        results = main(args=['--b8k', '-w', '1', '-b', 'tests/fixtures/spr_setup_table_*_10_pt_dose.csv'])
+
+        self.assertEqual(0, mock_input.call_count)
+        self.assertEqual(4, len(results))
+        self.assertEqual(16 * 12, len(results['tests/fixtures/spr_setup_table_16_cpds_10_pt_dose.csv']))
+        self.assertEqual(4, mock_save.call_count)
@@ -1,7 +1,9 @@
 from unittest import TestCase
 from unittest.mock import Mock, MagicMock, patch
 import os
-from script_spr_setup_file.Create_SPR_setup_file import spr_setup_sheet
+import glob
+import tempfile
+from script_spr_setup_file.Create_SPR_setup_file import spr_setup_sheet, create_setup_table, create_setup_file
 import pandas as pd
 
 
@@ -1883,4 +1885,178 @@ class SetupFileScriptAffinity_8k(TestCase):
 
         ls_corr = [round(num, 3) for num in ls_corr]
 
-        self.assertEqual(ls_corr, list(df_result))
\ No newline at end of file
+        self.assertEqual(ls_corr, list(df_result))
+
+class CreateSetupTable(TestCase):
+    """
+    Tests the expansion of the setup table to one row per injection.
+    """
+
+    df_setup_trim = pd.DataFrame({'Broad ID': ['BRD-K81106261-001-01-4', 'CONTROL'],
+                                  'MW': [496.557, 300.0],
+                                  'Plate_Barcode': ['TEST1', 'TEST2'],
+                                  'Barcode': [1172907815, 1196291078],
+                                  'Test [Cpd] uM': [50, 30],
+                                  'fold_dil': [2, 3],
+                                  'num_pts': [3, 2]})
+
+    def test_columns_are_repeated_for_each_injection(self):
+        df_result = create_setup_table(df_setup_trim=self.df_setup_trim, plate_bar=True)
+
+        self.assertEqual(['BRD-6261_1'] * 5 + ['CONTROL_2'] * 4, list(df_result['BRD']))
+        self.assertEqual([496.557] * 5 + [300.0] * 4, list(df_result['MW']))
+        self.assertEqual([1172907815] * 5 + [1196291078] * 4, list(df_result['BAR']))
+        self.assertEqual(['TEST1'] * 5 + ['TEST2'] * 4, list(df_result['PLATE_BAR']))
+
+    def test_dilution_series_sorted_after_blanks(self):
+        df_result = create_setup_table(df_setup_trim=self.df_setup_trim, plate_bar=False)
+
+        self.assertEqual([0, 0, 12.5, 25, 50, 0, 0, 10, 30], list(df_result['CONC']))
+        self.assertEqual(['BRD', 'MW', 'CONC', 'BAR'], list(df_result.columns))
+
+
+class ProcessDfFor8kAllFixtures(TestCase):
+    """
+    Checks the 8K injection order built from every setup table fixture.
+    """
+
+    def test_needle_passes(self):
+        for fixture in sorted(glob.glob('tests/fixtures/spr_setup_table_*.csv')):
+            with self.subTest(fixture=fixture):
+                with patch('script_spr_setup_file.Create_SPR_setup_file.save_output_file'), \
+                        patch('builtins.input', side_effect=['n', fixture]):
+                    df_regular = spr_setup_sheet()
+                with patch('script_spr_setup_file.Create_SPR_setup_file.save_output_file'), \
+                        patch('builtins.input', side_effect=['y', fixture]):
+                    df_8k = spr_setup_sheet()
+
+                # Same injections, only reordered.
+                pd.testing.assert_frame_equal(df_regular.sort_values(list(df_regular.columns)).reset_index(drop=True),
+                                              df_8k.sort_values(list(df_8k.columns)).reset_index(drop=True))
+
+                num_pts = int(pd.read_csv(fixture).iloc[1]['num_pts'])
+                rows_per_pass = 8 * (num_pts + 2)
+                for start in range(0, len(df_8k), rows_per_pass):
+                    df_pass = df_8k.iloc[start:start + rows_per_pass]
+                    ls_brd = list(df_pass['BRD'].iloc[:8])
+
+                    # Two blanks for each of the 8 needles, then the titrations interleaved across the needles.
+                    self.assertEqual([0] * 16, list(df_pass['CONC'].iloc[:16]))
+                    self.assertEqual(ls_brd, list(df_pass['BRD'].iloc[8:16]))
+                    self.assertEqual(ls_brd * num_pts, list(df_pass['BRD'].iloc[16:]))
+
+                    df_titration = df_pass.iloc[16:]
+                    for needle in range(8):
+                        ls_conc = list(df_titration['CONC'].iloc[needle::8])
+                        self.assertEqual(sorted(ls_conc), ls_conc)
+
+    @patch('script_spr_setup_file.Create_SPR_setup_file.save_output_file')
+    def test_campaign_split_across_plates(self, mock_save):
+        """
+        A campaign larger than one 384 well plate is saved as one file per plate.
+        """
+        df_campaign = pd.concat([pd.read_csv('tests/fixtures/spr_setup_table_48_cpds_6_pt_dose.csv')] * 2 +
+                                [pd.read_csv('tests/fixtures/spr_setup_table_8_cpds_6_pt_dose.csv')])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            campaign_path = os.path.join(tmp_dir, 'campaign.csv')
+            df_campaign.to_csv(campaign_path, index=False)
+
+            with patch('builtins.input', side_effect=['y', campaign_path]):
+                df_result = spr_setup_sheet()
+
+        self.assertEqual(104 * 8, len(df_result))
+        self.assertEqual([1, 2, 3], [c[1]['plate_num'] for c in mock_save.call_args_list])
+        self.assertEqual([48 * 8, 48 * 8, 8 * 8], [len(c[1]['df_final']) for c in mock_save.call_args_list])
+
+    @patch('script_spr_setup_file.Create_SPR_setup_file.save_output_file')
+    def test_partial_needle_pass(self, mock_save):
+        """
+        A run that is not a multiple of 8 compounds uses BLANK_NEEDLE rows for the needles without a compound.
+        """
+        df_cmpds = pd.read_csv('tests/fixtures/spr_setup_table_16_cpds_6_pt_dose.csv').iloc[:12]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cmpds_path = os.path.join(tmp_dir, 'cmpds.csv')
+            df_cmpds.to_csv(cmpds_path, index=False)
+
+            with patch('builtins.input', side_effect=['y', cmpds_path]):
+                df_result = spr_setup_sheet()
+
+        self.assertEqual(16 * 8, len(df_result))
+        df_last_pass = df_result.iloc[64:]
+        self.assertEqual(['BLANK_NEEDLE'] * 4, list(df_last_pass['BRD'].iloc[4:8]))
+        self.assertEqual(['BLANK_NEEDLE'] * 4, list(df_last_pass['BRD'].iloc[-4:]))
+        self.assertEqual(0, df_last_pass.loc[df_last_pass['BRD'] == 'BLANK_NEEDLE', 'CONC'].sum())
+        self.assertEqual(1, mock_save.call_count)
+
+
+    @patch('script_spr_setup_file.Create_SPR_setup_file.save_output_file')
+    def test_runs_of_fewer_or_more_than_8_cpds(self, mock_save):
+        """
+        Runs of 1, 7 and 9 compounds fill the needles without a compound of their last pass with BLANK_NEEDLE rows.
+        """
+        df_fixture = pd.read_csv('tests/fixtures/spr_setup_table_16_cpds_6_pt_dose.csv')
+
+        for num_cmpds in [1, 7, 9]:
+            with self.subTest(num_cmpds=num_cmpds):
+                df_result = create_setup_file(df_setup_ori=df_fixture.iloc[:num_cmpds].copy(), process_for_8k=True)
+
+                num_passes = -(-num_cmpds // 8)
+                self.assertEqual(num_passes * 8 * 8, len(df_result))
+
+                # The needles of each pass, in the order of the setup table, padded with BLANK_NEEDLE.
+                ls_needles = [brd if brd == 'BLANK_NEEDLE' else int(brd.split('_')[-1])
+                              for start in range(0, len(df_result), 64)
+                              for brd in df_result['BRD'].iloc[start:start + 8]]
+                self.assertEqual(list(range(1, num_cmpds + 1)) + ['BLANK_NEEDLE'] * (num_passes * 8 - num_cmpds),
+                                 ls_needles)
+                self.assertEqual((num_passes * 8 - num_cmpds) * 8, (df_result['BRD'] == 'BLANK_NEEDLE').sum())
+
+    @patch('script_spr_setup_file.Create_SPR_setup_file.save_output_file')
+    def test_mixed_num_pts(self, mock_save):
+        """
+        The needles of a pass inject together, so an 8K run with compounds of different curve lengths is refused.
+        """
+        df_cmpds = pd.read_csv('tests/fixtures/spr_setup_table_16_cpds_6_pt_dose.csv').iloc[:9].copy()
+        df_cmpds.loc[3, 'num_pts'] = 8
+
+        with self.assertRaisesRegex(ValueError, 'same number of points'):
+            create_setup_file(df_setup_ori=df_cmpds, process_for_8k=True)
+        self.assertEqual(0, mock_save.call_count)
+
+        # Other instruments run one compound at a time, so mixed curve lengths are still allowed.
+        df_result = create_setup_file(df_setup_ori=df_cmpds, process_for_8k=False)
+        self.assertEqual((df_cmpds['num_pts'] + 2).sum(), len(df_result))
+
+
+class SetupFileNonInteractive(TestCase):
+    """
+    Tests running the setup file script without user input.
+    """
+
+    @patch('builtins.input')
+    @patch('script_spr_setup_file.Create_SPR_setup_file.save_output_file')
+    def test_flags_replace_prompts(self, mock_save, mock_input):
+        df_result = spr_setup_sheet(args=['--b8k', '-s', 'tests/fixtures/spr_setup_table_16_cpds_6_pt_dose.csv'])
+
+        self.assertEqual(0, mock_input.call_count)
+        self.assertEqual(16 * 8, len(df_result))
+        self.assertEqual(list(df_result['BRD'].iloc[:8]), list(df_result['BRD'].iloc[8:16]))
+
+    @patch('builtins.input')
+    @patch('script_spr_setup_file.Create_SPR_setup_file.save_output_file')
+    def test_batch(self, mock_save, mock_input):
+        results = spr_setup_sheet(args=['--not_8k', '-w', '1', '-b', 'tests/fixtures/spr_setup_table_*_6_pt_dose.csv'])
+
+        self.assertEqual(0, mock_input.call_count)
+        self.assertEqual(sorted(glob.glob('tests/fixtures/spr_setup_table_*_6_pt_dose.csv')), sorted(results))
+        self.assertEqual(len(results), mock_save.call_count)
+
+        # Every file is named after its setup table.
+        self.assertEqual(sorted(os.path.splitext(os.path.basename(path))[0] for path in results),
+                         sorted(c[1]['name'] for c in mock_save.call_args_list))
+
+        with patch('builtins.input', side_effect=['n', 'tests/fixtures/spr_setup_table_8_cpds_6_pt_dose.csv']):
+            df_interactive = spr_setup_sheet()
+        pd.testing.assert_frame_equal(df_interactive, results['tests/fixtures/spr_setup_table_8_cpds_6_pt_dose.csv'])
@@ -0,0 +1,91 @@
+"""Module for testing the batch script that creates the ADLP files of many experiments."""
+
+from unittest import TestCase, mock
+import os
+import tempfile
+
+import pandas as pd
+
+from benchmarks import synthetic
+from script_spr_to_adlp_batch import SPR_to_ADLP_Batch
+import script_spr_to_adlp_8k.SPR_to_ADLP_8K
+import script_spr_to_adlp_funct_8k.SPR_to_ADLP_Funct_8K
+import script_spr_to_adlp_not_8k.SPR_to_ADLP
+
+
+class TestDetectScript(TestCase):
+
+    def test_script_per_flavor(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for flavor, script in [('BiacoreS200', 'not_8k'), ('Biacore8K', '8k'),
+                                   ('Biacore8K_functional', 'funct_8k')]:
+                paths = synthetic.generate_experiment(os.path.join(tmp_dir, flavor), flavor, 2)
+                self.assertEqual(script, SPR_to_ADLP_Batch.detect_script(paths['config']))
+
+    def test_no_instrument(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_file = os.path.join(tmp_dir, 'config.txt')
+            with open(config_file, 'w') as f:
+                f.write('[paths]\npath_mstr_tbl: setup.csv\n')
+
+            with self.assertRaises(ValueError):
+                SPR_to_ADLP_Batch.detect_script(config_file)
+
+
+class TestFindConfigFiles(TestCase):
+
+    def test_files_folders_and_patterns(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in ['a.txt', 'b.txt', 'c.csv']:
+                open(os.path.join(tmp_dir, name), 'w').close()
+            a, b = os.path.join(tmp_dir, 'a.txt'), os.path.join(tmp_dir, 'b.txt')
+
+            self.assertEqual([b, a], SPR_to_ADLP_Batch.find_config_files([b, tmp_dir, os.path.join(tmp_dir, '*.txt')]))
+
+
+class TestSprCreateDotUploadFileBatch(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        home = os.path.join(self.tmp_dir.name, 'home')
+        self.desktop = os.path.join(home, 'Desktop')
+        os.makedirs(self.desktop)
+        self.patches = [mock.patch.object(module, 'homedir', home) for module in
+                        [script_spr_to_adlp_not_8k.SPR_to_ADLP, script_spr_to_adlp_8k.SPR_to_ADLP_8K,
+                         script_spr_to_adlp_funct_8k.SPR_to_ADLP_Funct_8K]]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        for patch in self.patches:
+            patch.stop()
+        self.tmp_dir.cleanup()
+
+    def test_mixed_instruments_with_failure(self):
+        ls_configs = [synthetic.generate_experiment(os.path.join(self.tmp_dir.name, flavor), flavor, 8)['config']
+                      for flavor in ['Biacore1', 'Biacore8K', 'Biacore8K_functional']]
+
+        # A setup table that does not exist only fails its own experiment.
+        bad_config = os.path.join(self.tmp_dir.name, 'bad', 'config.txt')
+        os.makedirs(os.path.dirname(bad_config))
+        with open(ls_configs[0]) as f:
+            config = f.read().replace(os.path.join(self.tmp_dir.name, 'Biacore1', 'setup_table.csv'), 'missing.csv')
+        with open(bad_config, 'w') as f:
+            f.write(config)
+
+        summary_file = os.path.join(self.tmp_dir.name, 'summary.csv')
+        with self.assertRaises(RuntimeError):
+            SPR_to_ADLP_Batch.spr_create_dot_upload_file_batch(ls_configs + [bad_config], workers=2,
+                                                               summary_file=summary_file)
+
+        df_summary = pd.read_csv(summary_file)
+        self.assertEqual(ls_configs + [bad_config], df_summary['CONFIG'].tolist())
+        self.assertEqual(['OK', 'OK', 'OK', 'FAILED'], df_summary['STATUS'].tolist())
+        self.assertEqual(['not_8k', '8k', 'funct_8k'], df_summary['SCRIPT'][:3].tolist())
+        self.assertEqual([24, 8, 8], df_summary['ROWS'][:3].tolist())
+        self.assertTrue(df_summary['ERROR'][:3].isna().all())
+        self.assertIn('missing.csv', df_summary['ERROR'][3])
+
+        # Configuration files with the same name are told apart in the ADLP file names.
+        ls_files = os.listdir(self.desktop)
+        self.assertEqual(['config', 'config_2', 'config_3'], sorted(f[:f.index('_APPVersion')] for f in ls_files))
@@ -8,10 +8,18 @@ from sqlalchemy import create_engine, Table, MetaData, select
 import pandas as pd
 import numpy as np
 from cryptography.fernet import Fernet
+from io import BytesIO
+import os
+import tempfile
+import zipfile
+import openpyxl
+import xlsxwriter
 
 # Import functions for testing
 from SPR_to_ADLP_Functions.common_functions import rep_item_for_dot_df, get_structures_smiles_from_db, \
-    spr_binding_top_for_dot_file
+    spr_binding_top_for_dot_file, read_excel_from_header, render_structure_imgs, spr_insert_structures, \
+    cmpd_set_for_merge
+from benchmarks import synthetic
 
 
 class TestReplicateItemFunct(TestCase):
@@ -147,8 +155,8 @@ class TestGetStructSmilesDB(TestCase):
              'DMSO to Add (uL)': [9, 6, 6]})
 
         # Create a results DataFrame that simulates a database query from smiles
-        cls.results_from_db = pd.DataFrame({'broadcoreid' : ['81106261', '00024350', '00024351'],
-                                            'smiles' : ['smile1', 'smile2', 'smile3']})
+        cls.results_from_db = pd.DataFrame({'BROAD_CORE_ID': ['81106261', '00024350', '00024351'],
+                                            'SMILES': ['smile1', 'smile2', 'smile3']})
 
     @patch('SPR_to_ADLP_Functions.common_functions._connect')
     @patch('pandas.DataFrame')
@@ -258,6 +266,31 @@ class TestGetStructSmilesDB(TestCase):
             result_smiles = result['SMILES'].tolist()
             self.assertEqual(expected_smiles, result_smiles)
 
+    @patch.dict('SPR_to_ADLP_Functions.common_functions._ENGINES', clear=True)
+    @patch('SPR_to_ADLP_Functions.common_functions._connect')
+    @patch('pandas.DataFrame')
+    @patch('sqlalchemy.create_engine')
+    @patch('sqlalchemy.MetaData')
+    @patch('sqlalchemy.Table')
+    @patch('sqlalchemy.select')
+    def test_engine_reused(self, mock_1, mock_2, mock_3, mock_4, mock_5, mock_6):
+        """
+        Test that the engine is only created once in a process, so a long running server reuses it.
+
+        :param mock_4: Mocks the sqlalchemy create_engine call
+        :param mock_6: Mocks the _connect method that take a engine as a parameter and makes a db connection attempt.
+        """
+        with patch('crypt.Crypt') as MockCrypt:
+            MockCrypt.return_value.f.decrypt.return_value = b'test'
+            mock_5.return_value = TestGetStructSmilesDB.results_from_db
+
+            for i in range(2):
+                get_structures_smiles_from_db(df_mstr_tbl=TestGetStructSmilesDB.df_setup_tbl)
+
+            self.assertEqual(1, mock_4.call_count)
+            self.assertEqual(2, mock_6.call_count)
+            self.assertEqual([mock_4.return_value] * 2, [call[1]['engine'] for call in mock_6.call_args_list])
+
 
 class TestInsertSSandSensoImages(TestCase):
 
@@ -353,8 +386,95 @@ class TestRUatTopConc8K(TestCase):
 
 
 
+class TestSetupTableNotChanged(TestCase):
+    """
+    Class that tests that matching the report points to the setup table leaves the setup table as it is, as the other
+    stages of a run read it at the same time.
+    """
+
+    def test_cmpd_set_for_merge(self):
+        df_cmpd_set = pd.DataFrame({'Broad ID': ['BRD-K81106261-001-01-4'], 'Test [Cpd] uM': [50.004]})
+        df_before = df_cmpd_set.copy()
+
+        df_merge = cmpd_set_for_merge(df_cmpd_set)
+
+        pd.testing.assert_frame_equal(df_before, df_cmpd_set)
+        self.assertEqual(['BRD-6261'], list(df_merge['BRD_MERGE']))
+        self.assertEqual([50.0], list(df_merge['Test [Cpd] uM']))
+
+    def test_binding_top(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = synthetic.generate_experiment(os.path.join(tmp_dir, 'exp'), 'Biacore8K', 8)
+            df_cmpd_set = pd.read_csv(paths['path_mstr_tbl'])
+            df_before = df_cmpd_set.copy()
+
+            result = spr_binding_top_for_dot_file(report_pt_file=paths['path_report_pt'], df_cmpd_set=df_cmpd_set,
+                                                  instrument='Biacore8K', fc_used=[1, 2, 3, 4, 5, 6, 7, 8])
+
+        self.assertEqual(8, len(result))
+        pd.testing.assert_frame_equal(df_before, df_cmpd_set)
+
+class TestReadExcelFromHeader(TestCase):
+    """
+    Class that tests read_excel_from_header() with the steady state and kinetic exports from a Biacore 8K.
+    """
+
+    ss_path = './tests/fixtures/Biacore8k_Test_Files/20200708_7324_images_ss/20200708_7324_affinity_STEADY.xlsx'
+    senso_path = './tests/fixtures/Biacore8k_Test_Files/20200708_7324_images_kinetics/' \
+                 '20200708_7324_affinity_KINETICS.xlsx'
+
+    def _header_row(self, path):
+        """Finds the row of the header the same way the scripts did before by scanning every cell."""
+        df_all = pd.read_excel(path, header=None, engine='openpyxl')
+        return int(np.where(df_all.values == 'Group')[0][0])
+
+    def test_steady_state_matches_read_excel(self):
+        expected = pd.read_excel(self.ss_path, skiprows=self._header_row(self.ss_path), engine='openpyxl')
+        result = read_excel_from_header(self.ss_path, header_value='Group')
+        pd.testing.assert_frame_equal(expected, result)
+
+    def test_kinetics_matches_read_excel(self):
+        expected = pd.read_excel(self.senso_path, skiprows=self._header_row(self.senso_path), engine='openpyxl')
+        result = read_excel_from_header(self.senso_path, header_value='Group')
+        pd.testing.assert_frame_equal(expected, result)
+
+    def test_header_not_found(self):
+        with self.assertRaises(ValueError):
+            read_excel_from_header(self.ss_path, header_value='Not a header')
+
+
+class TestInsertStructuresInMemory(TestCase):
+    """
+    Class that tests rendering structures to in-memory buffers and inserting them into a workbook.
+    """
+
+    df_smiles = pd.DataFrame({'Broad ID': ['BRD-1', 'BRD-2', 'BRD-3'], 'SMILES': ['CCO', None, 'CCO']})
+
+    def test_render_in_memory(self):
+        result = render_structure_imgs(df_with_smiles=self.df_smiles, dir=None, in_memory=True)
+
+        self.assertIsInstance(result.loc[0, 'IMG_PATH'], BytesIO)
+        self.assertEqual(b'\x89PNG', result.loc[0, 'IMG_PATH'].getvalue()[:4])
+        self.assertEqual('Not Found', result.loc[1, 'IMG_PATH'])
+        self.assertIs(result.loc[0, 'IMG_PATH'], result.loc[2, 'IMG_PATH'])
 
+    def test_insert_buffers_and_paths(self):
+        result = render_structure_imgs(df_with_smiles=self.df_smiles, dir=None, in_memory=True)
 
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            img_path = os.path.join(tmp_dir, 'structure.png')
+            with open(img_path, 'wb') as f:
+                f.write(result.loc[0, 'IMG_PATH'].getvalue())
 
+            xlsx_path = os.path.join(tmp_dir, 'structures.xlsx')
+            workbook = xlsxwriter.Workbook(xlsx_path)
+            worksheet = workbook.add_worksheet()
+            spr_insert_structures(ls_img_struct_paths=list(result['IMG_PATH']) + [img_path], worksheet=worksheet)
+            workbook.close()
 
+            # The same structure from two buffer rows and a file is stored once.
+            with zipfile.ZipFile(xlsx_path) as z:
+                ls_media = [name for name in z.namelist() if name.startswith('xl/media/')]
+                self.assertEqual(1, len(ls_media))
 
+            self.assertEqual('Smile Not Found', openpyxl.load_workbook(xlsx_path).active['B3'].value)
@@ -54,6 +54,29 @@ class SPR_to_ADLP_not_8k_Cli(TestCase):
                                                         'Test'])
         self.assertEqual(0, result.exit_code)
 
+    @patch('SPR_to_ADLP_Functions.profiling.StageProfiler.write_sidecar', autospec=True, return_value='profile.json')
+    @patch('SPR_to_ADLP_Functions.common_functions.spr_binding_top_for_dot_file')
+    @patch('SPR_to_ADLP_Functions.common_functions.spr_insert_ss_senso_images')
+    @patch('pandas.ExcelWriter')
+    @patch('pandas.DataFrame.to_excel')
+    def test_Cli_profile_Biacore1(self, mock_1, mock_2, mock_3, mock_4, mock_5) -> None:
+        """
+        Test that --profile records the stages of the run and writes them next to the ADLP file.
+        """
+        mock_4.return_value = pd.Series(np.zeros(48))
+
+        runner = CliRunner()
+        result = runner.invoke(main, ['--config_file', './tests/fixtures/Biacore1_Test_Files/'
+                                                        '200312-1_config_affinit_Biacore1.txt', '--save_file',
+                                      'Test', '--profile'])
+        self.assertEqual(0, result.exit_code)
+
+        profiler, output_path = mock_5.call_args[0]
+        self.assertTrue(output_path.endswith('.xlsx'))
+        self.assertEqual(['read_setup_table', 'read_steady_state', 'read_kinetics', 'save_workbook'],
+                         [stage['stage'] for stage in profiler.to_dict()['stages']])
+        self.assertGreater(profiler.to_dict()['stages'][1]['bytes_read'], 0)
+
     def test_Cli_and_adlp_df_created_Biacore2(self):
         pass
 
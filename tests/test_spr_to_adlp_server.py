@@ -0,0 +1,85 @@
+"""Module for testing the ADLP server and its client."""
+
+from unittest import TestCase, mock
+import json
+import os
+import tempfile
+import threading
+
+from benchmarks import synthetic
+from script_spr_to_adlp_server import SPR_to_ADLP_Server, client
+import script_spr_to_adlp_not_8k.SPR_to_ADLP
+
+
+class TestAdlpServer(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        home = os.path.join(self.tmp_dir.name, 'home')
+        self.desktop = os.path.join(home, 'Desktop')
+        os.makedirs(self.desktop)
+        self.patch = mock.patch.object(script_spr_to_adlp_not_8k.SPR_to_ADLP, 'homedir', home)
+        self.patch.start()
+
+        self.server_file = os.path.join(self.tmp_dir.name, 'server.json')
+        self.server = SPR_to_ADLP_Server.AdlpServer(server_file=self.server_file, warm_modules=['pandas'])
+        self.server.start()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self) -> None:
+        if self.thread.is_alive():
+            client.request({'command': 'stop'}, server_file=self.server_file)
+            self.thread.join(timeout=10)
+        self.patch.stop()
+        self.tmp_dir.cleanup()
+
+    def test_jobs_run_on_server(self):
+        config_file = synthetic.generate_experiment(os.path.join(self.tmp_dir.name, 'run_1'), 'Biacore1', 8)['config']
+
+        # A relative path is read from the working directory of the client.
+        cwd = os.getcwd()
+        os.chdir(os.path.dirname(config_file))
+        try:
+            response = client.submit('config.txt', server_file=self.server_file)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual('OK', response['status'], response.get('error'))
+        self.assertEqual({'SCRIPT': 'not_8k', 'ROWS': 24}, {key: response['result'][key] for key in ['SCRIPT', 'ROWS']})
+        self.assertIn('Program Done!', response['output'])
+        self.assertEqual(['config'], [f[:f.index('_APPVersion')] for f in os.listdir(self.desktop)])
+
+        response = client.submit(os.path.join(self.tmp_dir.name, 'missing.txt'), save_file='missing',
+                                 server_file=self.server_file)
+        self.assertEqual('FAILED', response['status'])
+        self.assertIn('missing.txt', response['error'])
+
+        response = client.request({'command': 'status'}, server_file=self.server_file)
+        self.assertEqual((os.getpid(), 2, False), (response['pid'], response['jobs'], response['busy']))
+
+    def test_key_required(self):
+        with open(self.server_file) as f:
+            info = json.load(f)
+        self.assertEqual(0o600, os.stat(self.server_file).st_mode & 0o777)
+
+        info['authkey'] = '00' * 32
+        wrong_key_file = os.path.join(self.tmp_dir.name, 'wrong_key.json')
+        with open(wrong_key_file, 'w') as f:
+            json.dump(info, f)
+        with self.assertRaises(RuntimeError):
+            client.request({'command': 'status'}, server_file=wrong_key_file)
+
+        # The server keeps answering the clients with the key.
+        self.assertEqual('OK', client.request({'command': 'status'}, server_file=self.server_file)['status'])
+
+    def test_stop(self):
+        with self.assertRaises(RuntimeError):
+            SPR_to_ADLP_Server.AdlpServer(server_file=self.server_file, warm_modules=[]).start()
+
+        client.request({'command': 'stop'}, server_file=self.server_file)
+        self.thread.join(timeout=10)
+
+        self.assertFalse(self.thread.is_alive())
+        self.assertFalse(os.path.exists(self.server_file))
+        with self.assertRaises(RuntimeError):
+            client.request({'command': 'status'}, server_file=self.server_file)
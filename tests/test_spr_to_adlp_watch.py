@@ -0,0 +1,98 @@
+"""Module for testing the watcher that creates the ADLP files of new experiments in a folder."""
+
+from unittest import TestCase, mock
+import os
+import shutil
+import tempfile
+
+from benchmarks import synthetic
+from script_spr_to_adlp_watch import SPR_to_ADLP_Watch
+import script_spr_to_adlp_8k.SPR_to_ADLP_8K
+import script_spr_to_adlp_not_8k.SPR_to_ADLP
+
+
+class TestExportWatcher(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.watch_dir = os.path.join(self.tmp_dir.name, 'watch')
+        self.state_file = os.path.join(self.tmp_dir.name, 'state.json')
+        home = os.path.join(self.tmp_dir.name, 'home')
+        self.desktop = os.path.join(home, 'Desktop')
+        os.makedirs(self.desktop)
+        self.patches = [mock.patch.object(module, 'homedir', home) for module in
+                        [script_spr_to_adlp_not_8k.SPR_to_ADLP, script_spr_to_adlp_8k.SPR_to_ADLP_8K]]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self) -> None:
+        for patch in self.patches:
+            patch.stop()
+        self.tmp_dir.cleanup()
+
+    def watcher(self, settle_seconds=0):
+        return SPR_to_ADLP_Watch.ExportWatcher(self.watch_dir, settle_seconds=settle_seconds,
+                                               state_file=self.state_file)
+
+    def test_ready_once_complete_and_settled(self):
+        paths = synthetic.generate_experiment(os.path.join(self.watch_dir, 'run_1'), 'Biacore1', 4)
+        report_pt = paths['path_report_pt']
+        os.rename(report_pt, report_pt + '.part')
+        watcher = self.watcher(settle_seconds=60)
+
+        # The Biacore exports are text files as well but only the configuration file is found.
+        self.assertEqual([paths['config']], watcher.find_config_files())
+        self.assertEqual([], watcher.find_ready(now=0))
+        self.assertEqual([], watcher.find_ready(now=100))
+
+        os.rename(report_pt + '.part', report_pt)
+        self.assertEqual([], watcher.find_ready(now=200))
+        self.assertEqual([], watcher.find_ready(now=230))
+
+        # A file that changes while it is copied starts the settle time again.
+        with open(paths['path_senso_txt'], 'a') as f:
+            f.write('\n')
+        self.assertEqual([], watcher.find_ready(now=260))
+        self.assertEqual([], watcher.find_ready(now=300))
+        self.assertEqual([paths['config']], watcher.find_ready(now=320))
+
+    def test_new_experiments_processed_once(self):
+        config_1 = synthetic.generate_experiment(os.path.join(self.watch_dir, 'run_1'), 'Biacore1', 4)['config']
+        watcher = self.watcher()
+        watcher.run(poll_interval=0, max_polls=2)
+
+        # An experiment added while the watcher runs, from a different instrument.
+        config_2 = synthetic.generate_experiment(os.path.join(self.watch_dir, 'run_2'), 'Biacore8K', 8)['config']
+        watcher.run(poll_interval=0, max_polls=2)
+
+        self.assertEqual(['OK', 'OK'], [watcher.processed[config]['status'] for config in [config_1, config_2]])
+        self.assertEqual(['config', 'config_2'], [watcher.processed[config]['name'] for config in [config_1, config_2]])
+        self.assertEqual(2, len(os.listdir(self.desktop)))
+
+        # A restarted watcher does not create them again, unless the configuration file is edited.
+        watcher = self.watcher()
+        self.assertEqual([], watcher.find_ready() + watcher.find_ready())
+        with open(config_1, 'a') as f:
+            f.write('\n')
+        self.assertEqual([], watcher.find_ready())
+        self.assertEqual([config_1], watcher.find_ready())
+        self.assertEqual('config', watcher.output_name(config_1))
+
+    def test_failed_experiment_recorded(self):
+        paths = synthetic.generate_experiment(os.path.join(self.watch_dir, 'run_1'), 'Biacore1', 4)
+        shutil.copyfile(paths['path_ss_txt'], paths['path_senso_txt'])
+        watcher = self.watcher()
+        watcher.run(poll_interval=0, max_polls=2)
+
+        self.assertEqual('FAILED', watcher.processed[paths['config']]['status'])
+        self.assertTrue(watcher.processed[paths['config']]['error'])
+        self.assertTrue(watcher.is_processed(paths['config']))
+
+    def test_skip_existing(self):
+        config_1 = synthetic.generate_experiment(os.path.join(self.watch_dir, 'run_1'), 'Biacore1', 4)['config']
+        watcher = self.watcher()
+
+        self.assertEqual([config_1], watcher.mark_existing())
+        watcher.run(poll_interval=0, max_polls=2)
+        self.assertEqual('SKIPPED', watcher.processed[config_1]['status'])
+        self.assertEqual([], os.listdir(self.desktop))
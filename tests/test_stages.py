@@ -0,0 +1,93 @@
+"""Module for testing the pipeline stages shared by the scripts."""
+
+from unittest import TestCase, mock
+import configparser
+import os
+import tempfile
+
+import pandas as pd
+
+from benchmarks import synthetic
+from SPR_to_ADLP_Functions import stages
+
+
+class TestRead8KConfig(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def generate_config(self, flavor):
+        return synthetic.generate_experiment(os.path.join(self.tmp_dir.name, flavor), flavor, 2)['config']
+
+    def test_binding_config(self):
+        config_file = self.generate_config('Biacore8K')
+
+        path_master_tbl, *_, meta = stages.read_8k_config(config_file, clip=True)
+
+        self.assertIsNone(path_master_tbl)
+        self.assertEqual('Biacore8K', meta['instrument'])
+        self.assertEqual(list(range(1, 9)), sorted(meta['protein_ru_dict']))
+        self.assertNotIn('protein_floated_BIP', meta)
+
+    def test_functional_config_gives_the_protein_floated(self):
+        config_file = self.generate_config('Biacore8K_functional')
+
+        *_, meta = stages.read_8k_config(config_file, clip=True, functional=True)
+
+        self.assertIn('protein_floated_BIP', meta)
+        self.assertIsInstance(meta['protein_floated_conc_uM'], float)
+
+    def test_functional_config_checks_the_flow_channels(self):
+        config_file = self.generate_config('Biacore8K_functional')
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        config.set('meta', 'num_fc_used', '99')
+        with open(config_file, 'w') as f:
+            config.write(f)
+
+        with self.assertRaises(RuntimeError):
+            stages.read_8k_config(config_file, clip=True, functional=True)
+
+
+class TestSaveStage(TestCase):
+
+    def setUp(self) -> None:
+        self.values = {'adlp_save_file_path': 'adlp.xlsx', 'df_final_for_dot': pd.DataFrame({'BROAD_ID': ['a', 'b']}),
+                       'df_cmpd_set': pd.DataFrame({'Broad ID': ['a', 'b']}),
+                       'df_ss_txt': pd.DataFrame({'Image File': ['ss1.png', 'ss2.png']}),
+                       'df_senso_txt': pd.DataFrame({'Image File': ['senso1.png', 'senso2.png']}),
+                       'path_ss_img': 'ss', 'path_senso_img': 'senso',
+                       'meta': {'instrument': 'Biacore1', 'num_fc_used': 3}, 'df_struct_smiles': None,
+                       'render_workers': 1, 'stream': True, 'export_format': 'xlsx', 'preview': False,
+                       'prepare_images': False}
+
+    @mock.patch('SPR_to_ADLP_Functions.exporters.export_adlp_file')
+    @mock.patch('SPR_to_ADLP_Functions.streaming_writer.write_adlp_file')
+    def test_stream_uses_the_layout_of_the_script(self, mock_write, mock_export):
+        stage = stages.save_stage(rows_per_cmpd=3, column_width=25, img_columns=('Image File', 'Image File'))
+
+        stage.run(self.values)
+
+        kwargs = mock_write.call_args[1]
+        self.assertEqual('T1:T7', kwargs['validation_range'])
+        self.assertEqual(25, kwargs['column_width'])
+        self.assertEqual(3, kwargs['num_fc_used'])
+        self.assertEqual('Biacore1', kwargs['biacore'])
+        self.assertEqual([('ss1.png', 'senso1.png'), ('ss2.png', 'senso2.png')], kwargs['tuple_list_imgs'])
+        self.assertFalse(kwargs['structures'])
+        self.assertEqual(0, mock_export.call_count)
+
+    @mock.patch('SPR_to_ADLP_Functions.exporters.export_adlp_file')
+    @mock.patch('SPR_to_ADLP_Functions.streaming_writer.write_adlp_file')
+    def test_export_without_preview_writes_no_xlsx(self, mock_write, mock_export):
+        self.values.update({'export_format': 'csv', 'meta': {'instrument': 'Biacore8K'}})
+        stage = stages.save_stage(img_columns=('Image File', 'Image File'))
+
+        stage.run(self.values)
+
+        self.assertEqual(0, mock_write.call_count)
+        self.assertEqual(1, mock_export.call_args[1]['num_fc_used'])
+        self.assertEqual('csv', mock_export.call_args[1]['export_format'])
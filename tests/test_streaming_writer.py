@@ -0,0 +1,113 @@
+"""Module for testing the constant memory writer of the ADLP file."""
+
+from unittest import TestCase, mock
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from SPR_to_ADLP_Functions.streaming_writer import write_adlp_file
+from benchmarks import synthetic
+import script_spr_to_adlp_not_8k.SPR_to_ADLP
+
+
+class TestWriteAdlpFile(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.save_path = os.path.join(self.tmp_dir.name, 'adlp.xlsx')
+        for img in ['ss_1.png', 'senso_1.png', 'ss_2.png', 'senso_2.png']:
+            synthetic.write_png(os.path.join(self.tmp_dir.name, img), width=40, height=30)
+
+        self.df_final_for_dot = pd.DataFrame({'BROAD_ID': ['BRD-A', 'BRD-B', 'BRD-C'],
+                                              'STRUCTURES': '',
+                                              'KD_SS_UM': [1.5, np.nan, np.inf],
+                                              'FC': [2, 3, 4]})
+        self.comments_list = pd.DataFrame({'Comments': ['No binding.', 'Retest.']})
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def write(self, **kwargs):
+        write_adlp_file(save_path=self.save_path, df_final_for_dot=self.df_final_for_dot,
+                        comments_list=self.comments_list, validation_range='C1:C4', column_range='A:D',
+                        column_width=25, tuple_list_imgs=[('ss_1.png', 'senso_1.png'), ('ss_2.png', 'senso_2.png')],
+                        path_ss_img=self.tmp_dir.name, path_senso_img=self.tmp_dir.name, biacore='Biacore8K',
+                        df_cmpd_set=None, num_fc_used=1, **kwargs)
+        return openpyxl.load_workbook(self.save_path)
+
+    def test_cells_match_to_excel(self):
+        wb = self.write()
+        ws = wb['Sheet1']
+
+        self.assertEqual([['BROAD_ID', 'STRUCTURES', 'KD_SS_UM', 'FC'],
+                          ['BRD-A', None, 1.5, 2],
+                          ['BRD-B', None, None, 3],
+                          ['BRD-C', None, 'inf', 4]], [[c.value for c in row] for row in ws.iter_rows()])
+        self.assertTrue(ws['A1'].font.b)
+        self.assertEqual([['Comments'], ['No binding.'], ['Retest.']],
+                         [[c.value for c in row] for row in wb['Sheet2'].iter_rows()])
+
+    def test_layout(self):
+        ws = self.write()['Sheet1']
+
+        self.assertEqual('A2', ws.freeze_panes)
+        self.assertEqual([('C1:C4', 'Sheet2!$A$2:$A$3')],
+                         [(str(dv.sqref), dv.formula1) for dv in ws.data_validations.dataValidation])
+
+        # Only the rows with images are resized, as with spr_insert_ss_senso_images.
+        self.assertEqual([210, 210, None], [ws.row_dimensions[row].height for row in [2, 3, 4]])
+        self.assertEqual([(1, 4), (1, 5), (2, 4), (2, 5)],
+                         sorted((img.anchor._from.row, img.anchor._from.col) for img in ws._images))
+
+    def test_repeated_images_stored_once(self):
+        synthetic.write_png(os.path.join(self.tmp_dir.name, 'senso_1.png'), width=40, height=30, seed=1)
+        with open(os.path.join(self.tmp_dir.name, 'ss_1.png'), 'rb') as f:
+            with open(os.path.join(self.tmp_dir.name, 'ss_copy.png'), 'wb') as f_copy:
+                f_copy.write(f.read())
+
+        write_adlp_file(save_path=self.save_path, df_final_for_dot=self.df_final_for_dot,
+                        comments_list=self.comments_list, validation_range='C1:C4', column_range='A:D',
+                        column_width=25, tuple_list_imgs=[('ss_1.png', 'senso_1.png'), ('ss_copy.png', 'senso_1.png')],
+                        path_ss_img=self.tmp_dir.name, path_senso_img=self.tmp_dir.name, biacore='Biacore8K',
+                        df_cmpd_set=None, num_fc_used=1)
+
+        with zipfile.ZipFile(self.save_path) as z:
+            self.assertEqual(2, len([name for name in z.namelist() if name.startswith('xl/media/')]))
+
+    @mock.patch('SPR_to_ADLP_Functions.common_functions.get_structure_imgs')
+    def test_structures(self, mock_get_structure_imgs):
+        image_cache = mock.Mock()
+        mock_get_structure_imgs.return_value = ([os.path.join(self.tmp_dir.name, 'ss_1.png'), 'Not Found'],
+                                                image_cache)
+
+        ws = self.write(structures=True)['Sheet1']
+
+        self.assertEqual('Smile Not Found', ws['B3'].value)
+        self.assertIn((1, 1), [(img.anchor._from.row, img.anchor._from.col) for img in ws._images])
+        self.assertEqual(210, ws.row_dimensions[3].height)
+        image_cache.prune.assert_called_once_with()
+
+
+class TestStreamScript(TestCase):
+
+    def test_stream_matches_default(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            home = os.path.join(tmp_dir, 'home')
+            os.makedirs(os.path.join(home, 'Desktop'))
+            paths = synthetic.generate_experiment(os.path.join(tmp_dir, 'data'), 'Biacore1', 10)
+
+            ls_df = []
+            with mock.patch.object(script_spr_to_adlp_not_8k.SPR_to_ADLP, 'homedir', home):
+                for stream in [False, True]:
+                    save_file = 'stream' if stream else 'default'
+                    script_spr_to_adlp_not_8k.SPR_to_ADLP.spr_create_dot_upload_file(
+                        paths['config'], save_file, clip=False, structures=False, stream=stream)
+                    file_name = [f for f in os.listdir(os.path.join(home, 'Desktop')) if f.startswith(save_file)][0]
+                    ls_df.append(pd.read_excel(os.path.join(home, 'Desktop', file_name)))
+
+        # The unique ids are random.
+        pd.testing.assert_frame_equal(ls_df[0].drop(columns=['UNIQUE_ID']), ls_df[1].drop(columns=['UNIQUE_ID']))
@@ -0,0 +1,94 @@
+"""Module for testing the synthetic experiment generator and the comparison of the benchmark suite."""
+
+from unittest import TestCase, mock
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from benchmarks import suite, synthetic
+import script_spr_to_adlp_8k.SPR_to_ADLP_8K
+import script_spr_to_adlp_funct_8k.SPR_to_ADLP_Funct_8K
+import script_spr_to_adlp_not_8k.SPR_to_ADLP
+
+ADLP_MODULES = {'Biacore1': script_spr_to_adlp_not_8k.SPR_to_ADLP,
+                'Biacore2': script_spr_to_adlp_not_8k.SPR_to_ADLP,
+                'Biacore3': script_spr_to_adlp_not_8k.SPR_to_ADLP,
+                'BiacoreS200': script_spr_to_adlp_not_8k.SPR_to_ADLP,
+                'Biacore8K': script_spr_to_adlp_8k.SPR_to_ADLP_8K,
+                'Biacore8K_functional': script_spr_to_adlp_funct_8k.SPR_to_ADLP_Funct_8K}
+
+
+class TestSyntheticExperiment(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp_dir.name, 'home', 'Desktop'))
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_setup_table_cores_unique(self):
+        df_setup = synthetic.make_setup_table(1536)
+        self.assertEqual(1536, df_setup['Broad ID'].str[9:13].nunique())
+        self.assertEqual(synthetic.SETUP_COLUMNS, list(df_setup.columns))
+
+    def test_write_png(self):
+        path = os.path.join(self.tmp_dir.name, 'img.png')
+        synthetic.write_png(path, width=40, height=30)
+        with open(path, 'rb') as f:
+            self.assertEqual(b'\x89PNG\r\n\x1a\n', f.read(8))
+
+    def test_unknown_flavor(self):
+        with self.assertRaises(ValueError):
+            synthetic.generate_experiment(self.tmp_dir.name, 'Biacore9K', 8)
+
+    def test_scripts_run_on_every_flavor(self):
+        # 12 compounds so the 8K flavors end with a partial needle pass.
+        for flavor, module in ADLP_MODULES.items():
+            with self.subTest(flavor=flavor):
+                paths = synthetic.generate_experiment(os.path.join(self.tmp_dir.name, flavor), flavor, 12)
+                with mock.patch.object(module, 'homedir', os.path.join(self.tmp_dir.name, 'home')):
+                    module.spr_create_dot_upload_file(paths['config'], flavor, clip=False, structures=False)
+
+                ls_files = [f for f in os.listdir(os.path.join(self.tmp_dir.name, 'home', 'Desktop'))
+                            if f.startswith(flavor + '_APPVersion')]
+                self.assertEqual(1, len(ls_files))
+                df_adlp = pd.read_excel(os.path.join(self.tmp_dir.name, 'home', 'Desktop', ls_files[0]))
+                self.assertEqual(12 * (1 if flavor in synthetic.FLAVORS_8K else 3), len(df_adlp))
+                self.assertFalse(df_adlp['RU_TOP_CMPD'].isna().any())
+
+
+class TestCompare(TestCase):
+
+    def setUp(self) -> None:
+        self.old = {'version': '1', 'results': [
+            {'benchmark': 'a', 'flavor': 'Biacore8K', 'compounds': 8, 'best_s': 1.0},
+            {'benchmark': 'b', 'flavor': 'Biacore8K', 'compounds': 8, 'best_s': 0.0001},
+            {'benchmark': 'c', 'flavor': 'Biacore8K', 'compounds': 8, 'best_s': 1.0}]}
+        self.new = {'version': '2', 'results': [
+            {'benchmark': 'a', 'flavor': 'Biacore8K', 'compounds': 8, 'best_s': 1.5},
+            {'benchmark': 'b', 'flavor': 'Biacore8K', 'compounds': 8, 'best_s': 0.0003},
+            {'benchmark': 'a', 'flavor': 'Biacore8K', 'compounds': 96, 'best_s': 9.0}]}
+
+    def test_compare(self):
+        ls_comparisons = suite.compare(self.old, self.new, threshold=0.1)
+
+        # Cases missing from either results are left out and sub millisecond slow downs are not regressions.
+        self.assertEqual(['a', 'b'], [comparison['benchmark'] for comparison in ls_comparisons])
+        self.assertEqual([True, False], [comparison['regression'] for comparison in ls_comparisons])
+        self.assertAlmostEqual(1.5, ls_comparisons[0]['ratio'])
+
+    def test_compare_exit_status(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            ls_paths = []
+            for name, results in [('old.json', self.old), ('new.json', self.new)]:
+                ls_paths.append(os.path.join(tmp_dir, name))
+                with open(ls_paths[-1], 'w') as f:
+                    json.dump(results, f)
+
+            with mock.patch('builtins.print'):
+                with self.assertRaises(SystemExit):
+                    suite.main(['compare'] + ls_paths)
+                self.assertEqual(2, len(suite.main(['compare'] + ls_paths + ['--threshold', '1'])))